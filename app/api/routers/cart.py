@@ -1,6 +1,9 @@
+import asyncio
+from collections import defaultdict, deque
+import numpy as np
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from sqlalchemy import text
-from app.database import engine, TABLE_CART, TABLE_CATALOG, TABLE_ORDERS, TABLE_ORDER_ITEMS, TABLE_PROFILES, PRICE_MARKUP
+from app.database import async_engine, TABLE_CART, TABLE_CATALOG, TABLE_ORDERS, TABLE_ORDER_ITEMS, TABLE_PROFILES, PRICE_MARKUP
 from app.services.email_service import EmailService
 from app.services.exchange import get_eur_to_uah
 from pydantic import BaseModel
@@ -70,7 +73,7 @@ class CreateOrderSchema(BaseModel):
 @router.post("/")
 async def add_to_cart(item: CartItemIn):
     try:
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
             query = text(f"""
                 INSERT INTO {TABLE_CART} (user_id, product_id, supplier_id, code, brand, name, quantity, price_eur)
                 VALUES (:u_id, :p_id, :s_id, :code, :brand, :name, :qty, :price)
@@ -82,7 +85,7 @@ async def add_to_cart(item: CartItemIn):
                     created_at = NOW()
                 RETURNING quantity;
             """)
-            result = conn.execute(query, {
+            result = await conn.execute(query, {
                 "u_id": item.user_id,
                 "p_id": item.product_id,
                 "s_id": item.supplier_id,
@@ -93,7 +96,7 @@ async def add_to_cart(item: CartItemIn):
                 "price": item.price_eur
             })
             new_quantity = result.scalar()
-            conn.commit()
+            await conn.commit()
 
         return {"status": "success", "message": "Кошик оновлено", "new_quantity": new_quantity}
     except Exception as e:
@@ -108,7 +111,7 @@ async def add_to_cart(item: CartItemIn):
 @router.get("/{user_id}")
 async def get_cart(user_id: str):
     try:
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
             query = text(f"""
                 SELECT
                     c.id,
@@ -126,7 +129,7 @@ async def get_cart(user_id: str):
                 WHERE c.user_id = :u_id
                 ORDER BY c.created_at DESC
             """)
-            rows = conn.execute(query, {"u_id": user_id})
+            rows = await conn.execute(query, {"u_id": user_id})
             items = [dict(row._mapping) for row in rows]
             total_eur = sum(item['price_eur'] * item['quantity'] for item in items)
 
@@ -150,14 +153,14 @@ async def update_quantity(user_id: str, supplier_id: int, code: str, quantity: i
     if quantity < 1:
         raise HTTPException(status_code=400, detail="Кількість не може бути менше 1")
     try:
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
             query = text(f"""
                 UPDATE {TABLE_CART}
                 SET quantity = :qty, created_at = NOW()
                 WHERE user_id = :u_id AND supplier_id = :s_id AND code = :code
             """)
-            conn.execute(query, {"qty": quantity, "u_id": user_id, "s_id": supplier_id, "code": code})
-            conn.commit()
+            await conn.execute(query, {"qty": quantity, "u_id": user_id, "s_id": supplier_id, "code": code})
+            await conn.commit()
         return {"status": "success", "message": "Кількість оновлено"}
     except Exception as e:
         print(f"Cart PATCH Error: {e}")
@@ -171,13 +174,13 @@ async def update_quantity(user_id: str, supplier_id: int, code: str, quantity: i
 @router.delete("/{user_id}/{supplier_id}/{code}")
 async def remove_item(user_id: str, supplier_id: int, code: str):
     try:
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
             query = text(f"""
                 DELETE FROM {TABLE_CART}
                 WHERE user_id = :u_id AND supplier_id = :s_id AND code = :code
             """)
-            conn.execute(query, {"u_id": user_id, "s_id": supplier_id, "code": code})
-            conn.commit()
+            await conn.execute(query, {"u_id": user_id, "s_id": supplier_id, "code": code})
+            await conn.commit()
         return {"status": "success", "message": "Товар видалено з кошика"}
     except Exception as e:
         print(f"Cart DELETE Item Error: {e}")
@@ -191,10 +194,10 @@ async def remove_item(user_id: str, supplier_id: int, code: str):
 @router.delete("/{user_id}")
 async def clear_cart(user_id: str):
     try:
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
             query = text(f"DELETE FROM {TABLE_CART} WHERE user_id = :u_id")
-            conn.execute(query, {"u_id": user_id})
-            conn.commit()
+            await conn.execute(query, {"u_id": user_id})
+            await conn.commit()
         return {"status": "success", "message": "Кошик очищено"}
     except Exception as e:
         print(f"Cart CLEAR Error: {e}")
@@ -214,46 +217,54 @@ async def clear_cart(user_id: str):
 async def validate_prices(data: ValidatePricesSchema):
     try:
         # Отримуємо актуальний курс
-        rate = get_eur_to_uah()
-
-        result_items = []
-        prices_changed = False
-
-        with engine.connect() as conn:
-            for item in data.items:
-                row = conn.execute(text(f"""
+        rate = await asyncio.to_thread(get_eur_to_uah)
+
+        items = data.items
+        if not items:
+            return {"prices_changed": False, "rate": rate, "items": []}
+
+        # ОДИН запит на весь кошик: масиви (code, supplier_id) -> unnest -> LATERAL пошук ціни.
+        # WITH ORDINALITY зберігає порядок рядків кошика.
+        async with async_engine.connect() as conn:
+            rows = (await conn.execute(text(f"""
+                SELECT v.idx, p.price_eur
+                FROM unnest(CAST(:codes AS text[]), CAST(:supplier_ids AS integer[]))
+                     WITH ORDINALITY AS v(code, supplier_id, idx)
+                LEFT JOIN LATERAL (
                     SELECT price_eur FROM {TABLE_CATALOG}
-                    WHERE code = :code AND supplier_id = :supplier_id
+                    WHERE code = v.code AND supplier_id = v.supplier_id
                     LIMIT 1
-                """), {
-                    "code": item.code,
-                    "supplier_id": item.supplier_id,
-                }).fetchone()
-
-                if row is None:
-                    # Товар не знайдений в каталозі — залишаємо як є
-                    result_items.append({
-                        "code": item.code,
-                        "supplier_id": item.supplier_id,
-                        "price_eur": item.price_eur,
-                        "price_uah": round(float(item.price_eur) * rate),
-                        "changed": False,
-                    })
-                    continue
-
-                actual_price = round(float(row.price_eur) * PRICE_MARKUP, 2)
-                # Порівнюємо з точністю до 4 знаків після коми
-                changed = round(actual_price, 4) != round(item.price_eur, 4)
-                if changed:
-                    prices_changed = True
-
-                result_items.append({
-                    "code": item.code,
-                    "supplier_id": item.supplier_id,
-                    "price_eur": actual_price,
-                    "price_uah": round(float(actual_price) * rate),
-                    "changed": changed,
-                })
+                ) p ON TRUE
+                ORDER BY v.idx
+            """), {
+                "codes": [item.code for item in items],
+                "supplier_ids": [item.supplier_id for item in items],
+            })).fetchall()
+
+        # Націнка і курс — одним векторним проходом
+        db_price = np.array(
+            [np.nan if row.price_eur is None else float(row.price_eur) for row in rows], dtype=np.float64
+        )
+        client_price = np.array([float(item.price_eur) for item in items], dtype=np.float64)
+        found = ~np.isnan(db_price)
+
+        # Товар не знайдений в каталозі — залишаємо ціну клієнта як є
+        actual_price = np.where(found, np.round(db_price * PRICE_MARKUP, 2), client_price)
+        # Порівнюємо з точністю до 4 знаків після коми
+        changed = found & (np.round(actual_price, 4) != np.round(client_price, 4))
+        price_uah = np.round(actual_price * rate)
+
+        result_items = [
+            {
+                "code": item.code,
+                "supplier_id": item.supplier_id,
+                "price_eur": float(actual_price[i]),
+                "price_uah": int(price_uah[i]),
+                "changed": bool(changed[i]),
+            }
+            for i, item in enumerate(items)
+        ]
+        prices_changed = bool(changed.any())
 
         return {
             "prices_changed": prices_changed,
@@ -270,13 +281,24 @@ async def validate_prices(data: ValidatePricesSchema):
 # 7. СТВОРЕННЯ ЗАМОВЛЕННЯ
 # ───────────────────────────────────────────────
 
+def pair_item_ids(rows, items) -> list:
+    """
+    id вставлених позицій у порядку items. Порядок рядків RETURNING Postgres не гарантує,
+    тож пари шукаються за (product_id, supplier_id, quantity); позиції з однаковим ключем рівноцінні.
+    """
+    ids = defaultdict(deque)
+    for row in rows:
+        ids[(row.product_id, row.supplier_id, row.quantity)].append(row.id)
+    return [ids[(item["product_id"], item["supplier_id"], item["quantity"])].popleft() for item in items]
+
+
 @router.post("/create-order")
 async def create_order(data: CreateOrderSchema, background_tasks: BackgroundTasks):
     try:
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
 
             # КРОК 1: Створюємо замовлення
-            order_result = conn.execute(text(f"""
+            order_result = await conn.execute(text(f"""
                 INSERT INTO {TABLE_ORDERS} (
                     user_id, total_price_eur, total_price_uah, status,
                     payment_method, ship_first_name, ship_last_name,
@@ -305,28 +327,37 @@ async def create_order(data: CreateOrderSchema, background_tasks: BackgroundTask
             order_id = order_row.id
             order_number = str(order_row.order_number).zfill(6)
 
-            # КРОК 2: Вставляємо товари
-            for item in data.items:
-                conn.execute(text(f"""
-                    INSERT INTO {TABLE_ORDER_ITEMS} (
-                        order_id, product_id, supplier_id,
-                        code, brand, price_eur, quantity
-                    ) VALUES (
-                        :order_id, :product_id, :supplier_id,
-                        :code, :brand, :price_eur, :quantity
-                    );
-                """), {
-                    "order_id": order_id,
-                    "product_id": item.product_id,
-                    "supplier_id": item.supplier_id,
-                    "code": item.code,
-                    "brand": item.brand,
-                    "price_eur": item.price_eur,
-                    "quantity": item.quantity,
-                })
+            # КРОК 2: Вставляємо товари — одним INSERT ... SELECT FROM unnest(масиви)
+            items_result = await conn.execute(text(f"""
+                INSERT INTO {TABLE_ORDER_ITEMS} (
+                    order_id, product_id, supplier_id,
+                    code, brand, price_eur, quantity
+                )
+                SELECT CAST(:order_id AS uuid), v.product_id, v.supplier_id,
+                       v.code, v.brand, v.price_eur, v.quantity
+                FROM unnest(
+                    CAST(:product_ids AS bigint[]),
+                    CAST(:supplier_ids AS integer[]),
+                    CAST(:codes AS text[]),
+                    CAST(:brands AS text[]),
+                    CAST(:prices AS numeric[]),
+                    CAST(:quantities AS integer[])
+                ) WITH ORDINALITY AS v(product_id, supplier_id, code, brand, price_eur, quantity, idx)
+                ORDER BY v.idx
+                RETURNING id, product_id, supplier_id, quantity;
+            """), {
+                "order_id": str(order_id),
+                "product_ids": [item.product_id for item in data.items],
+                "supplier_ids": [item.supplier_id for item in data.items],
+                "codes": [item.code for item in data.items],
+                "brands": [item.brand for item in data.items],
+                "prices": [item.price_eur for item in data.items],
+                "quantities": [item.quantity for item in data.items],
+            })
+            item_ids = pair_item_ids(items_result, [item.dict() for item in data.items])
 
             # КРОК 3: Оновлюємо профіль
-            conn.execute(text(f"""
+            await conn.execute(text(f"""
                 INSERT INTO {TABLE_PROFILES} (
                     id, first_name, last_name, phone,
                     city, city_ref, delivery_method,
@@ -365,14 +396,14 @@ async def create_order(data: CreateOrderSchema, background_tasks: BackgroundTask
             })
 
             # КРОК 4: Очищаємо кошик
-            conn.execute(text(f"""
+            await conn.execute(text(f"""
                 DELETE FROM {TABLE_CART} WHERE user_id = :user_id
             """), {"user_id": data.user_id})
 
-            conn.commit()
+            await conn.commit()
 
         # КРОК 5: Email у фоні
-        rate = get_eur_to_uah()
+        rate = await asyncio.to_thread(get_eur_to_uah)
         delivery_info = (
             'Самовивіз (Самбір)' if data.ship_method == 'self'
             else f'НП: {data.ship_city}, {data.ship_branch_full or data.ship_branch}'
@@ -403,6 +434,7 @@ async def create_order(data: CreateOrderSchema, background_tasks: BackgroundTask
             "status": "success",
             "order_number": order_number,
             "order_id": str(order_id),
+            "item_ids": item_ids,
         }
 
     except Exception as e:
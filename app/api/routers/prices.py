@@ -4,6 +4,7 @@ from typing import Optional, Dict
 
 # Імпортуємо функцію обробки
 from app.etl.price_manager import process_all_prices
+from app.services.import_jobs import import_jobs
 
 # Додаємо тег для документації Swagger
 router = APIRouter()
@@ -12,20 +13,41 @@ class ImportRequest(BaseModel):
     supplier: str
     remote_gz_path: Optional[str] = None
     files: Optional[Dict[str, str]] = None
+    force: bool = False  # імпортувати навіть незмінений файл (ігнорувати маніфест)
+    reuse_snapshot: bool = False  # лише перегнати профілі з останнього снапшота бази (вхід не читається)
 
-@router.post("/import")  # Буде доступно за адресою /prices/import
+@router.post("/import", status_code=202)  # Буде доступно за адресою /prices/import
 def run_price_import(req: ImportRequest):
+    """Ставить імпорт у чергу і одразу повертає job_id (сам імпорт іде у фоновому пулі)."""
     try:
-        print(f"[INFO] Starting price import for: {req.supplier}")
+        print(f"[INFO] Queueing price import for: {req.supplier}")
 
-        results = process_all_prices(
-            supplier=req.supplier,
+        job = import_jobs.submit(
+            req.supplier,
+            process_all_prices,
             remote_gz_path=req.remote_gz_path,
-            additional_files=req.files
+            additional_files=req.files,
+            force=req.force,
+            reuse_snapshot=req.reuse_snapshot,
         )
 
-        return {"status": "success", "supplier": req.supplier, "results": results}
+        return {"status": job.status, "supplier": req.supplier, "job_id": job.id}
 
     except Exception as e:
         print(f"[ERROR] Import failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+
+
+@router.get("/import")
+def list_price_imports():
+    """Останні задачі імпорту (нові зверху)."""
+    return [job.to_dict() for job in import_jobs.list()]
+
+
+@router.get("/import/{job_id}")
+def get_price_import(job_id: str):
+    """Статус задачі: етапи, таймінги, результати або помилка."""
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.to_dict()
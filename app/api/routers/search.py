@@ -1,22 +1,66 @@
+import os
 import time
 import re
+import json
+import base64
+from decimal import Decimal, InvalidOperation
 from fastapi import APIRouter, Query, HTTPException, Response
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy import text
 
 # ІМПОРТУЄМО ENGINE ТА НАЗВУ ТАБЛИЦІ
-from app.database import engine, TABLE_CATALOG
+from app.database import async_engine, TABLE_CATALOG
+from app.services.catalog_indexes import report_seq_scans
+from app.services.code_index import get_code_index, NULL_PRICE_SORT
+from app.services.search_cache import search_cache, catalog_generation
 
 router = APIRouter()
 
+# Колонки, які повертає кожна гілка UNION (norm-поля потрібні для ORDER BY)
+SEARCH_COLUMNS = "id, supplier_id, code, unicode, brand, name, stock, price_eur, code_norm, unicode_norm"
+
+# EXPLAIN кожного пошукового запиту (тільки для діагностики — подвоює кількість запитів)
+SEARCH_EXPLAIN_CHECK = os.getenv("SEARCH_EXPLAIN_CHECK", "0") == "1"
+
+# Ціна для сортування: NULL -> sentinel (позиції без ціни — в кінці, як і раніше при NULLS LAST).
+# Без цього кортежне порівняння seek дає NULL, і такі рядки зникали б з наступних сторінок.
+SORT_PRICE = f"COALESCE(u.price_eur, {NULL_PRICE_SORT}) AS sort_price"
+
+# Єдиний порядок сторінок (для OFFSET і для cursor) + id як тай-брейкер
+ORDER_BY = "in_stock DESC, exact_match DESC, sort_price ASC, id ASC"
+
+# Seek-умова: ключі сортування, приведені до ASC, порівнюються як кортеж
+SEEK_CONDITION = """
+    (NOT in_stock, NOT exact_match, sort_price, id)
+    > (NOT CAST(:c_in_stock AS boolean), NOT CAST(:c_exact AS boolean), CAST(:c_price AS numeric), CAST(:c_id AS bigint))
+"""
+
+
+# ----------------------- Cursor (keyset pagination) -----------------------
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Кодує останній рядок сторінки (in_stock, exact_match, sort_price, id) у непрозорий рядок."""
+    payload = [bool(row["in_stock"]), bool(row["exact_match"]), str(row["sort_price"]), int(row["id"])]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[bool, bool, Decimal, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        in_stock, exact, price, row_id = json.loads(raw)
+        return bool(in_stock), bool(exact), Decimal(str(price)), int(row_id)
+    except (ValueError, TypeError, InvalidOperation):
+        raise HTTPException(status_code=400, detail="Некоректний cursor")
+
 
 @router.get("/search", response_model=List[Dict[str, Any]])
-def search_products(
+async def search_products(
         response: Response,
         q: str = Query(..., min_length=2, description="Пошуковий запит"),
         limit: int = Query(50, ge=1, le=200),
-        offset: int = Query(0, ge=0)
-
+        offset: int = Query(0, ge=0),
+        cursor: Optional[str] = Query(None, description="next_cursor з попередньої сторінки (замість offset)"),
 ):
     q_raw = (q or "").strip()
     if not q_raw:
@@ -35,29 +79,67 @@ def search_products(
         print(f"[INFO] API Search: Blocked invalid query: '{q_raw}'")
         return []
 
+    # --- CURSOR: якщо переданий, offset ігнорується (seek замість OFFSET) ---
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None:
+        offset = 0
+
     # ⏱️ СТАРТ ЗАГАЛЬНОГО ТАЙМЕРА
     t_start_total = time.perf_counter()
 
+    # --- КЕШ: ключ = нормалізовані слова + сторінка ---
+    cache_key = (tuple(clean_val(w) for w in words), limit, offset, cursor or "")
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        results, next_cursor = cached
+        total_ms = (time.perf_counter() - t_start_total) * 1000
+        response.headers["X-Search-Cache"] = "HIT"
+        response.headers["X-Total-Search-Ms"] = f"{total_ms:.1f}"
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        print(f"🔍 [SEARCH] Запит: '{q_raw}' | | Offset: {offset} | Знайдено: {len(results)} | CACHE HIT | Total: {total_ms:.1f}ms")
+        return results
+    generation = catalog_generation()
+
     try:
         results: List[Dict[str, Any]] = []
+        code_index = get_code_index()
+        hydrate_ids: List[int] = []
+
+        seek_params: Dict[str, Any] = {}
+        seek_sql = ""
+        if after is not None:
+            seek_sql = f"WHERE {SEEK_CONDITION}"
+            seek_params = {"c_in_stock": after[0], "c_exact": after[1], "c_price": after[2], "c_id": after[3]}
 
-        with engine.connect() as conn:
+        async with async_engine.connect() as conn:
             # СЦЕНАРІЙ А: Два або більше слів (напр. "SACHS 315187")
+            # Кожна гілка UNION — окремий індексний пошук (brand + code/unicode або точний код)
             if len(words) >= 2:
                 w1 = clean_val(words[0])
                 w2 = clean_val("".join(words[1:]))
                 full_combined = clean_val("".join(words))
 
                 sql_query = text(f"""
-                    SELECT id, supplier_id, code, unicode, brand, name, stock, price_eur
-                    FROM {TABLE_CATALOG}
-                    WHERE
-                        (brand_norm LIKE :w1_p AND (code_norm LIKE :w2_p OR unicode_norm LIKE :w2_p))
-                        OR
-                        (brand_norm LIKE :w2_p AND (code_norm LIKE :w1_p OR unicode_norm LIKE :w1_p))
-                        OR
-                        (code_norm = :full OR unicode_norm = :full)
-                    ORDER BY (stock > 0) DESC, price_eur ASC
+                    SELECT id, supplier_id, code, unicode, brand, name, stock, price_eur, in_stock, exact_match, sort_price
+                    FROM (
+                        SELECT u.*, COALESCE(u.stock, 0) > 0 AS in_stock, FALSE AS exact_match, {SORT_PRICE}
+                        FROM (
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE code_norm LIKE :w2_p AND brand_norm LIKE :w1_p
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE unicode_norm LIKE :w2_p AND brand_norm LIKE :w1_p
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE code_norm LIKE :w1_p AND brand_norm LIKE :w2_p
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE unicode_norm LIKE :w1_p AND brand_norm LIKE :w2_p
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE code_norm = :full
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE unicode_norm = :full
+                        ) AS u
+                    ) AS hits
+                    {seek_sql}
+                    ORDER BY {ORDER_BY}
                     LIMIT :limit_val OFFSET :offset_val
                 """)
                 params = {
@@ -65,44 +147,81 @@ def search_products(
                     "w2_p": f"{w2}%",
                     "full": full_combined,
                     "limit_val": limit,
-                    "offset_val": offset
+                    "offset_val": offset,
+                    **seek_params,
                 }
 
+            # СЦЕНАРІЙ Б (in-memory): одне слово, індекс кодів у пам'яті вже побудовано.
+            # Ранжування (і seek по cursor) робить індекс, Postgres лише гідрує <= limit рядків по id.
+            elif code_index is not None:
+                hydrate_ids = code_index.search(q_clean_full, limit=limit, offset=offset, after=after)
+                sql_query = text(f"""
+                    SELECT id, supplier_id, code, unicode, brand, name, stock, price_eur,
+                           COALESCE(stock, 0) > 0 AS in_stock,
+                           (unicode_norm = :q_c OR code_norm = :q_c) AS exact_match,
+                           {SORT_PRICE}
+                    FROM {TABLE_CATALOG} AS u
+                    WHERE id = ANY(:ids)
+                """)
+                params = {"ids": hydrate_ids, "q_c": q_clean_full}
+
             # СЦЕНАРІЙ Б: Одне слово (напр. "GDB1330")
+            # Замість OR по трьох колонках — UNION трьох префіксних пошуків
             else:
                 sql_query = text(f"""
-                    SELECT id, supplier_id, code, unicode, brand, name, stock, price_eur
-                    FROM {TABLE_CATALOG}
-                    WHERE unicode_norm LIKE :q_p OR code_norm LIKE :q_p OR brand_norm LIKE :q_p
-                    ORDER BY
-                        (stock > 0) DESC,                                   -- 1. Спочатку те, що є в наявності
-                        (unicode_norm = :q_c OR code_norm = :q_c) DESC,     -- 2. Потім точні збіги коду
-                        price_eur ASC                                       -- 3. І ТЕПЕР за ціною!
+                    SELECT id, supplier_id, code, unicode, brand, name, stock, price_eur, in_stock, exact_match, sort_price
+                    FROM (
+                        SELECT u.*,
+                               COALESCE(u.stock, 0) > 0 AS in_stock,                        -- 1. Спочатку те, що є в наявності
+                               (u.unicode_norm = :q_c OR u.code_norm = :q_c) AS exact_match, -- 2. Потім точні збіги коду
+                               {SORT_PRICE}
+                        FROM (
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE unicode_norm LIKE :q_p
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE code_norm LIKE :q_p
+                            UNION
+                            SELECT {SEARCH_COLUMNS} FROM {TABLE_CATALOG} WHERE brand_norm LIKE :q_p
+                        ) AS u
+                    ) AS hits
+                    {seek_sql}
+                    ORDER BY {ORDER_BY}                                                     -- 3. І ТЕПЕР за ціною!
                     LIMIT :limit_val OFFSET :offset_val
                 """)
                 params = {
                     "q_p": f"{q_clean_full}%",
                     "q_c": q_clean_full,
                     "limit_val": limit,
-                    "offset_val": offset
+                    "offset_val": offset,
+                    **seek_params,
                 }
 
-                params = {
-                    "q_p": f"{q_clean_full}%",
-                    "q_c": q_clean_full,
-                    "limit_val": limit,
-                    "offset_val": offset
-                }
+            # Діагностика: попередження, якщо якась гілка пішла в Seq Scan
+            if SEARCH_EXPLAIN_CHECK:
+                await conn.run_sync(report_seq_scans, f"search '{q_raw}'", sql_query, params)
 
             # --- ⏱️ ВИМІРЮЄМО ЧИСТИЙ ЧАС SQL ---
             t_sql_start = time.perf_counter()
-            rows = conn.execute(sql_query, params)
+            rows = await conn.execute(sql_query, params)
             t_sql_end = time.perf_counter()
             # ----------------------------------
 
             for row in rows:
                 results.append(dict(row._mapping))
 
+            # Повертаємо порядок, який визначив in-memory індекс
+            if hydrate_ids:
+                rank = {pid: i for i, pid in enumerate(hydrate_ids)}
+                results.sort(key=lambda r: rank.get(r["id"], len(rank)))
+
+        # Повна сторінка -> можна йти далі; cursor = останній рядок.
+        # next_cursor віддається заголовком X-Next-Cursor, а не в тілі: тіло лишається списком,
+        # щоб не ламати контракт з фронтом (response_model=List) для клієнтів без cursor.
+        next_cursor = encode_cursor(results[-1]) if len(results) == limit else None
+        for r in results:
+            r.pop("in_stock", None)
+            r.pop("exact_match", None)
+            r.pop("sort_price", None)
+
         # РОЗРАХУНОК МІЛІСЕКУНД
         sql_ms = (t_sql_end - t_sql_start) * 1000
         total_ms = (time.perf_counter() - t_start_total) * 1000
@@ -110,12 +229,26 @@ def search_products(
         # Додаємо в хедери відповіді
         response.headers["X-SQL-Execution-Ms"] = f"{sql_ms:.1f}"
         response.headers["X-Total-Search-Ms"] = f"{total_ms:.1f}"
+        response.headers["X-Search-Source"] = "memory" if len(words) < 2 and code_index is not None else "sql"
+        response.headers["X-Search-Cache"] = "MISS"
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        search_cache.set(cache_key, (results, next_cursor), generation=generation)
 
         # Гарний лог у консоль
-        print(f"🔍 [SEARCH] Запит: '{q_raw}' | | Offset: {offset} | Знайдено: {len(results)} | SQL: {sql_ms:.1f}ms | Total: {total_ms:.1f}ms")
+        print(f"🔍 [SEARCH] Запит: '{q_raw}' | | Offset: {offset} | Cursor: {'yes' if after else 'no'} | Знайдено: {len(results)} | SQL: {sql_ms:.1f}ms | Total: {total_ms:.1f}ms")
 
         return results
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[ERROR] Database search failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search/cache-stats")
+def search_cache_stats():
+    """Лічильники кешу пошуку (hits / misses / інвалідації)."""
+    return search_cache.stats()
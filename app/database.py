@@ -1,6 +1,9 @@
 import os
+from uuid import uuid4
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 
 # 1. Завантажуємо змінні
 load_dotenv()
@@ -22,12 +25,54 @@ else:
     DB_NAME = os.getenv("DB_NAME", "postgres")
     DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Розмір пулу — однаковий для sync і async engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
 # 3. Створення ENGINE (один на весь додаток)
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW
+)
+
+
+# 3.1 ASYNC ENGINE (asyncpg) — для async-роутерів API, щоб не блокувати event loop.
+# ETL і bootstrap лишаються на синхронному engine.
+def _build_async_url(sync_url: str):
+    url = make_url(sync_url).set(drivername="postgresql+asyncpg")
+    # asyncpg не знає libpq-параметра sslmode -> передаємо як ssl в connect_args
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    return url.set(query=query), sslmode
+
+
+def _is_transaction_pooler(url) -> bool:
+    """Supabase pooler (pgbouncer/Supavisor) у transaction mode слухає порт 6543."""
+    return url.port == 6543
+
+
+ASYNC_DATABASE_URL, _async_sslmode = _build_async_url(DATABASE_URL)
+# Transaction pooler не тримає prepared statements між транзакціями -> кеш asyncpg вимкнено
+# за замовчуванням (інакше "prepared statement ... does not exist"). Явне значення env має пріоритет.
+DB_ASYNC_STATEMENT_CACHE_SIZE = int(os.getenv(
+    "DB_ASYNC_STATEMENT_CACHE_SIZE", "0" if _is_transaction_pooler(ASYNC_DATABASE_URL) else "100"
+))
+_async_connect_args = {"statement_cache_size": DB_ASYNC_STATEMENT_CACHE_SIZE}
+if DB_ASYNC_STATEMENT_CACHE_SIZE == 0:
+    # Кеш SQLAlchemy теж вимикаємо, а безіменні statements — з унікальними іменами (pgbouncer)
+    ASYNC_DATABASE_URL = ASYNC_DATABASE_URL.update_query_dict({"prepared_statement_cache_size": "0"})
+    _async_connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+if _async_sslmode:
+    _async_connect_args["ssl"] = _async_sslmode
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    connect_args=_async_connect_args,
 )
 
 # --- 🎯 НОВИЙ БЛОК: НАЗВИ ТАБЛИЦЬ ---
@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+
+from app.services.paths import SNAPSHOT_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+# ===========================================
+# СНАПШОТ ПІДГОТОВЛЕНОЇ БАЗИ (Parquet)
+# ===========================================
+# Найдорожче в імпорті — підготовка base_df: завантаження, парсинг, злиття,
+# бренди, переклад. Результат зберігається в data/snapshots/<supplier>.parquet
+# (zstd, текстові колонки крім code/unicode — dictionary -> category в pandas).
+# Наступний імпорт того самого входу (profile_filter, змінена націнка, force)
+# читає снапшот через memory map замість повної підготовки.
+# Ключ снапшота — хеш входу + все, від чого залежить підготовка (бренди, переклад...),
+# він пишеться у метадані файлу. Інший ключ -> снапшот ігнорується і перезаписується.
+# Хеш FTP-входу (SIZE + MDTM) відомий до завантаження, тож снапшот знаходиться без FTP.
+# reuse_snapshot=True в імпорті — взяти останній снапшот без перевірки ключа
+# (лише змінені націнки/профілі, вхід свідомо не перечитується).
+
+BASE_SNAPSHOT = os.getenv("BASE_SNAPSHOT", "1") == "1" and pq is not None
+BASE_SNAPSHOT_COMPRESSION = os.getenv("BASE_SNAPSHOT_COMPRESSION", "zstd")
+
+# Міняти при зміні парсера / підготовки, щоб старі снапшоти не використовувались
+SNAPSHOT_VERSION = 1
+
+_KEY_META = b"mg_snapshot_key"
+
+# Майже унікальні колонки лишаються звичайними рядками, решта текстових — category
+_PLAIN_STRING_COLUMNS = ("code", "unicode")
+
+
+def snapshot_key(in_hash: Optional[str], **parts: Any) -> Optional[str]:
+    """None, якщо хеш входу ще невідомий (FTP-потік не дочитаний)."""
+    if in_hash is None:
+        return None
+    raw = json.dumps({"version": SNAPSHOT_VERSION, "input": in_hash, **parts},
+                     sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def snapshot_path(supplier: str) -> Path:
+    return SNAPSHOT_DIR / f"{supplier.lower()}.parquet"
+
+
+def _to_table(df: pd.DataFrame) -> "pa.Table":
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if col in _PLAIN_STRING_COLUMNS:
+            continue
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype):
+            df[col] = df[col].astype("category")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _fixed_schema(schema: "pa.Schema") -> "pa.Schema":
+    """Однакові типи для всіх шматків: dictionary<int32, string> замість int8/int16 за розміром."""
+    fields = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+class BaseSnapshotWriter:
+    """
+    Пише підготовлені шматки у тимчасовий файл; commit(key) робить його снапшотом.
+    Помилка запису лише вимикає снапшот — імпорт від цього не падає.
+    """
+
+    def __init__(self, supplier: str):
+        self.supplier = supplier
+        self.path = snapshot_path(supplier)
+        self._tmp = self.path.with_suffix(".parquet.tmp")
+        self._writer = None
+        self._schema = None
+        self.rows = 0
+        self.failed = not BASE_SNAPSHOT
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.failed:
+            return
+        try:
+            table = _to_table(df)
+            if self._writer is None:
+                self._schema = _fixed_schema(table.schema)
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = pq.ParquetWriter(self._tmp, self._schema, compression=BASE_SNAPSHOT_COMPRESSION)
+            self._writer.write_table(table.cast(self._schema))
+            self.rows += len(df)
+        except Exception as e:
+            print(f"[WARN] Base snapshot for {self.supplier} disabled: {e}")
+            self.abort()
+
+    def commit(self, key: Optional[str]) -> bool:
+        if self.failed or self._writer is None or key is None:
+            self.abort()
+            return False
+        try:
+            self._writer.add_key_value_metadata({_KEY_META: key.encode()})
+            self._writer.close()
+            self._writer = None
+            self._tmp.replace(self.path)
+            size_mb = self.path.stat().st_size / 1024 / 1024
+            print(f"[INFO] Base snapshot saved: {self.path.name} ({self.rows} rows, {size_mb:.1f} MB)")
+            return True
+        except Exception as e:
+            print(f"[WARN] Base snapshot for {self.supplier} was not saved: {e}")
+            self.abort()
+            return False
+
+    def abort(self) -> None:
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        self._tmp.unlink(missing_ok=True)
+
+
+def save_snapshot(supplier: str, df: pd.DataFrame, key: Optional[str]) -> bool:
+    writer = BaseSnapshotWriter(supplier)
+    writer.write(df)
+    return writer.commit(key)
+
+
+def dump_frame(df: pd.DataFrame, path: Path) -> Path:
+    """Разовий Parquet без ключа (напр. щоб передати базу в інші процеси)."""
+    pq.write_table(_to_table(df), path, compression=BASE_SNAPSHOT_COMPRESSION)
+    return path
+
+
+def read_frame(path: Path) -> pd.DataFrame:
+    return pq.read_table(path, memory_map=True).to_pandas()
+
+
+def open_snapshot(supplier: str, key: Optional[str], any_key: bool = False) -> Optional["pq.ParquetFile"]:
+    """
+    Снапшот з тим самим ключем (memory map) або None.
+    any_key=True — останній снапшот незалежно від ключа (явний перегін лише профілів).
+    """
+    if not BASE_SNAPSHOT or (key is None and not any_key):
+        return None
+    path = snapshot_path(supplier)
+    if not path.exists():
+        return None
+    try:
+        pf = pq.ParquetFile(path, memory_map=True)
+        if not any_key and (pf.metadata.metadata or {}).get(_KEY_META) != key.encode():
+            return None
+        return pf
+    except Exception as e:
+        print(f"[WARN] Base snapshot {path.name} is unreadable, ignoring: {e}")
+        return None
+
+
+def iter_snapshot_chunks(pf: "pq.ParquetFile", chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Як iter_base_chunks: chunk_rows=None — один DataFrame, інакше шматки (мінімум один)."""
+    if chunk_rows is None:
+        yield pf.read().to_pandas()
+        return
+    yielded = False
+    for batch in pf.iter_batches(batch_size=chunk_rows):
+        yield pa.Table.from_batches([batch]).to_pandas()
+        yielded = True
+    if not yielded:
+        yield pf.schema_arrow.empty_table().to_pandas()
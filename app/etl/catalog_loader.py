@@ -0,0 +1,181 @@
+import io
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+# ===========================================
+# ЗАЛИВКА DATAFRAME У POSTGRESQL (COPY FROM STDIN)
+# ===========================================
+# Замість pandas.to_sql (тисячі INSERT-ів) DataFrame нарізається на шматки,
+# кожен шматок серіалізується в CSV у пам'яті і йде в базу одним COPY.
+# Якщо COPY не вдався (не psycopg2, дивні типи, ...) — відкат до savepoint
+# і стара заливка через to_sql.
+
+CATALOG_COPY_LOADER = os.getenv("CATALOG_COPY_LOADER", "1") == "1"
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "50000"))
+
+# Маркер NULL у CSV: порожній рядок лишається порожнім рядком, а не NULL (як і в to_sql)
+COPY_NULL = "\\N"
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def copy_dataframe(conn, df: pd.DataFrame, table: str, chunk_rows: int = COPY_CHUNK_ROWS) -> int:
+    """
+    Стрімить df у таблицю через COPY ... FROM STDIN (CSV), шматками по chunk_rows.
+    conn — SQLAlchemy Connection (всередині транзакції). Повертає кількість рядків.
+    """
+    cols = ", ".join(_quote_ident(c) for c in df.columns)
+    sql = f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+
+    dbapi_conn = conn.connection.dbapi_connection
+    total = 0
+    with dbapi_conn.cursor() as cur:
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            buf = io.StringIO()
+            chunk.to_csv(buf, index=False, header=False, na_rep=COPY_NULL)
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+            total += len(chunk)
+    return total
+
+
+def load_dataframe(conn, df: pd.DataFrame, table: str, use_copy: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Заливає df у table: COPY (якщо увімкнено), інакше/при помилці — to_sql.
+    Повертає {"method", "rows", "seconds"} для звіту по етапах.
+    """
+    use_copy = CATALOG_COPY_LOADER if use_copy is None else use_copy
+    t0 = time.perf_counter()
+
+    if use_copy:
+        try:
+            # Savepoint: невдалий COPY не ламає зовнішню транзакцію
+            with conn.begin_nested():
+                rows = copy_dataframe(conn, df, table)
+            return {"method": "copy", "rows": rows, "seconds": time.perf_counter() - t0}
+        except Exception as e:
+            print(f"[WARN] COPY into {table} failed, falling back to to_sql: {str(e).splitlines()[0]}")
+            t0 = time.perf_counter()
+
+    df.to_sql(table, con=conn, if_exists="append", index=False)
+    return {"method": "to_sql", "rows": len(df), "seconds": time.perf_counter() - t0}
+
+
+# ----------------------- temp_import для заливки шматками -----------------------
+# Прайс може приходити кількома шматками (потоковий ETL), тому дублі ключа
+# (brand_norm, code_norm, supplier_id) між шматками прибираються вже в базі:
+# import_seq зберігає порядок рядків, лишається перший — як drop_duplicates у pandas.
+
+def create_temp_import(conn, table: str) -> None:
+    """temp_import зі структурою каталогу, але без індексів (COPY швидший, дублі ще можливі)."""
+    conn.execute(text("DROP TABLE IF EXISTS temp_import"))
+    conn.execute(text(f"CREATE TEMP TABLE temp_import (LIKE {table} INCLUDING ALL EXCLUDING INDEXES)"))
+    conn.execute(text("ALTER TABLE temp_import ADD COLUMN import_seq bigserial"))
+
+
+def finalize_temp_import(conn) -> int:
+    """Прибирає дублі між шматками і будує індекс для КРОКУ Г. Повертає кількість видалених дублів."""
+    res = conn.execute(text("""
+        DELETE FROM temp_import t
+        USING temp_import d
+        WHERE d.brand_norm = t.brand_norm
+          AND d.code_norm = t.code_norm
+          AND d.supplier_id = t.supplier_id
+          AND d.import_seq < t.import_seq
+    """))
+    conn.execute(text("CREATE INDEX ON temp_import (brand_norm, code_norm)"))
+    conn.execute(text("ANALYZE temp_import"))
+    return res.rowcount
+
+
+def format_stages(stages: List[Dict[str, Any]]) -> str:
+    """[{"stage", "rows", "seconds"}, ...] -> 'prepare: 1000 rows 0.12s | load[copy]: ...'"""
+    parts = []
+    for s in stages:
+        label = s["stage"] + (f"[{s['method']}]" if s.get("method") else "")
+        rows = f"{s['rows']} rows " if s.get("rows") is not None else ""
+        parts.append(f"{label}: {rows}{s['seconds']:.2f}s")
+    return " | ".join(parts)
+
+
+# ===========================================
+# MERGE temp_import -> КАТАЛОГ (повний або diff-режим)
+# ===========================================
+# diff-режим: рядок каталогу переписується лише тоді, коли справді змінились
+# price_eur або stock. Незмінені рядки не генерують WAL / мертвих кортежів.
+
+CATALOG_DIFF_IMPORT = os.getenv("CATALOG_DIFF_IMPORT", "1") == "1"
+
+CATALOG_INSERT_COLUMNS = "brand, code, unicode, name, stock, price_eur, supplier_id, brand_norm, code_norm, unicode_norm"
+
+
+def merge_temp_import(conn, table: str, supplier_id: int, diff: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    КРОК В (UPSERT) + КРОК Г (ОБНУЛЕННЯ) з temp_import у table.
+    Повертає лічильники {"staged", "inserted", "updated", "unchanged", "zeroed", "diff"} і таймінги етапів.
+    """
+    diff = CATALOG_DIFF_IMPORT if diff is None else diff
+    stats: Dict[str, Any] = {"diff": diff}
+    stages: List[Dict[str, Any]] = []
+
+    stats["staged"] = conn.execute(text("SELECT count(*) FROM temp_import")).scalar()
+
+    # КРОК В: UPSERT (Зберігаємо старі ID, оновлюємо ціну та сток)
+    # Поле name не оновлюємо. xmax = 0 -> рядок щойно вставлений, інакше — оновлений.
+    t0 = time.perf_counter()
+    diff_filter = f"""
+        WHERE {table}.price_eur IS DISTINCT FROM EXCLUDED.price_eur
+           OR {table}.stock IS DISTINCT FROM EXCLUDED.stock
+    """ if diff else ""
+    row = conn.execute(text(f"""
+        WITH up AS (
+            INSERT INTO {table} ({CATALOG_INSERT_COLUMNS})
+            SELECT {CATALOG_INSERT_COLUMNS}
+            FROM temp_import
+            ON CONFLICT (brand_norm, code_norm, supplier_id)
+            DO UPDATE SET
+                price_eur = EXCLUDED.price_eur,
+                stock = EXCLUDED.stock
+            {diff_filter}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted) AS inserted,
+               count(*) FILTER (WHERE NOT inserted) AS updated
+        FROM up
+    """)).fetchone()
+    stats["inserted"] = int(row.inserted)
+    stats["updated"] = int(row.updated)
+    stats["unchanged"] = stats["staged"] - stats["inserted"] - stats["updated"]
+    stages.append({"stage": "upsert", "rows": stats["inserted"] + stats["updated"], "seconds": time.perf_counter() - t0})
+
+    # КРОК Г: ОБНУЛЕННЯ (Товари, яких немає в новому прайсі, ставимо stock = 0)
+    # У diff-режимі не чіпаємо рядки, де stock вже 0.
+    t0 = time.perf_counter()
+    zero_filter = "AND stock IS DISTINCT FROM 0" if diff else ""
+    zero_res = conn.execute(text(f"""
+        UPDATE {table}
+        SET stock = 0
+        WHERE supplier_id = :sid
+        {zero_filter}
+        AND NOT EXISTS (
+            SELECT 1 FROM temp_import t
+            WHERE t.brand_norm = {table}.brand_norm
+            AND t.code_norm = {table}.code_norm
+        )
+    """), {"sid": supplier_id})
+    stats["zeroed"] = zero_res.rowcount
+    stages.append({"stage": "zero-out", "rows": stats["zeroed"], "seconds": time.perf_counter() - t0})
+
+    stats["stages"] = stages
+    return stats
+
+
+def catalog_changed(stats: Dict[str, Any]) -> bool:
+    return bool(stats.get("inserted") or stats.get("updated") or stats.get("zeroed"))
@@ -0,0 +1,189 @@
+import gzip
+import math
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+import xlsxwriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+# ===========================================
+# ЕКСПОРТ ВИХІДНИХ ПРАЙСІВ
+# ===========================================
+# Формат профілю (format у profiles.yaml):
+#   xlsx    — xlsxwriter у режимі constant_memory: рядки пишуться одразу з колонок
+#             шматка, увесь аркуш у пам'яті не тримається; понад межу аркуша
+#             (1 048 576 рядків) — продовження на Sheet2, Sheet3... з тією ж шапкою;
+#   csv     — дописування шматків у файл (як і раніше);
+#   csv.gz  — те саме, але одразу стиснуте gzip;
+#   parquet — pyarrow, по row group на шматок.
+# Усі експортери однакові: write(df) на кожен шматок, close() -> готовий файл.
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Шапка як у pandas.to_excel (жирна, з рамкою, по центру)
+_XLSX_HEADER_FORMAT = {"bold": True, "top": 1, "right": 1, "bottom": 1, "left": 1, "align": "center", "valign": "top"}
+
+_INF = math.inf
+
+# Межа аркуша xlsx (разом із шапкою): xlsxwriter мовчки відкидає все, що далі
+XLSX_MAX_ROWS = 1_048_576
+
+
+class XlsxExporter:
+    ext = "xlsx"
+    content_type = XLSX_CONTENT_TYPE
+
+    def __init__(self, path: Path, csv_cfg: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self._book = None
+        self._sheet = None
+        self._row = 0
+        self._columns = None
+        self._header_fmt = None
+        self._sheets = 0
+
+    def _open(self, columns) -> None:
+        self._book = xlsxwriter.Workbook(str(self.path), {"constant_memory": True})
+        self._header_fmt = self._book.add_format(_XLSX_HEADER_FORMAT)
+        self._columns = [str(name) for name in columns]
+        self._add_sheet()
+
+    def _add_sheet(self) -> None:
+        """Новий аркуш Sheet1, Sheet2, ... з тією ж шапкою (прайс більший за межу аркуша)."""
+        self._sheets += 1
+        self._sheet = self._book.add_worksheet(f"Sheet{self._sheets}")
+        for c, name in enumerate(self._columns):
+            self._sheet.write_string(0, c, name, self._header_fmt)
+        self._row = 1
+        if self._sheets > 1:
+            print(f"[WARN] {self.path.name}: more than {XLSX_MAX_ROWS - 1} rows, continuing on Sheet{self._sheets}")
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._book is None:
+            self._open(df.columns)
+
+        # constant_memory: лише рядок за рядком. Колонки -> списки Python один раз на шматок.
+        columns = [df[col].astype(object).tolist() for col in df.columns]
+        write_number = self._sheet.write_number
+        write_string = self._sheet.write_string
+        write = self._sheet.write
+        r = self._row
+        for values in zip(*columns):
+            if r >= XLSX_MAX_ROWS:
+                self._add_sheet()
+                write_number = self._sheet.write_number
+                write_string = self._sheet.write_string
+                write = self._sheet.write
+                r = self._row
+            for c, v in enumerate(values):
+                # None / NaN — порожня клітинка (як na_rep="" у pandas)
+                if v is None or v != v:
+                    continue
+                if isinstance(v, str):
+                    write_string(r, c, v)
+                elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                    if v == _INF or v == -_INF:
+                        write_string(r, c, "inf" if v > 0 else "-inf")
+                    else:
+                        write_number(r, c, v)
+                else:
+                    write(r, c, v)
+            r += 1
+        self._row = r
+
+    def close(self) -> None:
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+
+    def abort(self) -> None:
+        # Дані constant_memory лежать у тимчасових файлах xlsxwriter — вони зникнуть разом з об'єктом
+        self._book = None
+        self._sheet = None
+
+
+class CsvExporter:
+    ext = "csv"
+    content_type = "text/csv"
+
+    def __init__(self, path: Path, csv_cfg: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.delimiter = (csv_cfg or {}).get("delimiter", ";")
+        self._fh = None
+
+    def _open_file(self):
+        return open(self.path, "w", encoding="utf-8", newline="")
+
+    def write(self, df: pd.DataFrame) -> None:
+        # Шапка — лише з першим шматком
+        header = self._fh is None
+        if header:
+            self._fh = self._open_file()
+        df.to_csv(self._fh, index=False, sep=self.delimiter, header=header)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def abort(self) -> None:
+        self.close()
+
+
+class CsvGzExporter(CsvExporter):
+    ext = "csv.gz"
+    content_type = "application/gzip"
+
+    def _open_file(self):
+        return gzip.open(self.path, "wt", encoding="utf-8", newline="", compresslevel=6)
+
+
+class ParquetExporter:
+    ext = "parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def __init__(self, path: Path, csv_cfg: Optional[Dict[str, Any]] = None):
+        if pq is None:
+            raise RuntimeError("Parquet export requires pyarrow")
+        self.path = path
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # category (снапшот бази) -> звичайні значення, щоб схема була однакова для всіх шматків
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def abort(self) -> None:
+        self.close()
+
+
+EXPORTERS = {
+    "xlsx": XlsxExporter,
+    "csv": CsvExporter,
+    "csv.gz": CsvGzExporter,
+    "parquet": ParquetExporter,
+}
+
+
+def make_exporter(format_: str, path_stem: Path, csv_cfg: Optional[Dict[str, Any]] = None):
+    """Експортер за форматом профілю; шлях = path_stem + розширення формату. Невідомий формат — csv."""
+    cls = EXPORTERS.get(str(format_).lower(), CsvExporter)
+    return cls(path_stem.with_name(f"{path_stem.name}.{cls.ext}"), csv_cfg)
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.services.paths import STATE_DIR
+from app.etl.raw_sources import RawInput, input_digest
+
+# ===========================================
+# МАНІФЕСТ ІМПОРТУ (пропуск незмінених прайсів)
+# ===========================================
+# Постачальники часто повторно публікують той самий файл. На кожного постачальника
+# зберігається маленький JSON: хеш сирого входу, кількість позицій, час імпорту і
+# для кожного профілю — хеш його налаштувань (націнка, колонки, курс...) + результат.
+# Профіль пропускається, якщо і вхід, і його налаштування не змінились.
+# Змінився лише profiles.yaml (або курс) -> переганяються тільки змінені профілі.
+
+IMPORT_SKIP_UNCHANGED = os.getenv("IMPORT_SKIP_UNCHANGED", "1") == "1"
+MANIFEST_DIR = STATE_DIR / "import_manifests"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _json_hash(obj: Any) -> str:
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _manifest_path(supplier: str):
+    return MANIFEST_DIR / f"{supplier.lower()}.json"
+
+
+def load_manifest(supplier: str) -> Dict[str, Any]:
+    path = _manifest_path(supplier)
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Import manifest for {supplier} is unreadable, ignoring: {e}")
+    return {"supplier": supplier, "profiles": {}}
+
+
+def save_manifest(supplier: str, manifest: Dict[str, Any]) -> None:
+    MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+    path = _manifest_path(supplier)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+
+def input_hash(local_files: Dict[str, RawInput], supplier_cfg: Dict[str, Any]) -> Optional[str]:
+    """
+    Хеш усього входу: байти кожного файлу (з роллю) + конфіг постачальника з suppliers.yaml.
+    None — якщо FTP-потік ще не дочитаний (хеш стане відомий після розбору).
+    """
+    parts: Dict[str, Any] = {"supplier_cfg": supplier_cfg}
+    for role in sorted(local_files):
+        digest = input_digest(local_files[role])
+        if digest is None:
+            return None
+        parts[role] = digest
+    return _json_hash(parts)
+
+
+def profile_hash(
+        settings: Dict[str, Any], supplier_id: Optional[int], rounding: Dict[str, int], translation_version: Any = None,
+) -> str:
+    """
+    Хеш налаштувань профілю разом із курсом — усе, від чого залежить вихідний файл.
+    translation_version — версія пам'яті перекладів: фоновий переклад додав назви,
+    той самий вхід дає інші назви, тож профіль треба перегнати.
+    """
+    return _json_hash({"settings": settings, "supplier_id": supplier_id, "rounding": rounding,
+                       "translation_version": translation_version})
+
+
+def unchanged_profiles(manifest: Dict[str, Any], in_hash: Optional[str], hashes: Dict[str, str]) -> List[str]:
+    """Профілі, для яких уже є результат з тим самим входом і тими самими налаштуваннями."""
+    if in_hash is None:
+        return []
+    done = manifest.get("profiles") or {}
+    return [
+        name for name, p_hash in hashes.items()
+        if (done.get(name) or {}).get("input_hash") == in_hash and done[name].get("hash") == p_hash
+    ]
+
+
+def record_import(
+        manifest: Dict[str, Any],
+        in_hash: Optional[str],
+        rows: int,
+        files: Dict[str, RawInput],
+        hashes: Dict[str, str],
+        results: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Оновлює маніфест після імпорту. Пропущені профілі лишаються як були,
+    профіль з помилкою запису в БД не фіксується — наступний імпорт його повторить.
+    """
+    now = _now_iso()
+    manifest["input_hash"] = in_hash
+    manifest["rows"] = rows
+    manifest["imported_at"] = now
+    manifest["files"] = {role: getattr(src, "name", str(src)) for role, src in files.items()}
+
+    profiles = manifest.setdefault("profiles", {})
+    for res in results:
+        if res.get("skipped") or res.get("db_error"):
+            continue
+        profiles[res["name"]] = {
+            "hash": hashes[res["name"]],
+            "input_hash": in_hash,
+            "key": res["key"],
+            "url": res["url"],
+            "rows": rows,
+            "imported_at": now,
+        }
+    return manifest
@@ -1,15 +1,26 @@
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Set, Tuple
 import yaml
 import time
 
 # --- ОНОВЛЕНІ ІМПОРТИ ---
 from .translation_manager import process_price_translation
+from app.services.translator import translation_version
 # from app.services.local_db import init_local_db, backup_db_to_r2
-from app.services.paths import CONFIG_DIR
-from .price_processor import process_one_price, prepare_base_df
+from app.services.paths import CONFIG_DIR, TEMP_DIR
+from .price_processor import (
+    fetch_supplier_files, iter_base_chunks, stream_chunk_rows, PriceProfileWriter, price_matrix,
+)
 from app.services.exchange import get_eur_to_uah
 from app.services.dictionaries import BRANDS_DICT
+from .import_manifest import (
+    IMPORT_SKIP_UNCHANGED, load_manifest, save_manifest, input_hash, profile_hash, unchanged_profiles, record_import,
+)
+from .base_snapshot import (
+    BASE_SNAPSHOT, BaseSnapshotWriter, snapshot_key, snapshot_path, open_snapshot, iter_snapshot_chunks,
+    save_snapshot, dump_frame,
+)
+from .profile_pool import profile_workers, export_profile, run_profiles_parallel
 
 
 def _load_yaml(path: Path) -> Dict[str, Any]:
@@ -19,14 +30,196 @@ def _load_yaml(path: Path) -> Dict[str, Any]:
         return yaml.safe_load(f) or {}
 
 
-def _get_supplier_id(supplier: str) -> Optional[int]:
+def _get_supplier_cfg(supplier: str) -> Dict[str, Any]:
     cfg = _load_yaml(CONFIG_DIR / "suppliers.yaml")
-    node = cfg.get(supplier) or cfg.get(supplier.upper()) or cfg.get(supplier.lower())
+    return cfg.get(supplier) or cfg.get(supplier.upper()) or cfg.get(supplier.lower()) or {}
+
+
+def _get_supplier_id(supplier: str) -> Optional[int]:
+    node = _get_supplier_cfg(supplier)
     if not node:
         return None
     return int(node["supplier_id"]) if "supplier_id" in node and node["supplier_id"] is not None else None
 
 
+def _normalize_brands(df):
+    """Бренд: чистимо пробіли, у верхній регістр і замінюємо за словником."""
+    df['brand'] = df['brand'].astype(str).str.strip().str.upper().apply(
+        lambda x: BRANDS_DICT.get(x, x)
+    )
+    return df
+
+
+def _profile_settings(profile: Dict[str, Any], supplier: str) -> Dict[str, Any]:
+    """Параметри PriceProfileWriter / process_one_price для одного профілю з profiles.yaml."""
+    factor = float(profile["factor"])
+    currency_out = str(profile["currency_out"]).upper()
+    format_ = profile["format"]
+
+    # r2_prefix = (profile.get("r2_prefix") or "").format(supplier=supplier.lower())
+    # if r2_prefix and not r2_prefix.endswith("/"):
+    #     r2_prefix += "/"
+
+    # 1. Беремо твій оригінальний префікс (наприклад, "1_23/" або "{supplier}/")
+    raw_prefix = (profile.get("r2_prefix") or "").format(supplier=supplier.lower())
+
+    # 2. Примусово додаємо "prices/" на початок, щоб все йшло в одну папку
+    r2_prefix = f"prices/{raw_prefix}"
+
+    # 3. Твій стандартний фікс слеша в кінці
+    if r2_prefix and not r2_prefix.endswith("/"):
+        r2_prefix += "/"
+
+    columns = profile.get("columns") or []
+    csv_cfg = profile.get("csv") or {}
+
+    rate = 1.0
+    if currency_out == "UAH":
+        rp = profile.get("rate_params") or {}
+        fb = rp.get("fallback")
+        fallback_value = fb.get("value") if isinstance(fb, dict) else (fb or 50)
+        rate = get_eur_to_uah(
+            add_uah=rp.get("add_uah", 1),
+            min_rate=rp.get("min_rate", 49),
+            fallback=fallback_value,
+        )
+
+    return {
+        "factor": factor,
+        "currency_out": currency_out,
+        "format_": format_,
+        "r2_prefix": r2_prefix,
+        "columns": columns,
+        "csv_cfg": csv_cfg,
+        "rate": rate,
+    }
+
+
+def _profile_result(
+        name: str,
+        settings: Dict[str, Any],
+        key: str,
+        url: str,
+        db_error: Optional[str] = None,
+        seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    res = {
+        "name": name,
+        "factor": settings["factor"],
+        "currency": settings["currency_out"],
+        "key": key,
+        "url": url,
+    }
+    if seconds is not None:
+        res["seconds"] = round(seconds, 3)
+    if db_error:
+        res["db_error"] = db_error
+    return res
+
+
+def _wait_uploads(uploads: List[Any]) -> None:
+    """Чекаємо всі фонові вивантаження в R2; першу помилку піднімаємо, коли завершились усі."""
+    errors = []
+    for fut in uploads:
+        try:
+            fut.result()
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        raise errors[0]
+
+
+def _process_streaming(
+        supplier: str,
+        supplier_id: Optional[int],
+        local_files: Dict[str, Any],
+        chunk_rows: int,
+        jobs: List[Tuple[str, Dict[str, Any]]],
+        rounding: Dict[str, int],
+        results: List[Dict[str, Any]],
+        _progress: Callable[[str], None],
+        after_parse: Callable[[], Set[str]],
+        translate: Callable[[Any], Any],
+        snapshot=None,
+        snap_writer: Optional[BaseSnapshotWriter] = None,
+) -> int:
+    """
+    Потоковий режим: кожен шматок прайсу проходить бренди -> переклад -> всі профілі
+    (націнка, staging у БД, дописування у файл). UPSERT і R2 — після останнього шматка.
+    after_parse() після розбору повертає профілі, які все ж не треба публікувати.
+    translate(chunk) — переклад назв шматка (process_price_translation з фіксацією версії пам'яті).
+    snapshot — готова база (шматки вже з брендами і перекладом), snap_writer — куди її зберегти.
+    Повертає кількість оброблених позицій.
+    """
+    writers = []
+    for name, settings in jobs:
+        print(f"➡️  Профіль (потоково): {name} (націнка x{settings['factor']})")
+        writers.append((name, settings, PriceProfileWriter(
+            supplier=supplier, supplier_id=supplier_id, rounding=rounding, **settings
+        )))
+
+    _progress("stream")
+    total_rows = 0
+    if snapshot is not None:
+        chunks = iter_snapshot_chunks(snapshot, chunk_rows)
+    else:
+        chunks = iter_base_chunks(supplier, local_files, chunk_rows)
+    try:
+        for i, chunk in enumerate(chunks, start=1):
+            if snapshot is None:
+                if 'brand' in chunk.columns:
+                    chunk = _normalize_brands(chunk)
+
+                # Переклад — весь шматок (нові назви йдуть у фонову чергу, Google не чекаємо)
+                if supplier_id != 2 and 'name' in chunk.columns and len(chunk):
+                    chunk = translate(chunk)
+
+                if snap_writer is not None:
+                    snap_writer.write(chunk)
+
+            # Ціни всіх профілів одним проходом, кожен writer бере свій стовпець
+            prices = price_matrix(chunk, [writer.pricing for _, _, writer in writers], rounding)
+            for j, (_, _, writer) in enumerate(writers):
+                writer.write(chunk, prices[:, j])
+            del prices
+
+            total_rows += len(chunk)
+            print(f"[MANAGER] 📦 Шматок {i}: {len(chunk)} позицій (всього {total_rows})")
+        skip = after_parse()
+    except Exception:
+        for _, _, writer in writers:
+            writer.abort()
+        if snap_writer is not None:
+            snap_writer.abort()
+        raise
+
+    # Файли вивантажуються у фоні, поки фіналізуються наступні профілі
+    finished = 0
+    try:
+        for name, settings, writer in writers:
+            if name in skip:
+                writer.abort()
+            else:
+                _progress(f"profile:{name}")
+                key, url = writer.finish(wait=False)
+                results.append(_profile_result(name, settings, key, url, writer.db_error))
+            finished += 1
+    except Exception:
+        # Профіль, що впав, і всі наступні: відкат staging, закриття з'єднань, тимчасові файли
+        for name, _, writer in writers[finished:]:
+            try:
+                writer.abort()
+            except Exception as e:
+                print(f"[WARN] Aborting profile {name} failed: {e}")
+        if snap_writer is not None:
+            snap_writer.abort()
+        raise
+    _progress("upload")
+    _wait_uploads([writer.upload for _, _, writer in writers if writer.upload is not None])
+
+    return total_rows
+
+
 def process_all_prices(
         supplier: str,
         remote_gz_path: Optional[str],
@@ -35,7 +228,14 @@ def process_all_prices(
         supplier_id: Optional[int] = None,
         profile_filter: Optional[str] = None,
         additional_files: Optional[Dict[str, str]] = None,
+        progress: Optional[Callable[[str], None]] = None,
+        force: bool = False,
+        reuse_snapshot: bool = False,
 ) -> List[Dict[str, Any]]:
+    # progress(stage) — повідомляє про початок етапу (черга імпорту показує це в статусі задачі)
+    # reuse_snapshot — перегнати профілі з останнього снапшота бази, не читаючи вхід
+    _progress = progress or (lambda stage: None)
+
     # Ініціалізуємо локальну базу (створюємо папку data/db, якщо її немає)
     # init_local_db()
 
@@ -54,118 +254,232 @@ def process_all_prices(
 
     # --- 🛠 КРОК 1: ВАЖКА ПІДГОТОВКА ---
     print(f"\n[MANAGER] 🚀 Початок підготовки базових даних для {supplier}...")
+    _progress("prepare")
 
-    base_df, cleanup_paths = prepare_base_df(
+    local_files, cleanup_paths = fetch_supplier_files(
         supplier=supplier,
         additional_files=additional_files,
         remote_gz_path=remote_gz_path
     )
 
-    # # ============================================================
-    # # ⬇️ ЛОГІКА UNICODE (ПЕРЕНЕСЕНО ПЕРЕД ПЕРЕКЛАДОМ) ⬇️
-    # # ============================================================
-    # if 'unicode' not in base_df.columns or supplier_id == 2:
-    #     base_df['unicode'] = base_df['code']
-    #
-    # # Очищаємо unicode відразу для всіх (це ключ для нашої бази перекладів!)
-    # base_df['unicode'] = base_df['unicode'].astype(str).str.replace(r'[^a-zA-Z0-9]', '', regex=True).str.upper()
-    # print(f"[MANAGER] ✨ Unicode нормалізовано")
-
-    # ============================================================
-    # 🏷️ НОРМАЛІЗАЦІЯ БРЕНДІВ (НОВИЙ БЛОК) 🏷️
-    # ============================================================
-    if 'brand' in base_df.columns:
-        print(f"[MANAGER] 🏷️ Нормалізація брендів для {len(base_df)} позицій...")
-
-        # Перетворюємо колонку бренд: чистимо пробіли, у верхній регістр і замінюємо за словником
-        base_df['brand'] = base_df['brand'].astype(str).str.strip().str.upper().apply(
-            lambda x: BRANDS_DICT.get(x, x)
-        )
-        print(f"[MANAGER] ✅ Бренди приведено до стандарту!")
-
-    # ============================================================
-    # 🌍 ОНОВЛЕНИЙ БЛОК ПЕРЕКЛАДУ 🌍
-    # ============================================================
-    if 'name' in base_df.columns:
-        if supplier_id == 2:
-            print(f"[MANAGER] ℹ️ Пропускаємо переклад для Гданська.")
-        else:
-            print(f"[MANAGER] 🌍 Переклад назв для {len(base_df)} позицій...")
-            # Викликаємо нову логіку (SQLite -> Google)
-            base_df = process_price_translation(base_df, supplier_id, limit=100)
-
-            print(f"[MANAGER] ✅ Переклад завершено!")
-
-    print(f"[MANAGER] ✅ База готова! Всього позицій: {len(base_df)}")
-
-    results: List[Dict[str, Any]] = []
-
-    # --- ⚡ КРОК 2: ШВИДКИЙ ЦИКЛ ПО ПРОФІЛЯХ ---
-    for profile in profiles:
-        name = profile["name"]
-        if profile_filter and profile_filter.lower() not in name.lower():
-            continue
-
-        factor = float(profile["factor"])
-        currency_out = str(profile["currency_out"]).upper()
-        format_ = profile["format"]
-
-        # r2_prefix = (profile.get("r2_prefix") or "").format(supplier=supplier.lower())
-        # if r2_prefix and not r2_prefix.endswith("/"):
-        #     r2_prefix += "/"
-
-        # 1. Беремо твій оригінальний префікс (наприклад, "1_23/" або "{supplier}/")
-        raw_prefix = (profile.get("r2_prefix") or "").format(supplier=supplier.lower())
-
-        # 2. Примусово додаємо "prices/" на початок, щоб все йшло в одну папку
-        r2_prefix = f"prices/{raw_prefix}"
-
-        # 3. Твій стандартний фікс слеша в кінці
-        if r2_prefix and not r2_prefix.endswith("/"):
-            r2_prefix += "/"
-
-        columns = profile.get("columns") or []
-        csv_cfg = profile.get("csv") or {}
-
-        rate = 1.0
-        if currency_out == "UAH":
-            rp = profile.get("rate_params") or {}
-            fb = rp.get("fallback")
-            fallback_value = fb.get("value") if isinstance(fb, dict) else (fb or 50)
-            rate = get_eur_to_uah(
-                add_uah=rp.get("add_uah", 1),
-                min_rate=rp.get("min_rate", 49),
-                fallback=fallback_value,
+    # Тимчасові файли (кеш FTP, спільна база для пулу) і снапшот звільняються і при помилці
+    snapshot = None
+    try:
+        # Профілі та хеші їхніх налаштувань (курс UAH і версія перекладів постачальника теж входять у хеш)
+        jobs: List[Tuple[str, Dict[str, Any]]] = []
+        for profile in profiles:
+            if profile_filter and profile_filter.lower() not in profile["name"].lower():
+                continue
+            jobs.append((profile["name"], _profile_settings(profile, supplier)))
+
+        def _hashes() -> Dict[str, str]:
+            return {name: profile_hash(settings, supplier_id, rounding, tm_version) for name, settings in jobs}
+
+        # Версія перекладів цього постачальника: на старті — для рішення "нічого не змінилось",
+        # після перекладу — для маніфесту і снапшота (див. _translate)
+        tm_version = translation_version(supplier_id)
+        hashes = _hashes()
+        translated = False
+
+        def _translate(df):
+            """
+            Переклад + версія одразу після першого проходу: назви, що пішли в чергу, перекладуться
+            пізніше і змінять версію для наступного імпорту.
+            """
+            nonlocal tm_version, translated
+            df = process_price_translation(df, supplier_id)
+            if not translated:
+                tm_version = translation_version(supplier_id)
+                translated = True
+            return df
+
+        # ============================================================
+        # ♻️ ПРОПУСК НЕЗМІНЕНОГО (маніфест імпорту) ♻️
+        # ============================================================
+        manifest = load_manifest(supplier)
+        supplier_cfg = _get_supplier_cfg(supplier)
+        check_skip = IMPORT_SKIP_UNCHANGED and not force
+        # FTP: хеш із SIZE + MDTM — рішення "не змінився" приймається до завантаження файлу
+        in_hash = input_hash(local_files, supplier_cfg)
+
+        done: Dict[str, Dict[str, Any]] = {}
+
+        def _skip(names) -> None:
+            for name, settings in jobs:
+                if name in names:
+                    prev = manifest["profiles"][name]
+                    done[name] = {
+                        "name": name,
+                        "factor": settings["factor"],
+                        "currency": settings["currency_out"],
+                        "key": prev.get("key"),
+                        "url": prev.get("url"),
+                        "skipped": True,
+                    }
+
+        if check_skip:
+            _skip(unchanged_profiles(manifest, in_hash, hashes))
+        todo = [(name, settings) for name, settings in jobs if name not in done]
+
+        def _after_parse() -> Set[str]:
+            """FTP-сервер без SIZE/MDTM: хеш відомий лише після того, як потік дочитано (запасний шлях)."""
+            nonlocal in_hash
+            if in_hash is not None:
+                return set()
+            in_hash = input_hash(local_files, supplier_cfg)
+            late = set(unchanged_profiles(manifest, in_hash, hashes)) & {name for name, _ in todo} if check_skip else set()
+            if late:
+                print(f"[MANAGER] ♻️ Вхід не змінився, профілі без змін не публікуємо: {', '.join(sorted(late))}")
+                _skip(late)
+            return late
+
+        # ============================================================
+        # ⚡ СНАПШОТ ПІДГОТОВЛЕНОЇ БАЗИ (Parquet) ⚡
+        # ============================================================
+        def _snap_key() -> Optional[str]:
+            # Нові переклади в пам'яті -> інший ключ (старий снапшот містить старі назви)
+            return snapshot_key(in_hash, supplier_id=supplier_id, brands=BRANDS_DICT,
+                                translation_version=tm_version)
+
+        snapshot = open_snapshot(supplier, _snap_key(), any_key=reuse_snapshot) if todo else None
+        if snapshot is not None:
+            reason = "Перегін профілів з останнього снапшота" if reuse_snapshot else "Вхід не змінився"
+            print(f"[MANAGER] ⚡ {reason} — база береться зі снапшота ({snapshot.metadata.num_rows} позицій)")
+        elif reuse_snapshot and todo:
+            print(f"[MANAGER] ⚠️ Снапшота для {supplier} немає — повна підготовка бази")
+
+        snapshot_saved = False
+        total_rows = 0
+        if not todo:
+            total_rows = manifest.get("rows") or 0
+            print(f"[MANAGER] ♻️ Файл і профілі не змінились з {manifest.get('imported_at')} — імпорт пропущено.")
+        elif done:
+            print(f"[MANAGER] ♻️ Вхід не змінився, переганяємо лише змінені профілі: {', '.join(n for n, _ in todo)}")
+
+        results: List[Dict[str, Any]] = []
+
+        # Великий прайс -> потоковий режим (шматками, обмежена пам'ять)
+        chunk_rows = stream_chunk_rows(local_files) if todo else None
+        if todo and chunk_rows is not None:
+            snap_writer = BaseSnapshotWriter(supplier) if BASE_SNAPSHOT and snapshot is None else None
+            total_rows = _process_streaming(
+                supplier, supplier_id, local_files, chunk_rows, todo, rounding, results, _progress, _after_parse,
+                _translate, snapshot=snapshot, snap_writer=snap_writer,
             )
-
-        print(f"➡️  Обробка профілю: {name} (націнка x{factor})")
-
-        key, url = process_one_price(
-            df_input=base_df,
-            supplier=supplier,
-            supplier_id=supplier_id,
-            factor=factor,
-            currency_out=currency_out,
-            format_=format_,
-            rounding=rounding,
-            r2_prefix=r2_prefix,
-            columns=columns,
-            csv_cfg=csv_cfg,
-            rate=rate
-        )
-
-        results.append({
-            "name": name,
-            "factor": factor,
-            "currency": currency_out,
-            "key": key,
-            "url": url,
-        })
-
-    # --- 🧹 КРОК 3: ФІНАЛЬНЕ ОЧИЩЕННЯ ТА БЕКАП ---
-    print(f"\n[MANAGER] 🧹 Очищення тимчасових файлів...")
-    for p in cleanup_paths:
-        p.unlink(missing_ok=True)
+            if snap_writer is not None:
+                snap_writer.commit(_snap_key())
+        elif todo and snapshot is not None:
+            _progress("snapshot")
+            base_df = next(iter_snapshot_chunks(snapshot))
+            total_rows = len(base_df)
+            print(f"[MANAGER] ✅ База готова (снапшот)! Всього позицій: {total_rows}")
+        elif todo:
+            base_df = next(iter_base_chunks(supplier, local_files))
+            late = _after_parse()
+            todo = [(name, settings) for name, settings in todo if name not in late]
+
+            # # ============================================================
+            # # ⬇️ ЛОГІКА UNICODE (ПЕРЕНЕСЕНО ПЕРЕД ПЕРЕКЛАДОМ) ⬇️
+            # # ============================================================
+            # if 'unicode' not in base_df.columns or supplier_id == 2:
+            #     base_df['unicode'] = base_df['code']
+            #
+            # # Очищаємо unicode відразу для всіх (це ключ для нашої бази перекладів!)
+            # base_df['unicode'] = base_df['unicode'].astype(str).str.replace(r'[^a-zA-Z0-9]', '', regex=True).str.upper()
+            # print(f"[MANAGER] ✨ Unicode нормалізовано")
+
+            # ============================================================
+            # 🏷️ НОРМАЛІЗАЦІЯ БРЕНДІВ (НОВИЙ БЛОК) 🏷️
+            # ============================================================
+            if 'brand' in base_df.columns and todo:
+                _progress("brands")
+                print(f"[MANAGER] 🏷️ Нормалізація брендів для {len(base_df)} позицій...")
+                base_df = _normalize_brands(base_df)
+                print(f"[MANAGER] ✅ Бренди приведено до стандарту!")
+
+            # ============================================================
+            # 🌍 ОНОВЛЕНИЙ БЛОК ПЕРЕКЛАДУ 🌍
+            # ============================================================
+            if 'name' in base_df.columns and todo:
+                if supplier_id == 2:
+                    print(f"[MANAGER] ℹ️ Пропускаємо переклад для Гданська.")
+                else:
+                    print(f"[MANAGER] 🌍 Переклад назв для {len(base_df)} позицій...")
+                    _progress("translation")
+                    # Пам'ять перекладів; нові назви — у фонову чергу (SQLite -> D1, Google у фоні)
+                    base_df = _translate(base_df)
+
+                    print(f"[MANAGER] ✅ Переклад завершено!")
+
+            total_rows = len(base_df)
+            print(f"[MANAGER] ✅ База готова! Всього позицій: {total_rows}")
+
+            # Бренди і переклад пройдено лише якщо лишились профілі для обробки
+            if BASE_SNAPSHOT and todo and save_snapshot(supplier, base_df, _snap_key()):
+                snapshot_saved = True
+
+        if todo and chunk_rows is None:
+            # --- ⚡ КРОК 2: ЦИКЛ ПО ПРОФІЛЯХ (послідовно або пулом процесів) ---
+            shared_path = None
+            workers = profile_workers()
+            if workers > 1 and len(todo) > 1:
+                # Воркери читають базу з Parquet: снапшот, а якщо його немає — разовий файл
+                if snapshot is not None or snapshot_saved:
+                    shared_path = snapshot_path(supplier)
+                else:
+                    try:
+                        shared_path = dump_frame(base_df, TEMP_DIR / f"base_{supplier.lower()}_{time.strftime('%Y%m%d_%H%M%S')}.parquet")
+                        cleanup_paths.append(shared_path)
+                    except Exception as e:
+                        print(f"[WARN] Parallel profiles disabled, base was not shared: {e}")
+
+            if shared_path is not None:
+                _progress("profiles:parallel")
+                exported = run_profiles_parallel(
+                    base_df, shared_path, supplier, supplier_id, rounding, todo, workers
+                )
+                for name, settings in todo:
+                    res = exported[name]
+                    results.append(_profile_result(name, settings, res["key"], res["url"], res["db_error"], res["seconds"]))
+            else:
+                # Ціни всіх профілів одним проходом (рядки × профілі)
+                prices = price_matrix(base_df, [settings for _, settings in todo], rounding)
+                uploads = []
+                for j, (name, settings) in enumerate(todo):
+                    print(f"➡️  Обробка профілю: {name} (націнка x{settings['factor']})")
+                    _progress(f"profile:{name}")
+
+                    # те саме, що process_one_price, але зі статусом запису в БД для маніфесту;
+                    # файл вивантажується у фоні, поки рахується наступний профіль
+                    res = export_profile(
+                        base_df, supplier, supplier_id, rounding, settings, prices[:, j], wait_upload=False
+                    )
+                    uploads.append(res["upload"])
+                    results.append(_profile_result(name, settings, res["key"], res["url"], res["db_error"], res["seconds"]))
+                _progress("upload")
+                _wait_uploads(uploads)
+
+        # Результати в порядку профілів + запис у маніфест
+        for res in results:
+            done[res["name"]] = res
+        results = [done[name] for name, _ in jobs if name in done]
+        # Перегін зі снапшота без перевірки ключа не доводить, що профілі відповідають поточному входу
+        if any(not r.get("skipped") for r in results) and not (reuse_snapshot and snapshot is not None):
+            try:
+                save_manifest(supplier, record_import(manifest, in_hash, total_rows, local_files, _hashes(), results))
+            except OSError as e:
+                print(f"[WARN] Import manifest for {supplier} was not saved: {e}")
+    finally:
+        # --- 🧹 КРОК 3: ФІНАЛЬНЕ ОЧИЩЕННЯ ТА БЕКАП ---
+        print(f"\n[MANAGER] 🧹 Очищення тимчасових файлів...")
+        _progress("cleanup")
+        for p in cleanup_paths:
+            try:
+                p.unlink(missing_ok=True)
+            except OSError as e:
+                print(f"[WARN] Temporary file {p} was not removed: {e}")
+        if snapshot is not None:
+            snapshot.close()
 
     # # 📦 РОБИМО БЕКАП БАЗИ ПЕРЕКЛАДІВ У ХМАРУ
     # print(f"[MANAGER] 📦 Відправка бекапу бази перекладів у Cloudflare R2...")
@@ -183,7 +497,7 @@ def process_all_prices(
     print(f"\n" + "=" * 40)
     print(f"✅ [ETL COMPLETE] Постачальник: {supplier}")
     print(f"⏱️ Загальний час: {minutes}хв {seconds:.2f}с")
-    print(f"📊 Позицій оброблено: {len(base_df)}")
+    print(f"📊 Позицій оброблено: {total_rows}")
     print("=" * 40 + "\n")
 
     return results
\ No newline at end of file
@@ -1,22 +1,36 @@
 import os
 import re
+import time
 import gzip
+import itertools
 import shutil
 import yaml
 import ftplib
 from datetime import datetime
-from typing import Tuple, List, Dict, Any, Optional
+from typing import Tuple, List, Dict, Any, Optional, Iterable, Iterator
 from pathlib import Path
 # Імпортуємо налаштування з нашого database.py
 from app.database import engine, TABLE_CATALOG
 
 
+import numpy as np
 import pandas as pd
 # --- Імпорт text для безпечних SQL-запитів ---
 from sqlalchemy import create_engine, text
 
 from app.services.paths import TEMP_DIR
-from app.services.storage import StorageClient
+from app.services.storage import get_storage
+from app.services.code_index import refresh_code_index
+from app.services.search_cache import bump_catalog_generation
+from app.etl.raw_sources import (
+    RawInput, GzipFileSource, FtpSource, FTP_STREAM_CACHE,
+    ftp_credentials, ftp_login, open_binary, open_text, input_size,
+)
+from app.etl.exporters import make_exporter
+from app.etl.catalog_loader import (
+    load_dataframe, merge_temp_import, catalog_changed, format_stages,
+    create_temp_import, finalize_temp_import,
+)
 
 
 # ----------------------- FTP / unzip -----------------------
@@ -26,25 +40,10 @@ def download_file_from_ftp(remote_path: str, local_path: Path, supplier: str) ->
     Завантажує файл з FTP, використовуючи динамічні секрети з .env
     на основі імені постачальника (напр. AUTOPARTNER_FTP_HOST).
     """
-    # 1) Готуємо префікс для пошуку в .env (напр. "AUTOPARTNER")
-    prefix = supplier.upper().replace(" ", "_")
-
-    # 2) Витягуємо специфічні налаштування для цього постачальника
-    host = os.getenv(f"{prefix}_FTP_HOST")
-    user = os.getenv(f"{prefix}_FTP_USER")
-    pwd = os.getenv(f"{prefix}_FTP_PASS")
-
-    # Перевірка: якщо в .env забули прописати дані для цього постачальника
-    if not all([host, user, pwd]):
-        raise RuntimeError(f"Credentials for {prefix} are missing in .env. "
-                           f"Please add {prefix}_FTP_HOST, {prefix}_FTP_USER, {prefix}_FTP_PASS.")
-
+    prefix, host, user, pwd = ftp_credentials(supplier)
     print(f"[INFO] Connecting to FTP for {prefix} ({host})...")
 
-    # Допоміжний виконавець (залишається майже без змін, але використовує локальні host/user/pwd)
     def _retr(ftp):
-        ftp.set_pasv(True)  # Режим PASV (як у FileZilla)
-        ftp.login(user, pwd)
         local_path.parent.mkdir(parents=True, exist_ok=True)
         with open(local_path, "wb") as f:
             ftp.retrbinary(f"RETR {remote_path}", f.write)
@@ -52,25 +51,20 @@ def download_file_from_ftp(remote_path: str, local_path: Path, supplier: str) ->
 
     # 1) Спроба через Explicit TLS (FTPS) - більш безпечно
     try:
-        ftps = ftplib.FTP_TLS(host, timeout=20)
-        ftps.auth()
-        ftps.prot_p()
-        _retr(ftps)
+        _retr(ftp_login(host, user, pwd, tls=True))
         print(f"[SUCCESS] Downloaded via FTPS: {remote_path}")
         return
     except ftplib.all_errors as e_tls:
         # 2) Якщо TLS не доступний — пробуємо звичайний FTP
         try:
             print(f"[WARN] FTPS failed for {prefix}, trying plain FTP...")
-            ftp = ftplib.FTP(host, timeout=20)
-            _retr(ftp)
+            _retr(ftp_login(host, user, pwd, tls=False))
             print(f"[SUCCESS] Downloaded via FTP: {remote_path}")
             return
         except ftplib.all_errors as e_plain:
             raise RuntimeError(f"FTP/FTPS failed for {prefix}. TLS Error: {e_tls}; Plain Error: {e_plain}")
 
 
-
 def unzip_gz_file(gz_file: Path, output_csv: Path) -> None:
     with gzip.open(gz_file, "rb") as f_in, open(output_csv, "wb") as f_out:
         shutil.copyfileobj(f_in, f_out)
@@ -114,7 +108,7 @@ def _normalize_line_with_cfg(line: str, gt5_to: Optional[int]) -> str:
 
 
 def raw_csv_to_rows(
-        input_csv: Path,
+        input_csv: RawInput,
         *,
         stock_index: Optional[int],
         stock_header_token: str = "STAN",
@@ -125,59 +119,75 @@ def raw_csv_to_rows(
     """
     Читає сирий CSV. Якщо stock_index=None, повертає всі рядки без фільтрації залишків.
     """
+    # Використовуємо cp1250 для польських прайсів, щоб не було помилок декодування
+    with open_text(input_csv) as f:
+        return _raw_lines_to_rows(
+            itertools.islice(f, skip_rows, None),
+            stock_index=stock_index,
+            stock_header_token=stock_header_token,
+            gt5_to=gt5_to,
+            normalize_mode=normalize_mode,
+        )
+
+
+def _raw_lines_to_rows(
+        lines: Iterable[str],
+        *,
+        stock_index: Optional[int],
+        stock_header_token: str = "STAN",
+        gt5_to: Optional[int] = None,
+        normalize_mode: str = "spaces",
+) -> List[List[str]]:
+    """Сирі рядки -> списки полів (тіло raw_csv_to_rows; потоковий режим викликає його пачками)."""
     rows: List[List[str]] = []
 
-    # Використовуємо cp1250 для польських прайсів, щоб не було помилок декодування
-    with open(input_csv, "r", encoding="cp1250", errors="replace") as f:
-        for i, raw in enumerate(f):
-            if i < skip_rows:
-                continue
-            raw = raw.strip()
-            if not raw:
-                continue
+    for raw in lines:
+        raw = raw.strip()
+        if not raw:
+            continue
 
-            # Розбиваємо рядок на частини
-            if normalize_mode == "csv":
-                parts = raw.split(";")
-            else:
-                norm = _normalize_line_with_cfg(raw, gt5_to=gt5_to)
-                parts = norm.split(";")
+        # Розбиваємо рядок на частини
+        if normalize_mode == "csv":
+            parts = raw.split(";")
+        else:
+            norm = _normalize_line_with_cfg(raw, gt5_to=gt5_to)
+            parts = norm.split(";")
 
-            if not parts:
-                continue
+        if not parts:
+            continue
 
-            # --- ГОЛОВНА ЗМІНА ТУТ ---
-            # Якщо ми не вказали індекс стоку (як для файлу цін),
-            # ми просто додаємо рядок і йдемо далі, не перевіряючи числа.
-            if stock_index is None:
-                rows.append(parts)
-                continue
+        # --- ГОЛОВНА ЗМІНА ТУТ ---
+        # Якщо ми не вказали індекс стоку (як для файлу цін),
+        # ми просто додаємо рядок і йдемо далі, не перевіряючи числа.
+        if stock_index is None:
+            rows.append(parts)
+            continue
 
-            # --- ЛОГІКА ДЛЯ ФАЙЛУ ЗАЛИШКІВ (де індекс вказано) ---
-            idx = stock_index
-            if idx < 0 or idx >= len(parts):
-                continue
+        # --- ЛОГІКА ДЛЯ ФАЙЛУ ЗАЛИШКІВ (де індекс вказано) ---
+        idx = stock_index
+        if idx < 0 or idx >= len(parts):
+            continue
 
-            val = (parts[idx] or "").strip()
+        val = (parts[idx] or "").strip()
 
-            # Пропускаємо заголовки типу "STAN"
-            if val.lower() == (stock_header_token or "").lower():
-                continue
+        # Пропускаємо заголовки типу "STAN"
+        if val.lower() == (stock_header_token or "").lower():
+            continue
 
-            # Нормалізуємо '>5'
-            if gt5_to is not None and ">" in val:
-                val = str(gt5_to)
-                parts[idx] = val
-
-            # Перевірка на число (тільки для файлу залишків!)
-            try:
-                if float(val) <= 0:
-                    continue
-            except ValueError:
-                # Якщо в колонці залишку не число — ігноруємо цей рядок
+        # Нормалізуємо '>5'
+        if gt5_to is not None and ">" in val:
+            val = str(gt5_to)
+            parts[idx] = val
+
+        # Перевірка на число (тільки для файлу залишків!)
+        try:
+            if float(val) <= 0:
                 continue
+        except ValueError:
+            # Якщо в колонці залишку не число — ігноруємо цей рядок
+            continue
 
-            rows.append(parts)
+        rows.append(parts)
 
     return rows
 
@@ -223,50 +233,395 @@ def _rows_to_standard_df(rows: List[List[str]], colmap: Dict[str, int]) -> pd.Da
     return df
 
 
+# ----------------------- Vectorized parse (колонковий рушій) -----------------------
+# Те саме, що raw_csv_to_rows + _rows_to_standard_df, але без циклу по рядках:
+# файл -> Series рядків -> векторні str-операції pandas -> стандартний DataFrame одразу.
+# Рядки живуть у string[pyarrow], регулярки/split/strip виконує Arrow (RE2, C++).
+# Тому \s і \w замінені явними класами символів, побудованими з усього алфавіту
+# cp1250 — вони однакові для RE2 і Python re, і результат ідентичний старому шляху.
+# CSV_PARSE_ENGINE=python (або немає pyarrow) — старий цикл.
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = pc = None
+
+_STRING_DTYPE = "string[pyarrow]"
+
+CSV_PARSE_ENGINE = os.getenv("CSV_PARSE_ENGINE", "vectorized").lower()
+
+STANDARD_COLUMNS = ["code", "unicode", "brand", "name", "stock", "price"]
+
+# Усі символи, які може дати open(..., encoding="cp1250", errors="replace")
+_CP1250_ALPHABET = sorted(set(bytes(range(256)).decode("cp1250", errors="replace")))
+
+
+def _char_class(chars: List[str]) -> str:
+    """[...] з escape-послідовностями, які однаково розуміють Python re і RE2."""
+    body = "".join(c if c.isalnum() else f"\\x{ord(c):02x}" for c in chars)
+    return f"[{body}]"
+
+
+_WS_CHARS = "".join(c for c in _CP1250_ALPHABET if c.isspace())                 # == str.strip() / \s
+_RE_S = _char_class([c for c in _CP1250_ALPHABET if re.match(r"\s", c)])       # \s
+_RE_W = _char_class([c for c in _CP1250_ALPHABET if re.match(r"\w", c)])       # \w
+
+# Рядки, які float() гарантовано парсить так само, як Arrow/numpy
+_PLAIN_FLOAT_RE = r"(?:[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)"
+# Надмножина всього, що взагалі може прийняти float() (решта — точно ValueError)
+_MAYBE_FLOAT_RE = (
+    rf"(?:{_RE_S}*(?:[0-9_.eE+\-]+|[+-]?(?:[iI][nN][fF](?:[iI][nN][iI][tT][yY])?|[nN][aA][nN])){_RE_S}*)"
+)
+_PRICE_FLOAT_RE = r"(?:[0-9]+\.?[0-9]*|\.[0-9]+)"
+_INT64_LIMIT = 2.0 ** 63
+
+
+def _bool_mask(s: pd.Series) -> np.ndarray:
+    return s.to_numpy(dtype=bool, na_value=False)
+
+
+def _float_series(s: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Векторний аналог float(v) для Series рядків.
+    Повертає (значення, valid) — valid=False там, де float() кинув би ValueError.
+    Рідкісні «нестандартні» значення (1_000, inf, nan...) парсяться самим float().
+    """
+    values = np.full(len(s), np.nan, dtype=np.float64)
+    valid = np.zeros(len(s), dtype=bool)
+
+    plain = _bool_mask(s.str.fullmatch(_PLAIN_FLOAT_RE))
+    if plain.any():
+        values[plain] = s[plain].astype("float64").to_numpy()
+        valid[plain] = True
+
+    maybe = np.flatnonzero(~plain & _bool_mask(s.str.fullmatch(_MAYBE_FLOAT_RE)))
+    for i, v in zip(maybe, s.iloc[maybe].tolist()):
+        try:
+            values[i] = float(v)
+            valid[i] = True
+        except ValueError:
+            pass
+    return values, valid
+
+
+def _stock_to_int(s: pd.Series) -> Any:
+    """int(float(v)), а при помилці 0 — як у _rows_to_standard_df."""
+    values, valid = _float_series(s)
+    ok = valid & np.isfinite(values)
+    if ok.any() and np.abs(values[ok]).max() >= _INT64_LIMIT:
+        # Не влазить в int64 -> Python int, як у старому шляху
+        return [int(v) if k else 0 for v, k in zip(values, ok)]
+    return np.trunc(np.where(ok, values, 0.0)).astype(np.int64)
+
+
+def _normalize_lines_with_cfg(lines: pd.Series, gt5_to: Optional[int]) -> pd.Series:
+    """Векторний _normalize_line_with_cfg (ті самі регулярки, той самий порядок)."""
+    repl = str(gt5_to if gt5_to is not None else 10)
+    lines = lines.str.replace(rf">{_RE_S}*5", repl, regex=True)
+    m = _bool_mask(lines.str.contains(rf"{_RE_W}{_RE_S}{_RE_W}*{_RE_S}{_RE_W}", regex=True))
+    if m.any():
+        lines = lines.copy()
+        lines[m] = lines[m].str.replace(_RE_S, "", n=1, regex=True)
+    return lines.str.replace(_RE_S, ";", regex=True)
+
+
+def _arrow(s: pd.Series) -> Any:
+    """string[pyarrow] Series -> один суцільний pa.Array."""
+    arr = pa.array(s.array)
+    return arr.combine_chunks() if isinstance(arr, pa.ChunkedArray) else arr
+
+
+def _to_object(s: pd.Series) -> np.ndarray:
+    """
+    Series рядків -> object-масив Python str (як у старому шляху).
+    Через словник Arrow: однакові значення (бренди, назви) стають одним str-об'єктом,
+    а не мільйоном копій — це головна економія пам'яті вихідного DataFrame.
+    """
+    encoded = pc.dictionary_encode(_arrow(s))
+    uniques = encoded.dictionary.to_numpy(zero_copy_only=False)
+    return uniques[encoded.indices.to_numpy()]
+
+
+def _split_fields(lines: pd.Series, max_idx: int) -> pd.DataFrame:
+    """
+    Розбиває рядки по ';' і повертає поля 0..max_idx як колонки (NA — поля немає).
+    Решта рядка після max_idx не потрібна і не матеріалізується.
+    """
+    lists = pc.split_pattern(_arrow(lines), ";", max_splits=max_idx + 1)
+    starts = lists.offsets.to_numpy()[:-1]
+    lengths = pc.list_value_length(lists).to_numpy()
+    flat = lists.values
+
+    columns = {}
+    for idx in range(max_idx + 1):
+        has = lengths > idx
+        positions = pa.array(starts + idx, mask=~has)
+        columns[idx] = pd.Series(pd.arrays.ArrowStringArray(pc.take(flat, positions)), index=lines.index)
+    return pd.DataFrame(columns)
+
+
+def lines_to_standard_df(
+        lines: pd.Series,
+        colmap: Dict[str, int],
+        *,
+        stock_index: Optional[int],
+        stock_header_token: str = "STAN",
+        gt5_to: Optional[int] = None,
+        normalize_mode: str = "spaces",
+) -> pd.DataFrame:
+    """
+    Series вже обрізаних непорожніх рядків -> стандартний DataFrame
+    (code/unicode/brand/name/stock/price).
+    """
+    if len(lines) == 0:
+        return _rows_to_standard_df([], colmap)
+
+    if normalize_mode != "csv":
+        lines = _normalize_lines_with_cfg(lines, gt5_to=gt5_to)
+
+    # Потрібні лише поля до найбільшого індексу з colmap / stock_index
+    wanted = [i for i in colmap.values() if i is not None and i >= 0]
+    if stock_index is not None:
+        wanted.append(stock_index)
+    parts = _split_fields(lines, max(wanted, default=0))
+    del lines
+
+    # --- Фільтр файлу залишків ---
+    if stock_index is not None:
+        if stock_index < 0:
+            return _rows_to_standard_df([], colmap)
+
+        col = parts[stock_index]
+        present = _bool_mask(col.notna())
+        val = col.fillna("").str.strip(_WS_CHARS)
+        keep = present & _bool_mask(val.str.lower() != (stock_header_token or "").lower())
+
+        # Нормалізуємо '>5'
+        if gt5_to is not None:
+            gt = present & _bool_mask(val.str.contains(">", regex=False))
+            if gt.any():
+                val = val.mask(gt, str(gt5_to))
+                col = col.mask(gt, str(gt5_to))
+                parts[stock_index] = col
+
+        num, valid = _float_series(val)
+        keep &= valid & ~(num <= 0)
+        if not keep.all():
+            parts = parts[keep]
+        if len(parts) == 0:
+            return _rows_to_standard_df([], colmap)
+
+    def take(idx: Optional[int]) -> pd.Series:
+        # Поля, яких немає в рядку (NA), -> "" — як take() у _rows_to_standard_df
+        if idx is None or idx < 0:
+            return pd.Series("", index=parts.index, dtype=_STRING_DTYPE)
+        return parts[idx].fillna("").str.strip(_WS_CHARS)
+
+    code = take(colmap.get("code"))
+    unicode_ = take(colmap.get("unicode"))
+    unicode_ = unicode_.mask(_bool_mask(unicode_ == ""), code)
+    brand = take(colmap.get("brand"))
+    name = take(colmap.get("name"))
+    name = name.mask(_bool_mask(name == ""), brand)
+
+    # stock -> int
+    stock = _stock_to_int(take(colmap.get("stock")))
+
+    # price -> float (коми/зайві символи прибираємо)
+    ps = take(colmap.get("price")).str.replace(",", ".", regex=False).str.replace(r"[^0-9.]", "", regex=True)
+    price = np.full(len(ps), np.nan, dtype=np.float64)
+    ok = _bool_mask(ps.str.fullmatch(_PRICE_FLOAT_RE))
+    if ok.any():
+        price[ok] = ps[ok].astype("float64").to_numpy()
+
+    del parts
+    df = pd.DataFrame({
+        "code": _to_object(code),
+        "unicode": _to_object(unicode_),
+        "brand": _to_object(brand),
+        "name": _to_object(name),
+        "stock": stock,
+        "price": price,
+    }, columns=STANDARD_COLUMNS)
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df["stock"] = pd.to_numeric(df["stock"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+READ_CHUNK_BYTES = int(os.getenv("CSV_READ_CHUNK_BYTES", str(8 * 1024 * 1024)))
+
+
+def _iter_raw_line_batches(input_csv: RawInput, skip_rows: int = 0) -> Iterator[List[str]]:
+    """
+    Сирі рядки файлу пачками по ~READ_CHUNK_BYTES (skip_rows рахує всі рядки, як enumerate(f)).
+    """
+    with open_text(input_csv) as f:
+        while True:
+            raw = f.readlines(READ_CHUNK_BYTES)
+            if not raw:
+                break
+            if skip_rows:
+                skipped = min(skip_rows, len(raw))
+                raw = raw[skipped:]
+                skip_rows -= skipped
+            if raw:
+                yield raw
+
+
+def _clean_lines(chunks: List[Any]) -> pd.Series:
+    """Arrow-шматки сирих рядків -> Series обрізаних непорожніх рядків."""
+    lines = pd.Series(pd.arrays.ArrowStringArray(pa.chunked_array(chunks, type=pa.string())))
+    lines = lines.str.strip(_WS_CHARS)
+    return lines[_bool_mask(lines != "")].reset_index(drop=True)
+
+
+def read_raw_lines(input_csv: RawInput, skip_rows: int = 0) -> pd.Series:
+    """
+    Файл -> Series обрізаних непорожніх рядків (skip_rows рахує всі рядки, як enumerate(f)).
+    Читаємо шматками по READ_CHUNK_BYTES: Python-рядки живуть лише в межах шматка,
+    далі все зберігається в Arrow-буферах.
+    """
+    chunks = [pa.array(raw, type=pa.string()) for raw in _iter_raw_line_batches(input_csv, skip_rows)]
+    return _clean_lines(chunks)
+
+
+def raw_csv_to_standard_df(
+        input_csv: RawInput,
+        colmap: Dict[str, int],
+        *,
+        stock_index: Optional[int],
+        stock_header_token: str = "STAN",
+        gt5_to: Optional[int] = None,
+        skip_rows: int = 0,
+        normalize_mode: str = "spaces",
+) -> pd.DataFrame:
+    """Сирий файл постачальника -> стандартний DataFrame (рушій за CSV_PARSE_ENGINE)."""
+    read_params = {
+        "stock_index": stock_index,
+        "stock_header_token": stock_header_token,
+        "gt5_to": gt5_to,
+        "normalize_mode": normalize_mode,
+    }
+    if CSV_PARSE_ENGINE == "python" or pa is None:
+        rows = raw_csv_to_rows(input_csv, skip_rows=skip_rows, **read_params)
+        return _rows_to_standard_df(rows, colmap)
+
+    return lines_to_standard_df(read_raw_lines(input_csv, skip_rows=skip_rows), colmap, **read_params)
+
+
+def iter_standard_chunks(
+        input_csv: RawInput,
+        colmap: Dict[str, int],
+        *,
+        chunk_rows: Optional[int],
+        stock_index: Optional[int],
+        stock_header_token: str = "STAN",
+        gt5_to: Optional[int] = None,
+        skip_rows: int = 0,
+        normalize_mode: str = "spaces",
+) -> Iterator[pd.DataFrame]:
+    """
+    Сирий файл -> стандартні DataFrame-и по chunk_rows сирих рядків.
+    chunk_rows=None — один DataFrame на весь файл (те саме, що raw_csv_to_standard_df).
+    Завжди віддає хоча б один (можливо порожній) DataFrame.
+    """
+    read_params = {
+        "stock_index": stock_index,
+        "stock_header_token": stock_header_token,
+        "gt5_to": gt5_to,
+        "normalize_mode": normalize_mode,
+    }
+    if not chunk_rows:
+        yield raw_csv_to_standard_df(input_csv, colmap, skip_rows=skip_rows, **read_params)
+        return
+
+    vectorized = CSV_PARSE_ENGINE != "python" and pa is not None
+
+    def _to_df(pending: List[Any]) -> pd.DataFrame:
+        if vectorized:
+            return lines_to_standard_df(_clean_lines(pending), colmap, **read_params)
+        return _rows_to_standard_df(_raw_lines_to_rows(pending, **read_params), colmap)
+
+    # Vectorized: пачки одразу йдуть в Arrow (Python-рядки не накопичуються), python — список рядків
+    pending: List[Any] = []
+    pending_rows = 0
+    yielded = False
+    for raw in _iter_raw_line_batches(input_csv, skip_rows):
+        if vectorized:
+            pending.append(pa.array(raw, type=pa.string()))
+        else:
+            pending.extend(raw)
+        pending_rows += len(raw)
+
+        while pending_rows >= chunk_rows:
+            if vectorized:
+                lines = pa.chunked_array(pending, type=pa.string())
+                head, pending = lines.slice(0, chunk_rows).chunks, lines.slice(chunk_rows).chunks
+            else:
+                head, pending = pending[:chunk_rows], pending[chunk_rows:]
+            pending_rows -= chunk_rows
+            yield _to_df(head)
+            yielded = True
+
+    if pending_rows or not yielded:
+        yield _to_df(pending)
+
+
 # ----------------------- Pricing & build output -----------------------
 
-def _apply_pricing(
+def price_matrix(
         df: pd.DataFrame,
-        factor: float,
-        currency_out: str,
-        rate: float,
+        profiles: List[Dict[str, Any]],
         rounding: Dict[str, int],
-) -> pd.Series:
+) -> np.ndarray:
     """
-    Обчислює фінальну ціну.
+    Фінальні ціни всіх профілів за один прохід по базових цінах.
+    profiles — налаштування профілів (factor, currency_out, rate).
+    Повертає матрицю рядки × профілі у Fortran-порядку: ціни профілю j — це
+    суцільний view prices[:, j] без копії.
     """
-    base = pd.to_numeric(df["price"], errors="coerce").fillna(0.0).astype(float)
-    if currency_out.upper() == "UAH":
-        val = base * float(factor) * float(rate)
-        digits = int(rounding.get("UAH", 0))
-    else:
-        val = base * float(factor)
-        digits = int(rounding.get("EUR", 2))
-    return val.round(digits).astype(float)
+    base = pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype=float, na_value=0.0)
+    uah = [str(p["currency_out"]).upper() == "UAH" for p in profiles]
+    factors = np.array([float(p["factor"]) for p in profiles], dtype=float)
+    # EUR: курс 1.0 — множення нічого не змінює; порядок (ціна * націнка) * курс як і раніше
+    rates = np.array([float(p.get("rate", 1.0)) if is_uah else 1.0 for p, is_uah in zip(profiles, uah)], dtype=float)
+
+    prices = np.empty((len(base), len(profiles)), dtype=float, order="F")
+    np.multiply(base[:, None], factors[None, :], out=prices)
+    prices *= rates[None, :]
+
+    for j, is_uah in enumerate(uah):
+        digits = int(rounding.get("UAH", 0)) if is_uah else int(rounding.get("EUR", 2))
+        np.round(prices[:, j], digits, out=prices[:, j])
+    return prices
 
 
 def _build_output_df(
         df_std: pd.DataFrame,
-        price_final: pd.Series,
+        price_final: Any,
         columns_cfg: List[Dict[str, str]],
         supplier_id: Optional[int],
 ) -> pd.DataFrame:
     """
     Збирає вихідний DataFrame.
+    Колонки — посилання на колонки df_std і на ціни профілю, весь фрейм не копіюється.
     """
-    temp = df_std.copy()
-    temp["supplier_id"] = supplier_id if supplier_id is not None else None
-    temp["price"] = price_final
-
+    index = df_std.index
     out_cols: Dict[str, pd.Series] = {}
     for col in columns_cfg:
         src = col["from"]
         hdr = col["header"]
-        if src not in temp.columns:
-            temp[src] = temp.get(src, None)
-        out_cols[hdr] = temp[src]
+        if src == "price":
+            out_cols[hdr] = pd.Series(np.asarray(price_final), index=index, copy=False)
+        elif src == "supplier_id":
+            out_cols[hdr] = pd.Series(supplier_id, index=index)
+        elif src in df_std.columns:
+            out_cols[hdr] = df_std[src]
+        else:
+            out_cols[hdr] = pd.Series(None, index=index)
 
-    return pd.DataFrame(out_cols)
+    return pd.DataFrame(out_cols, index=index, copy=False)
 
 
 # ----------------------- Materialize to CSV -----------------------
@@ -322,42 +677,144 @@ def _materialize_to_csv(remote_path: str, tmp_dir: Path, supplier: str) -> tuple
             return download_path, cleanup
 
 
+# ----------------------- Stream raw input -----------------------
+# ETL_STREAM_INPUT=1: .gz розпаковується на льоту, FTP читається прямо з потоку
+# передачі (raw_sources) — без завантаженої і розпакованої копій на диску.
+# Розмір FTP-файлу береться з SIZE ще до передачі, тож невеликі прайси, як і локальні,
+# ідуть звичайним (не потоковим) режимом з пулом профілів.
+# ETL_STREAM_INPUT=0: старий шлях через _materialize_to_csv.
+
+ETL_STREAM_INPUT = os.getenv("ETL_STREAM_INPUT", "1") == "1"
+
+
+def _open_raw_input(remote_path: str, tmp_dir: Path, supplier: str) -> Tuple[RawInput, List[Path]]:
+    """Те саме, що _materialize_to_csv, але повертає потокове джерело замість файлу на диску."""
+    cleanup: List[Path] = []
+
+    # 1) Локальний файл (для тестів)
+    if os.path.exists(remote_path):
+        p = Path(remote_path)
+        if p.suffix.lower() == ".csv":
+            return p, cleanup
+        if p.suffix.lower() == ".gz":
+            return GzipFileSource(p), cleanup
+        raise ValueError(f"Unsupported local file type: {p.suffix}")
+
+    # 2) FTP: за бажанням сирі байти паралельно кешуються на диск (tee)
+    cache_path = None
+    if FTP_STREAM_CACHE:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        cache_path = tmp_dir / f"ftp_{stamp}_{Path(remote_path).name}"
+        cleanup.append(cache_path)
+    return FtpSource(supplier, remote_path, cache_path=cache_path), cleanup
+
+
 # ----------------------- NEW: ПІДГОТОВКА ДАНИХ (ОДИН РАЗ) -----------------------
 
-def prepare_base_df(
+def fetch_supplier_files(
     supplier: str,
     additional_files: Optional[Dict[str, str]] = None,
     remote_gz_path: Optional[str] = None
-) -> Tuple[pd.DataFrame, List[Path]]:
+) -> Tuple[Dict[str, RawInput], List[Path]]:
     """
-    УНІВЕРСАЛЬНА ПІДГОТОВКА:
-    - Завантажує файли (один або кілька).
-    - Сумує залишки по складах (Aggregation).
-    - Робить мердж, якщо це Autopartner (ціни + залишки).
-    - Повертає готовий DataFrame та список файлів для видалення.
+    Завантажує файли постачальника (один або кілька).
+    Повертає {роль: локальний CSV або потокове джерело} та список файлів для видалення.
     """
     tmp_dir = TEMP_DIR
     local_files = {}
     cleanup_paths = []
+    materialize = _open_raw_input if ETL_STREAM_INPUT else _materialize_to_csv
 
-    # 1. Завантаження (Download)
     if additional_files:
         print(f"[INFO] 📥 Завантаження кількох файлів для {supplier}...")
         for key, r_path in additional_files.items():
-            l_path, c_paths = _materialize_to_csv(r_path, tmp_dir, supplier)
+            l_path, c_paths = materialize(r_path, tmp_dir, supplier)
             local_files[key] = l_path
             cleanup_paths.extend(c_paths)
     elif remote_gz_path:
         print(f"[INFO] 📥 Завантаження одного файлу для {supplier}...")
-        l_path, c_paths = _materialize_to_csv(remote_gz_path, tmp_dir, supplier)
+        l_path, c_paths = materialize(remote_gz_path, tmp_dir, supplier)
         local_files["prices"] = l_path
         cleanup_paths.extend(c_paths)
 
-    # 2. Налаштування (Config)
+    return local_files, cleanup_paths
+
+
+# ----------------------- Потоковий режим (великі прайси) -----------------------
+# Файл обробляється шматками по ETL_CHUNK_ROWS рядків: парсинг -> націнка ->
+# staging у temp_import -> дописування у вихідний файл. У пам'яті — лише шматок
+# і згорнутий стік. ETL_STREAMING=auto вмикає режим для файлів від ETL_STREAM_THRESHOLD_MB.
+
+ETL_STREAMING = os.getenv("ETL_STREAMING", "auto").lower()  # auto | 1 | 0
+ETL_STREAM_THRESHOLD_MB = float(os.getenv("ETL_STREAM_THRESHOLD_MB", "200"))
+ETL_CHUNK_ROWS = int(os.getenv("ETL_CHUNK_ROWS", "200000"))
+
+# Скільки проміжних groupby тримати, перш ніж згорнути їх в один
+STOCK_PARTIALS_MAX = 8
+
+
+def stream_chunk_rows(local_files: Dict[str, RawInput]) -> Optional[int]:
+    """Розмір шматка для потокового режиму або None (весь прайс в пам'яті)."""
+    if ETL_STREAMING in ("0", "off", "false"):
+        return None
+    if ETL_STREAMING == "auto":
+        sizes = [input_size(p) for k, p in local_files.items() if k != "brands"]
+        # FTP: розмір з SIZE (для .gz — оцінка); сервер без SIZE -> безпечніше потоково
+        if None in sizes:
+            print(f"[INFO] Streaming ETL: input size unknown (FTP without SIZE), chunks of {ETL_CHUNK_ROWS} rows")
+            return max(1, ETL_CHUNK_ROWS)
+        size_mb = sum(sizes) / 1024 / 1024
+        if size_mb < ETL_STREAM_THRESHOLD_MB:
+            return None
+        print(f"[INFO] Streaming ETL: input {size_mb:.0f} MB >= {ETL_STREAM_THRESHOLD_MB:.0f} MB, "
+              f"chunks of {ETL_CHUNK_ROWS} rows")
+    return max(1, ETL_CHUNK_ROWS)
+
+
+def _aggregate_stock(chunks: Iterable[pd.DataFrame], keys: List[str]) -> Tuple[pd.DataFrame, int]:
+    """
+    groupby(keys).sum(stock) по шматках: кожен шматок згортається одразу,
+    проміжні результати періодично об'єднуються. Результат (і порядок рядків)
+    той самий, що й у groupby по всьому файлу. Повертає (df, кількість сирих рядків).
+    """
+    partials: List[pd.DataFrame] = []
+    raw_rows = 0
+    for chunk in chunks:
+        raw_rows += len(chunk)
+        partials.append(chunk.groupby(keys, as_index=False).agg({"stock": "sum"}))
+        if len(partials) >= STOCK_PARTIALS_MAX:
+            partials = [pd.concat(partials, ignore_index=True).groupby(keys, as_index=False).agg({"stock": "sum"})]
+
+    if len(partials) == 1:
+        return partials[0], raw_rows
+    return pd.concat(partials, ignore_index=True).groupby(keys, as_index=False).agg({"stock": "sum"}), raw_rows
+
+
+def _attach_brand_names(df_std: pd.DataFrame, df_brands: pd.DataFrame) -> pd.DataFrame:
+    df_std["brand"] = df_std["brand"].astype(str).str.strip().str.upper()
+    df_std = pd.merge(df_std, df_brands, left_on="brand", right_on="short_name", how="left")
+    df_std["brand"] = df_std["full_name"].fillna(df_std["brand"])
+    return df_std.drop(columns=["short_name", "full_name"])
+
+
+def iter_base_chunks(
+    supplier: str,
+    local_files: Dict[str, RawInput],
+    chunk_rows: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    УНІВЕРСАЛЬНА ПІДГОТОВКА (по шматках):
+    - Сумує залишки по складах (Aggregation).
+    - Робить мердж, якщо це Autopartner (ціни + залишки).
+    - Додає повні назви брендів.
+    chunk_rows=None — рівно один DataFrame на весь прайс.
+    """
+    # 1. Налаштування (Config)
     sup_cfg = _load_supplier_cfg(supplier)
     layout = sup_cfg.get("raw_layout", {}) or {}
     colmap = layout.get("columns") or {}
     read_params = {
+        "chunk_rows": chunk_rows,
         "stock_index": layout.get("stock_index"),
         "stock_header_token": layout.get("stock_header_token", "STAN"),
         "gt5_to": layout.get("gt5_to"),
@@ -365,96 +822,184 @@ def prepare_base_df(
         "normalize_mode": (sup_cfg.get("normalize") or {}).get("mode", "spaces"),
     }
 
+    def _upper_code(df: pd.DataFrame) -> pd.DataFrame:
+        df["code"] = df["code"].astype(str).str.strip().str.upper()
+        return df
+
+    # 2. Бренди (якщо є файл brands.csv) — маленький, читаємо одразу
+    df_brands = None
+    if "brands" in local_files:
+        print(f"[INFO] 🏷️ Додаємо повні назви брендів...")
+        with open_binary(local_files["brands"]) as fh:
+            df_brands = pd.read_csv(fh, sep=";", names=["short_name", "full_name"],
+                                    encoding="cp1250", quotechar='"', encoding_errors="replace")
+        df_brands["short_name"] = df_brands["short_name"].astype(str).str.strip().str.upper()
+
+    def _finish(df: pd.DataFrame) -> pd.DataFrame:
+        if df_brands is not None:
+            df = _attach_brand_names(df, df_brands)
+        return df
+
     # 3. Обробка даних
     # СЦЕНАРІЙ А: Autopartner (2 окремі файли)
     if "prices" in local_files and "stock" in local_files:
         print(f"[INFO] 🧩 Режим МЕРДЖУ для {supplier}...")
-        rows_p = raw_csv_to_rows(local_files["prices"], **{**read_params, "stock_index": None})
-        df_p = _rows_to_standard_df(rows_p, colmap)
-        df_p["code"] = df_p["code"].astype(str).str.strip().str.upper()
-
-        rows_s = raw_csv_to_rows(local_files["stock"], **read_params)
-        df_s = _rows_to_standard_df(rows_s, colmap)
-        df_s["code"] = df_s["code"].astype(str).str.strip().str.upper()
 
         # --- СУМУЄМО СКЛАДИ ---
-        print(f"[INFO] 🔄 Агрегація стоку: було {len(df_s)} рядків...")
-        df_s = df_s.groupby("code", as_index=False).agg({"stock": "sum"})
+        stock_chunks = iter_standard_chunks(local_files["stock"], colmap, **read_params)
+        df_s, stock_rows = _aggregate_stock((_upper_code(c) for c in stock_chunks), ["code"])
+        print(f"[INFO] 🔄 Агрегація стоку: було {stock_rows} рядків...")
         print(f"[INFO] ✅ Після об'єднання складів: {len(df_s)} унікальних кодів.")
 
-        # Мердж цін із сумарними залишками
-        df_std = pd.merge(df_p.drop(columns=["stock"]), df_s[["code", "stock"]], on="code", how="inner")
+        # Мердж цін із сумарними залишками (inner зберігає порядок цін -> шматки склеюються як цілий файл)
+        price_chunks = iter_standard_chunks(local_files["prices"], colmap, **{**read_params, "stock_index": None})
+        for df_p in price_chunks:
+            df_p = _upper_code(df_p)
+            yield _finish(pd.merge(df_p.drop(columns=["stock"]), df_s[["code", "stock"]], on="code", how="inner"))
 
     # СЦЕНАРІЙ Б: Гданськ / Maxgear (1 файл)
     else:
         print(f"[INFO] 📄 Режим одного файлу для {supplier}...")
         main_file = local_files.get("prices") or list(local_files.values())[0]
-        rows = raw_csv_to_rows(main_file, **read_params)
-        df_std = _rows_to_standard_df(rows, colmap)
-        df_std["code"] = df_std["code"].astype(str).str.strip().str.upper()
 
         # Навіть в одному файлі можуть бути дублі (різні склади)
-        cols_to_keep = [c for c in df_std.columns if c != 'stock']
-        df_std = df_std.groupby(cols_to_keep, as_index=False).agg({"stock": "sum"})
+        cols_to_keep = [c for c in STANDARD_COLUMNS if c != 'stock']
+        chunks = (_upper_code(c) for c in iter_standard_chunks(main_file, colmap, **read_params))
+        df_std, _ = _aggregate_stock(chunks, cols_to_keep)
 
-    # 4. Бренди (якщо є файл brands.csv)
-    if "brands" in local_files:
-        print(f"[INFO] 🏷️ Додаємо повні назви брендів...")
-        df_brands = pd.read_csv(local_files["brands"], sep=";", names=["short_name", "full_name"],
-                               encoding="cp1250", quotechar='"', encoding_errors="replace")
-        df_brands["short_name"] = df_brands["short_name"].astype(str).str.strip().str.upper()
-        df_std["brand"] = df_std["brand"].astype(str).str.strip().str.upper()
+        if not chunk_rows:
+            yield _finish(df_std)
+            return
+        for start in range(0, max(len(df_std), 1), chunk_rows):
+            yield _finish(df_std.iloc[start:start + chunk_rows].reset_index(drop=True))
 
-        df_std = pd.merge(df_std, df_brands, left_on="brand", right_on="short_name", how="left")
-        df_std["brand"] = df_std["full_name"].fillna(df_std["brand"])
-        df_std = df_std.drop(columns=["short_name", "full_name"])
 
+def prepare_base_df(
+    supplier: str,
+    additional_files: Optional[Dict[str, str]] = None,
+    remote_gz_path: Optional[str] = None
+) -> Tuple[pd.DataFrame, List[Path]]:
+    """
+    Завантаження + підготовка всього прайсу одним DataFrame.
+    Повертає готовий DataFrame та список файлів для видалення.
+    """
+    local_files, cleanup_paths = fetch_supplier_files(supplier, additional_files, remote_gz_path)
+    df_std = next(iter_base_chunks(supplier, local_files))
     return df_std, cleanup_paths
 
 
 # ----------------------- Main pipeline -----------------------
-def process_one_price(
-        df_input: pd.DataFrame,  # ТЕПЕР ПРИЙМАЄ ГОТОВИЙ DATAFRAME
-        supplier: str,
-        supplier_id: Optional[int],
-        factor: float,
-        currency_out: str,  # "EUR" | "UAH"
-        format_: str,  # "xlsx" | "csv"
-        rounding: Dict[str, int],  # {"EUR":2, "UAH":0}
-        r2_prefix: str,  # ".../{supplier}/"
-        columns: List[Dict[str, str]],
-        csv_cfg: Optional[Dict[str, Any]] = None,
-        rate: float = 1.0,
-) -> Tuple[str, str]:
-    """
-    ЛЕГКИЙ ЕТАП: Тільки націнка, запис у БД та вивантаження файлу.
-    Більше не качає FTP і не робить мердж!
-    """
-    tmp_dir = TEMP_DIR
-    stamp = datetime.now().strftime("%Y%m%d_%H%M")
-    supplier_code_str = supplier.lower()
 
-    # 1) Створюємо копію даних для цього конкретного проходу
-    # Щоб націнка для одного прайсу не вплинула на інший
-    df_std = df_input.copy()
+def _output_tag(r2_prefix: str) -> str:
+    """Мітка у назві файлу на основі префікса шляху (r2_prefix)."""
+    prefix_lower = r2_prefix.lower()
 
-    # 2) КАЛЬКУЛЯЦІЯ ЦІНИ
-    price_final = _apply_pricing(
-        df_std, factor=factor, currency_out=currency_out, rate=rate, rounding=rounding
-    )
+    if "exist" in prefix_lower:
+        return "exist"
+    elif "1_29" in prefix_lower:
+        return "m"
+    elif "1_33" in prefix_lower:
+        return "l"
+    elif "site" in prefix_lower:
+        return "site"
+    return "data"  # Технічний тег, якщо нічого не підійшло
 
-    # 3) ЗБІРКА ВИХІДНОГО DATAFRAME
-    out_df = _build_output_df(
-        df_std, price_final, columns_cfg=columns, supplier_id=supplier_id
-    )
 
-    # 4) ЗАПИС У POSTGRESQL (тільки для сайтів)
-    if "/site/" in r2_prefix and supplier_id is not None:
+class PriceProfileWriter:
+    """
+    Один вихідний прайс (профіль), що наповнюється шматками:
+    write(df) — націнка, staging у temp_import, дописування у файл;
+    finish() — UPSERT у каталог і вивантаження в R2, повертає (key, url).
+    Весь прайс одним шматком — це звичайний process_one_price.
+    """
+
+    def __init__(
+            self,
+            supplier: str,
+            supplier_id: Optional[int],
+            factor: float,
+            currency_out: str,  # "EUR" | "UAH"
+            format_: str,  # "xlsx" | "csv"
+            rounding: Dict[str, int],  # {"EUR":2, "UAH":0}
+            r2_prefix: str,  # ".../{supplier}/"
+            columns: List[Dict[str, str]],
+            csv_cfg: Optional[Dict[str, Any]] = None,
+            rate: float = 1.0,
+    ):
+        self.supplier = supplier
+        self.supplier_id = supplier_id
+        self.factor = factor
+        self.currency_out = currency_out
+        self.rounding = rounding
+        self.r2_prefix = r2_prefix
+        self.columns = columns
+        self.csv_cfg = csv_cfg or {}
+        self.rate = rate
+        self.rows = 0
+
+        # Формуємо фінальну назву (тільки малі букви)
+        # Приклад: price_autopartner_08.02.26_223005_xl.xlsx
+        # Формат: xlsx | csv | csv.gz | parquet (див. exporters.py)
+        date_str = datetime.now().strftime("%d.%m.%y")  # 08.02.26
+        time_str = datetime.now().strftime("%H%M%S")  # 223005
+        stem = f"price_{supplier.lower()}_{date_str}_{time_str}_{_output_tag(r2_prefix)}"
+        self._exporter = make_exporter(format_, TEMP_DIR / stem, self.csv_cfg)
+        self.ext = self._exporter.ext
+        self.out_path = self._exporter.path
+        self.out_name = self.out_path.name
+
+        self._written = False
+        self.export_seconds = 0.0
+        self.upload = None  # Future вивантаження для finish(wait=False)
+
+        # ЗАПИС У POSTGRESQL (тільки для сайтів): одна транзакція на весь прайс
+        self._db_enabled = "/site/" in r2_prefix and supplier_id is not None
+        self.db_error: Optional[str] = None
+        self._conn = None
+        self._tx = None
+        self._stages: List[Dict[str, Any]] = []
+
+    @property
+    def pricing(self) -> Dict[str, Any]:
+        return {"factor": self.factor, "currency_out": self.currency_out, "rate": self.rate}
+
+    # --- шматок прайсу ---
+    def write(self, df_std: pd.DataFrame, price_final: Optional[np.ndarray] = None) -> None:
+        # 1) КАЛЬКУЛЯЦІЯ ЦІНИ (df_std не змінюється — спільний для всіх профілів).
+        # Кілька профілів рахуються разом через price_matrix і передають сюди свій стовпець.
+        if price_final is None:
+            price_final = price_matrix(df_std, [self.pricing], self.rounding)[:, 0]
+
+        # 2) ЗБІРКА ВИХІДНОГО DATAFRAME
+        out_df = _build_output_df(
+            df_std, price_final, columns_cfg=self.columns, supplier_id=self.supplier_id
+        )
+
+        # 3) STAGING У temp_import
+        if self._db_enabled:
+            self._stage_db(out_df)
+
+        # 4) ДОПИСУЄМО У ФАЙЛ
+        self._export(out_df)
+        self.rows += len(out_df)
+
+    def _add_stage(self, stage: Dict[str, Any]) -> None:
+        """Етапи, що повторюються для кожного шматка, сумуються в один рядок звіту."""
+        for s in self._stages:
+            if s["stage"] == stage["stage"]:
+                s["rows"] = (s.get("rows") or 0) + (stage.get("rows") or 0)
+                s["seconds"] += stage["seconds"]
+                return
+        self._stages.append(dict(stage))
+
+    def _stage_db(self, out_df: pd.DataFrame) -> None:
         try:
-            print(f"[INFO] DB Trigger: Starting UPSERT for {supplier} into {TABLE_CATALOG}...")
+            if self._conn is None:
+                print(f"[INFO] DB Trigger: Starting UPSERT for {self.supplier} into {TABLE_CATALOG}...")
+            t_stage = time.perf_counter()
 
             # --- ПІДГОТОВКА ДАНИХ (Нормалізація) ---
-            out_df_db = out_df.replace('\x00', '', regex=True).copy()
+            out_df_db = out_df.replace('\x00', '', regex=True)
 
             def _norm_val(v: str) -> str:
                 if not v or pd.isna(v): return ""
@@ -465,104 +1010,164 @@ def process_one_price(
             out_df_db["unicode_norm"] = out_df_db["unicode"].apply(
                 _norm_val) if "unicode" in out_df_db.columns else None
             out_df_db["brand_norm"] = out_df_db["brand"].apply(_norm_val) if "brand" in out_df_db.columns else None
-            out_df_db["supplier_id"] = supplier_id
+            out_df_db["supplier_id"] = self.supplier_id
 
-            # СТРАХОВКА: Видаляємо дублікати в самому прайсі перед заливкою
+            # СТРАХОВКА: Видаляємо дублікати в самому шматку (між шматками — finalize_temp_import)
             out_df_db = out_df_db.drop_duplicates(subset=['brand_norm', 'code_norm', 'supplier_id'])
+            if "price" in out_df_db.columns:
+                out_df_db = out_df_db.rename(columns={"price": "price_eur"})
+            self._add_stage({"stage": "prepare", "rows": len(out_df_db), "seconds": time.perf_counter() - t_stage})
 
-            # --- ВИКОНАННЯ ТРАНЗАКЦІЇ ---
-            with engine.begin() as conn:
-                # КРОК 0: Видаляємо стару тимчасову таблицю, якщо вона залишилася з минулого кола
-                conn.execute(text("DROP TABLE IF EXISTS temp_import"))
-
-                # КРОК А: Створюємо нову тимчасову таблицю
-                conn.execute(text(f"CREATE TEMP TABLE temp_import (LIKE {TABLE_CATALOG} INCLUDING ALL)"))
-
-                # КРОК Б: Швидко заливаємо дані в temp_import
-                # (Не забудь про перейменування ціни, якщо ще не зробив)
-                if "price" in out_df_db.columns:
-                    out_df_db = out_df_db.rename(columns={"price": "price_eur"})
-
-                out_df_db.to_sql('temp_import', con=conn, if_exists='append', index=False)
-
-                # КРОК В: UPSERT (Зберігаємо старі ID, оновлюємо ціну та сток)
-                # Поле name поки не оновлюємо (як ти й хотів), щоб не лаялося на відсутність колонки
-                conn.execute(text(f"""
-                        INSERT INTO {TABLE_CATALOG} (brand, code, unicode, name, stock, price_eur, supplier_id, brand_norm, code_norm, unicode_norm)
-                        SELECT brand, code, unicode, name, stock, price_eur, supplier_id, brand_norm, code_norm, unicode_norm 
-                        FROM temp_import
-                        ON CONFLICT (brand_norm, code_norm, supplier_id) 
-                        DO UPDATE SET 
-                            price_eur = EXCLUDED.price_eur,
-                            stock = EXCLUDED.stock;
-                    """))
-
-                # КРОК Г: ОБНУЛЕННЯ (Товари, яких немає в новому прайсі, ставимо stock = 0)
-                conn.execute(text(f"""
-                        UPDATE {TABLE_CATALOG} 
-                        SET stock = 0 
-                        WHERE supplier_id = :sid 
-                        AND NOT EXISTS (
-                            SELECT 1 FROM temp_import t 
-                            WHERE t.brand_norm = {TABLE_CATALOG}.brand_norm 
-                            AND t.code_norm = {TABLE_CATALOG}.code_norm
-                        )
-                    """), {"sid": supplier_id})
-
-            print(f"[INFO] PostgreSQL: SUCCESS! {len(out_df_db)} items upserted to {TABLE_CATALOG}.")
+            # КРОК 0 + А: транзакція і тимчасова таблиця — на першому шматку
+            if self._conn is None:
+                self._conn = engine.connect()
+                self._tx = self._conn.begin()
+                create_temp_import(self._conn, TABLE_CATALOG)
+
+            # КРОК Б: COPY FROM STDIN шматками (fallback — to_sql)
+            load_stats = load_dataframe(self._conn, out_df_db, "temp_import")
+            self._add_stage({"stage": "load", **load_stats})
 
         except Exception as e:
             print(f"[ERROR] Database UPSERT failed: {e}")
+            self.db_error = str(e)
+            self._close_db()
+            self._db_enabled = False
 
-    # 5) ЕКСПОРТ У ФАЙЛ (Excel або CSV)
-    ext = "xlsx" if format_.lower() == "xlsx" else "csv"
-
-    # --- 👇 ЛОГІКА ТЕГІВ ЗГІДНО З ТВОЇМ ЗАПИТОМ 👇 ---
-    date_str = datetime.now().strftime("%d.%m.%y")  # 08.02.26
-    time_str = datetime.now().strftime("%H%M%S")  # 223005
-
-    # Визначаємо мітку на основі префікса шляху (r2_prefix)
-    prefix_lower = r2_prefix.lower()
+    def _merge_db(self) -> None:
+        try:
+            # Дублі між шматками (лишається перший рядок прайсу)
+            t_stage = time.perf_counter()
+            dupes = finalize_temp_import(self._conn)
+            self._add_stage({"stage": "dedupe", "rows": dupes, "seconds": time.perf_counter() - t_stage})
+
+            # КРОК В + Г: UPSERT і обнулення (diff-режим — тільки змінені рядки)
+            merge_stats = merge_temp_import(self._conn, TABLE_CATALOG, self.supplier_id)
+            self._stages.extend(merge_stats.pop("stages"))
+            self._tx.commit()
+
+            print(f"[INFO] PostgreSQL: SUCCESS! {merge_stats['staged']} items processed for {TABLE_CATALOG} "
+                  f"(inserted {merge_stats['inserted']}, updated {merge_stats['updated']}, "
+                  f"unchanged {merge_stats['unchanged']}, zeroed {merge_stats['zeroed']}, "
+                  f"mode: {'diff' if merge_stats['diff'] else 'full'}).")
+            print(f"[INFO] DB stages ({self.supplier}): {format_stages(self._stages)}")
+
+            # Каталог змінився -> перебудовуємо in-memory індекс кодів (якщо він живе в цьому процесі)
+            # ... і інвалідуємо закешовані сторінки пошуку цього постачальника
+            if catalog_changed(merge_stats):
+                refresh_code_index()
+                bump_catalog_generation(self.supplier_id)
+            else:
+                print(f"[INFO] Catalog unchanged for {self.supplier}: search index and cache kept.")
 
-    if "exist" in prefix_lower:
-        tag = "exist"
-    elif "1_29" in prefix_lower:
-        tag = "m"
-    elif "1_33" in prefix_lower:
-        tag = "l"
-    elif "site" in prefix_lower:
-        tag = "site"
-    else:
-        tag = "data"  # Технічний тег, якщо нічого не підійшло
+        except Exception as e:
+            print(f"[ERROR] Database UPSERT failed: {e}")
+            self.db_error = str(e)
+        finally:
+            self._close_db()
 
-    # Формуємо фінальну назву (тільки малі букви)
-    # Приклад: price_autopartner_08.02.26_223005_xl.xlsx
-    out_name = f"price_{supplier.lower()}_{date_str}_{time_str}_{tag}.{ext}"
-    out_path = tmp_dir / out_name
-    # -----------------------------------------------
+    def _close_db(self) -> None:
+        """Відкат незавершеної транзакції і повернення з'єднання в пул."""
+        try:
+            if self._tx is not None and self._tx.is_active:
+                self._tx.rollback()
+            if self._conn is not None:
+                self._conn.close()
+        except Exception as e:
+            print(f"[WARN] Closing DB connection failed: {e}")
+        self._conn = None
+        self._tx = None
+
+    def _export(self, out_df: pd.DataFrame) -> None:
+        # Кожен шматок одразу дописується у файл (xlsx теж — constant_memory)
+        t_export = time.perf_counter()
+        self._exporter.write(out_df)
+        self.export_seconds += time.perf_counter() - t_export
+        self._written = True
+
+    # --- завершення ---
+    def finish(self, wait: bool = True) -> Tuple[str, str]:
+        """
+        wait=False: вивантаження йде у спільному пулі R2, а Future лежить у self.upload —
+        виклик має дочекатись його (upload.result()), перш ніж вважати профіль готовим.
+        """
+        # Порожній прайс: файл усе одно має шапку
+        if not self._written:
+            empty = pd.DataFrame(columns=STANDARD_COLUMNS)
+            self._export(_build_output_df(empty, empty["price"], columns_cfg=self.columns, supplier_id=self.supplier_id))
+
+        # 5) UPSERT У КАТАЛОГ
+        if self._conn is not None:
+            self._merge_db()
+
+        # 6) ЕКСПОРТ У ФАЙЛ: дописуємо і закриваємо
+        t_export = time.perf_counter()
+        self._exporter.close()
+        self.export_seconds += time.perf_counter() - t_export
+        content_type = self._exporter.content_type
+        size_mb = self.out_path.stat().st_size / 1024 / 1024
+        print(f"[INFO] Export ({self.ext}) {self.out_name}: {self.rows} rows, {size_mb:.1f} MB, "
+              f"{self.export_seconds:.2f}s")
+
+        # 7) ВИВАНТАЖЕННЯ В CLOUDFLARE R2
+        storage = get_storage()
+        key = f"{self.r2_prefix}{self.out_name}"
+
+        if not wait:
+            self.upload = storage.submit_upload(
+                local_path=str(self.out_path),
+                key=key,
+                content_type=content_type,
+                cleanup_prefix=self.r2_prefix,
+                keep_last=5,
+                delete_local=True,
+            )
+            return key, storage.url_for(key)
+
+        url = storage.upload_file(
+            local_path=str(self.out_path),
+            key=key,
+            content_type=content_type,
+            cleanup_prefix=self.r2_prefix,
+            keep_last=5,  # Тримаємо 5 останніх версій
+        )
+
+        # Видаляємо готовий Excel/CSV з диска після вивантаження
+        self.out_path.unlink(missing_ok=True)
+
+        return key, url
+
+    def abort(self) -> None:
+        """Імпорт упав посередині: відкат staging і видалення недописаного файлу."""
+        self._close_db()
+        self._exporter.abort()
+        self.out_path.unlink(missing_ok=True)
 
 
-    if ext == "xlsx":
-        out_df.to_excel(out_path, index=False, engine="xlsxwriter")
-        content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    else:
-        delim = (csv_cfg or {}).get("delimiter", ";")
-        out_df.to_csv(out_path, index=False, sep=delim, header=True, encoding="utf-8")
-        content_type = "text/csv"
-
-    # 6) ВИВАНТАЖЕННЯ В CLOUDFLARE R2
-    storage = StorageClient()
-    key = f"{r2_prefix}{out_name}"
-
-    url = storage.upload_file(
-        local_path=str(out_path),
-        key=key,
-        content_type=content_type,
-        cleanup_prefix=r2_prefix,
-        keep_last=5,  # Тримаємо 5 останніх версій
+def process_one_price(
+        df_input: pd.DataFrame,  # ТЕПЕР ПРИЙМАЄ ГОТОВИЙ DATAFRAME
+        supplier: str,
+        supplier_id: Optional[int],
+        factor: float,
+        currency_out: str,  # "EUR" | "UAH"
+        format_: str,  # "xlsx" | "csv"
+        rounding: Dict[str, int],  # {"EUR":2, "UAH":0}
+        r2_prefix: str,  # ".../{supplier}/"
+        columns: List[Dict[str, str]],
+        csv_cfg: Optional[Dict[str, Any]] = None,
+        rate: float = 1.0,
+) -> Tuple[str, str]:
+    """
+    ЛЕГКИЙ ЕТАП: Тільки націнка, запис у БД та вивантаження файлу.
+    Більше не качає FTP і не робить мердж! (PriceProfileWriter з одним шматком.)
+    """
+    writer = PriceProfileWriter(
+        supplier, supplier_id, factor, currency_out, format_, rounding, r2_prefix, columns,
+        csv_cfg=csv_cfg, rate=rate,
     )
-
-    # Видаляємо готовий Excel/CSV з диска після вивантаження
-    out_path.unlink(missing_ok=True)
-
-    return key, url
\ No newline at end of file
+    try:
+        writer.write(df_input)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.finish()
@@ -0,0 +1,187 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.etl.price_processor import PriceProfileWriter, price_matrix
+from app.etl.base_snapshot import read_frame
+
+# ===========================================
+# ПАРАЛЕЛЬНИЙ ЕКСПОРТ ПРОФІЛІВ (process pool)
+# ===========================================
+# Кожен профіль — це націнка + xlsx/csv + R2, і вони не залежать один від одного.
+# PROFILE_WORKERS>1: файлові профілі розходяться по пулу процесів. base_df не
+# пікається в кожну задачу: воркер один раз читає Parquet (снапшот бази) через memory map.
+# Профілі з записом у БД (/site/) виконуються в головному процесі по одному:
+#   - UPSERT одного постачальника ніколи не йде паралельно сам із собою;
+#   - refresh_code_index / bump_catalog_generation — одразу в процесі імпорту (інші процеси бачать
+#     нове покоління з БД, див. search_cache.py).
+# Пул — spawn: fork з живими потоками і з'єднаннями SQLAlchemy небезпечний.
+# Воркерів не більше, ніж доступних ядер: на одному ядрі пул лише заважає.
+# Пул один на процес і живе між імпортами (spawn та імпорт pandas/pyarrow — один раз);
+# воркер тримає останню прочитану базу і перечитує її, лише коли змінився файл.
+# Пул працює лише у звичайному режимі (база цілком у пам'яті). Потоковий режим
+# (ETL_STREAMING, великі файли) рахує всі профілі по шматку в одному процесі — price_matrix.
+
+PROFILE_WORKERS = int(os.getenv("PROFILE_WORKERS", "1"))
+
+# База в процесі-воркері: (шлях, mtime, розмір) -> DataFrame останнього імпорту
+_WORKER_BASE: Optional[pd.DataFrame] = None
+_WORKER_BASE_ID: Optional[Tuple[str, int, int]] = None
+
+# Пул головного процесу
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_SIZE = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _worker_base(parquet_path: str) -> pd.DataFrame:
+    global _WORKER_BASE, _WORKER_BASE_ID
+    st = os.stat(parquet_path)
+    base_id = (parquet_path, st.st_mtime_ns, st.st_size)
+    if base_id != _WORKER_BASE_ID:
+        _WORKER_BASE = None  # старий знімок звільняємо до читання нового
+        _WORKER_BASE = read_frame(Path(parquet_path))
+        _WORKER_BASE_ID = base_id
+    return _WORKER_BASE
+
+
+def export_profile(
+        df: pd.DataFrame,
+        supplier: str,
+        supplier_id: Optional[int],
+        rounding: Dict[str, int],
+        settings: Dict[str, Any],
+        price_final: Optional[np.ndarray] = None,
+        wait_upload: bool = True,
+) -> Dict[str, Any]:
+    """
+    Один профіль цілком -> {key, url, db_error, seconds}. price_final — стовпець з price_matrix.
+    wait_upload=False: вивантаження в R2 йде у фоні, його Future — у "upload".
+    """
+    t_start = time.perf_counter()
+    writer = PriceProfileWriter(supplier=supplier, supplier_id=supplier_id, rounding=rounding, **settings)
+    try:
+        writer.write(df, price_final)
+    except Exception:
+        writer.abort()
+        raise
+    key, url = writer.finish(wait=wait_upload)
+    return {
+        "key": key,
+        "url": url,
+        "db_error": writer.db_error,
+        "seconds": time.perf_counter() - t_start,
+        "upload": writer.upload,
+    }
+
+
+def _export_in_worker(parquet_path, supplier, supplier_id, rounding, settings):
+    res = export_profile(_worker_base(parquet_path), supplier, supplier_id, rounding, settings)
+    res.pop("upload")
+    return res
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Windows / macOS
+        return os.cpu_count() or 1
+
+
+def profile_workers() -> int:
+    """Скільки процесів реально дати пулу (1 — послідовний режим)."""
+    return max(1, min(PROFILE_WORKERS, _cpu_count()))
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Спільний пул на workers процесів (створюється при першому паралельному імпорті)."""
+    global _POOL, _POOL_SIZE
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_SIZE != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=True)
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _POOL_SIZE = workers
+        return _POOL
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    """Зламаний пул (воркер упав) — наступний імпорт створить новий."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_profile_pool() -> None:
+    """Зупинка API: завершуємо процеси пулу."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def writes_db(settings: Dict[str, Any], supplier_id: Optional[int]) -> bool:
+    """Те саме правило, що в PriceProfileWriter: у БД пишуть лише профілі сайту."""
+    return "/site/" in settings["r2_prefix"] and supplier_id is not None
+
+
+def run_profiles_parallel(
+        df: pd.DataFrame,
+        parquet_path: Path,
+        supplier: str,
+        supplier_id: Optional[int],
+        rounding: Dict[str, int],
+        jobs: List[Tuple[str, Dict[str, Any]]],
+        workers: int,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Файлові профілі -> пул з min(workers, кількість) процесів, профілі з БД -> головний процес.
+    Повертає {профіль: результат export_profile}.
+    """
+    pool_jobs = [(name, settings) for name, settings in jobs if not writes_db(settings, supplier_id)]
+    local_jobs = [(name, settings) for name, settings in jobs if writes_db(settings, supplier_id)]
+    done: Dict[str, Dict[str, Any]] = {}
+
+    t_start = time.perf_counter()
+    pool = _get_pool(workers)
+    print(f"[INFO] Parallel profiles: {len(pool_jobs)} in pool of {workers} worker(s), "
+          f"{len(local_jobs)} with DB in main process")
+
+    futures = {
+        name: pool.submit(_export_in_worker, str(parquet_path), supplier, supplier_id, rounding, settings)
+        for name, settings in pool_jobs
+    }
+    try:
+        # Поки пул пише файли — профілі з БД тут, послідовно
+        prices = price_matrix(df, [settings for _, settings in local_jobs], rounding)
+        for j, (name, settings) in enumerate(local_jobs):
+            done[name] = export_profile(df, supplier, supplier_id, rounding, settings, prices[:, j])
+
+        for name, fut in futures.items():
+            done[name] = fut.result()
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        raise
+    finally:
+        # Помилка посередині: задачі, що ще не стартували, не мають писати файли після імпорту
+        for fut in futures.values():
+            fut.cancel()
+
+    wall = time.perf_counter() - t_start
+    total = sum(r["seconds"] for r in done.values())
+    timings = ", ".join(f"{name} {done[name]['seconds']:.2f}s" for name, _ in jobs)
+    print(f"[INFO] Profile timings: {timings}")
+    print(f"[INFO] Parallel profiles: wall {wall:.2f}s, sum of profile times {total:.2f}s "
+          f"(speedup x{total / wall if wall else 0:.1f})")
+    return done
@@ -0,0 +1,340 @@
+import io
+import os
+import gzip
+import hashlib
+import queue
+import struct
+import ftplib
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, TextIO, Tuple, Union
+
+# ===========================================
+# ДЖЕРЕЛА СИРИХ ПРАЙСІВ (потокове читання)
+# ===========================================
+# Файл постачальника йде в парсер одним потоком байтів, без проміжних копій:
+#   локальний .gz -> gzip.open (розпакована копія на диск не пишеться)
+#   FTP .csv/.gz  -> retrbinary у фоновому потоці -> обмежена черга -> (gzip) -> парсер
+# Завантаження і розбір іде паралельно. FTP_STREAM_CACHE=1 — сирі байти
+# додатково пишуться (tee) у файл у TEMP_DIR.
+# Джерело одноразове: open() для FTP відкриває нову передачу.
+# Розмір та ідентичність FTP-файлу відомі ще до передачі: SIZE + MDTM (одне коротке з'єднання).
+# Ідентичністю імпорт вирішує, чи файл змінився, і знаходить снапшот — без завантаження.
+
+FTP_STREAM_CACHE = os.getenv("FTP_STREAM_CACHE", "0") == "1"
+FTP_PIPE_BUFFER_MB = int(os.getenv("FTP_PIPE_BUFFER_MB", "64"))
+FTP_BLOCK_SIZE = 256 * 1024
+# Оцінка розпакованого розміру .gz з FTP (SIZE дає лише стиснутий) — для вибору режиму ETL
+FTP_GZ_SIZE_RATIO = float(os.getenv("FTP_GZ_SIZE_RATIO", "6"))
+
+# Сира передача: Path (звичайний файл) або об'єкт з open() -> бінарний потік
+RawInput = Union[Path, "GzipFileSource", "FtpSource"]
+
+
+# ----------------------- FTP -----------------------
+
+def ftp_credentials(supplier: str) -> Tuple[str, str, str, str]:
+    """
+    Динамічні секрети з .env на основі імені постачальника (напр. AUTOPARTNER_FTP_HOST).
+    Повертає (prefix, host, user, pwd).
+    """
+    prefix = supplier.upper().replace(" ", "_")
+    host = os.getenv(f"{prefix}_FTP_HOST")
+    user = os.getenv(f"{prefix}_FTP_USER")
+    pwd = os.getenv(f"{prefix}_FTP_PASS")
+
+    # Перевірка: якщо в .env забули прописати дані для цього постачальника
+    if not all([host, user, pwd]):
+        raise RuntimeError(f"Credentials for {prefix} are missing in .env. "
+                           f"Please add {prefix}_FTP_HOST, {prefix}_FTP_USER, {prefix}_FTP_PASS.")
+    return prefix, host, user, pwd
+
+
+def ftp_login(host: str, user: str, pwd: str, tls: bool) -> ftplib.FTP:
+    """Explicit TLS (FTPS) або звичайний FTP, режим PASV (як у FileZilla)."""
+    if tls:
+        ftp = ftplib.FTP_TLS(host, timeout=20)
+        ftp.auth()
+        ftp.prot_p()
+    else:
+        ftp = ftplib.FTP(host, timeout=20)
+    ftp.set_pasv(True)
+    ftp.login(user, pwd)
+    return ftp
+
+
+class _Aborted(Exception):
+    """Читач закрив потік раніше — зупиняємо retrbinary."""
+
+
+class _FtpPipe(io.RawIOBase):
+    """
+    Байти FTP-передачі як звичайний потік для читання.
+    retrbinary працює у фоновому потоці й складає блоки в обмежену чергу;
+    якщо парсер не встигає, черга заповнюється і передача пригальмовує.
+    """
+
+    def __init__(self, ftp: ftplib.FTP, remote_path: str, label: str, cache_path: Optional[Path] = None):
+        super().__init__()
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, FTP_PIPE_BUFFER_MB * 1024 * 1024 // FTP_BLOCK_SIZE))
+        self._buf = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        self._ftp = ftp
+        self._remote_path = remote_path
+        self._label = label
+        self._cache_path = cache_path
+        self.digest: Optional[str] = None  # sha256 сирих байтів, коли передача завершена
+        self._thread = threading.Thread(target=self._run, name="ftp-stream", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        cache = open(self._cache_path, "wb") if self._cache_path else None
+        hasher = hashlib.sha256()
+        total = 0
+
+        def _put(item: Any) -> None:
+            while True:
+                try:
+                    self._queue.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    if self._stop.is_set():
+                        raise _Aborted()
+
+        # recv віддає шматки довільного розміру — збираємо їх у блоки ~FTP_BLOCK_SIZE,
+        # щоб FTP_PIPE_BUFFER_MB справді обмежував обсяг у черзі
+        block = bytearray()
+
+        def _on_block(data: bytes) -> None:
+            nonlocal total, block
+            if self._stop.is_set():
+                raise _Aborted()
+            total += len(data)
+            hasher.update(data)
+            if cache:
+                cache.write(data)
+            block += data
+            if len(block) >= FTP_BLOCK_SIZE:
+                _put(bytes(block))
+                block = bytearray()
+
+        try:
+            self._ftp.retrbinary(f"RETR {self._remote_path}", _on_block, blocksize=FTP_BLOCK_SIZE)
+            self._ftp.quit()
+            if block:
+                _put(bytes(block))
+            self.digest = hasher.hexdigest()
+            print(f"[SUCCESS] Streamed via {self._label}: {self._remote_path} ({total / 1024 / 1024:.1f} MB)")
+            _put(None)
+        except _Aborted:
+            self._ftp.close()
+        except Exception as e:
+            self._ftp.close()
+            try:
+                _put(e)
+            except _Aborted:
+                pass
+        finally:
+            if cache:
+                cache.close()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._buf:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, Exception):
+                self._eof = True
+                raise RuntimeError(f"FTP transfer failed for {self._remote_path}: {item}")
+            self._buf = memoryview(item)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            # Звільняємо місце в черзі, щоб фоновий потік помітив _stop
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread.join()
+        super().close()
+
+
+class _GzipStream(gzip.GzipFile):
+    """GzipFile поверх чужого потоку: close() закриває і сам потік (зупиняє FTP-передачу)."""
+
+    def __init__(self, stream: BinaryIO):
+        super().__init__(fileobj=stream, mode="rb")
+        self._stream = stream
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._stream.close()
+
+
+# ----------------------- Sources -----------------------
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_gz(name: str) -> bool:
+    return name.lower().endswith(".gz")
+
+
+class GzipFileSource:
+    """Локальний .gz, що розпаковується на льоту."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.name = self.path.name
+
+    @property
+    def size_hint(self) -> Optional[int]:
+        # ISIZE — розмір розпакованих даних у останніх 4 байтах (mod 2^32)
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(-4, os.SEEK_END)
+                return struct.unpack("<I", f.read(4))[0]
+        except OSError:
+            return None
+
+    @property
+    def digest(self) -> str:
+        return file_sha256(self.path)
+
+    def open(self) -> BinaryIO:
+        return gzip.open(self.path, "rb")
+
+
+class FtpSource:
+    """Файл на FTP постачальника (.csv або .gz), що читається прямо з потоку передачі."""
+
+    def __init__(self, supplier: str, remote_path: str, cache_path: Optional[Path] = None):
+        self.supplier = supplier
+        self.remote_path = remote_path
+        self.name = Path(remote_path).name
+        self.cache_path = cache_path
+        self._pipe: Optional[_FtpPipe] = None
+        self._stat: Optional[Tuple[Optional[int], Optional[str]]] = None  # (SIZE, MDTM)
+
+    def _connect(self) -> Tuple[ftplib.FTP, str]:
+        prefix, host, user, pwd = ftp_credentials(self.supplier)
+        print(f"[INFO] Connecting to FTP for {prefix} ({host})...")
+
+        # 1) Спроба через Explicit TLS (FTPS), 2) якщо TLS не доступний — звичайний FTP
+        try:
+            return ftp_login(host, user, pwd, tls=True), "FTPS"
+        except ftplib.all_errors as e_tls:
+            try:
+                print(f"[WARN] FTPS failed for {prefix}, trying plain FTP...")
+                return ftp_login(host, user, pwd, tls=False), "FTP"
+            except ftplib.all_errors as e_plain:
+                raise RuntimeError(f"FTP/FTPS failed for {prefix}. TLS Error: {e_tls}; Plain Error: {e_plain}")
+
+    def stat(self) -> Tuple[Optional[int], Optional[str]]:
+        """(SIZE, MDTM) файлу на сервері — без передачі, один раз на джерело. None — сервер не підтримує."""
+        if self._stat is not None:
+            return self._stat
+        size = mdtm = None
+        try:
+            ftp, _ = self._connect()
+            try:
+                ftp.voidcmd("TYPE I")  # SIZE у ASCII-режимі багато серверів не віддають
+                try:
+                    size = ftp.size(self.remote_path)
+                except ftplib.error_perm:
+                    pass
+                try:
+                    mdtm = ftp.voidcmd(f"MDTM {self.remote_path}").split()[-1]
+                except ftplib.error_perm:
+                    pass
+            finally:
+                try:
+                    ftp.quit()
+                except ftplib.all_errors:
+                    ftp.close()
+        except (RuntimeError, *ftplib.all_errors) as e:
+            print(f"[WARN] FTP SIZE/MDTM failed for {self.remote_path}: {e}")
+        self._stat = (size, mdtm)
+        return self._stat
+
+    @property
+    def identity(self) -> Optional[str]:
+        """Шлях + SIZE + MDTM: змінюється разом із файлом, відомий до передачі. None — без MDTM/SIZE."""
+        size, mdtm = self.stat()
+        if size is None or mdtm is None:
+            return None
+        return f"ftp:{self.remote_path}:{size}:{mdtm}"
+
+    @property
+    def size_hint(self) -> Optional[int]:
+        """Розмір розпакованих даних: SIZE (для .gz — оцінка через FTP_GZ_SIZE_RATIO)."""
+        size, _ = self.stat()
+        if size is None:
+            return None
+        return int(size * FTP_GZ_SIZE_RATIO) if _is_gz(self.remote_path) else size
+
+    @property
+    def digest(self) -> Optional[str]:
+        """
+        Ідентичність для маніфесту/снапшота: SIZE + MDTM (відома одразу). Якщо сервер їх не віддає —
+        sha256 сирих байтів, відомий лише після того, як передачу дочитано.
+        """
+        return self.identity or (self._pipe.digest if self._pipe else None)
+
+    def open(self) -> BinaryIO:
+        ftp, label = self._connect()
+        self._pipe = _FtpPipe(ftp, self.remote_path, label, self.cache_path)
+        stream = io.BufferedReader(self._pipe, buffer_size=FTP_BLOCK_SIZE)
+        return _GzipStream(stream) if _is_gz(self.remote_path) else stream
+
+
+# ----------------------- Helpers для парсера -----------------------
+
+def open_binary(src: RawInput) -> BinaryIO:
+    if isinstance(src, (str, Path)):
+        return open(src, "rb")
+    return src.open()
+
+
+def open_text(src: RawInput, encoding: str = "cp1250") -> TextIO:
+    """Текстовий потік з errors='replace' (cp1250 для польських прайсів)."""
+    if isinstance(src, (str, Path)):
+        return open(src, "r", encoding=encoding, errors="replace")
+    return io.TextIOWrapper(src.open(), encoding=encoding, errors="replace")
+
+
+def input_size(src: RawInput) -> Optional[int]:
+    """Розмір сирих (розпакованих) даних у байтах, None — невідомо."""
+    if isinstance(src, (str, Path)):
+        return Path(src).stat().st_size
+    return src.size_hint
+
+
+def input_digest(src: RawInput) -> Optional[str]:
+    """
+    sha256 сирого файлу (для .gz — стиснутих байтів), для FTP — SIZE + MDTM.
+    None — FTP-сервер не віддав SIZE/MDTM, а потік ще не дочитаний.
+    """
+    if isinstance(src, (str, Path)):
+        return file_sha256(Path(src))
+    return src.digest
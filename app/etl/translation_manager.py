@@ -1,33 +1,42 @@
-from app.services.translator import translate_products
-
-
-def process_price_translation(df, supplier_id, limit=1000):
-    """Готує дані та запускає переклад."""
-
-    # --- ЗМІНА 1: Справжнє обмеження ---
-    # Ми беремо тільки верхівку (head), щоб не мучити Google
-    if limit:
-        df_to_work = df.head(limit).copy()
-    else:
-        df_to_work = df.copy()
-
-    # --- ЗМІНА 2: Робота тільки з обмеженим списком ---
-    raw_list = df_to_work[['code', 'name', 'unicode']].to_dict('records')
-
-    # 2. Отримуємо переклади (Cache -> Dict -> Google)
-    translations = translate_products(raw_list, supplier_id)
-
-    # 3. Функція-помічник для підстановки
-    def get_uk_name(row):
-        key = (str(row['code']), str(row['name']).strip().upper())
-        return translations.get(key, row['name'])
-
-    # --- ЗМІНА 3: Оновлення тільки потрібної частини ---
-    if limit:
-        # Оновлюємо тільки перші N рядків у колонці 'name'
-        df.loc[:limit - 1, 'name'] = df_to_work.apply(get_uk_name, axis=1)
-    else:
-        # Оновлюємо весь стовпчик
-        df['name'] = df.apply(get_uk_name, axis=1)
-
-    return df
\ No newline at end of file
+import numpy as np
+import pandas as pd
+
+from app.services.translator import translate_names, code_overrides, normalize_name
+
+
+def process_price_translation(df, supplier_id):
+    """
+    Готує дані та запускає переклад. Google тут не викликається: назви без перекладу
+    йдуть у фонову чергу (translation_worker.py) і лишаються як є до наступного імпорту.
+    """
+
+    # 1. Перекладаємо лише унікальні назви:
+    # тисячі кодів мають ту саму назву ("KLOCKI HAMULCOWE") — кожна назва перекладається раз
+    name_idx, uniques = pd.factorize(df['name'])
+    unique_names = [str(n) for n in uniques]
+
+    # 2. Отримуємо переклади (Dict -> пам'ять назв; решта — в чергу)
+    translations = translate_names(unique_names, supplier_id)
+
+    # 3. Переклад назви -> на всі її рядки (без перекладу — лишається як було)
+    by_name = np.array([uk if uk else n for n, uk in zip(uniques, translations)] + [None], dtype=object)
+    values = by_name[name_idx]  # NaN у назві -> індекс -1 -> None
+    missing = name_idx < 0
+    if missing.any():
+        values[missing] = df['name'].to_numpy()[missing]
+
+    # 4. Винятки: коди, для яких у кеші свій переклад
+    overrides = code_overrides(supplier_id, unique_names, translations)
+    if overrides:
+        override_names = {pl for _, pl in overrides}
+        normalized = [normalize_name(n) for n in unique_names]
+        affected = [i for i, pl in enumerate(normalized) if pl in override_names]
+        codes = df['code'].astype(str).to_numpy()
+        for row in np.flatnonzero(np.isin(name_idx, affected)):
+            uk = overrides.get((codes[row], normalized[name_idx[row]]))
+            if uk:
+                values[row] = uk
+
+    df['name'] = pd.Series(values, index=df.index, dtype=object)
+
+    return df
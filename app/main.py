@@ -2,10 +2,18 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 
 # --- ІМПОРТ РОУТЕРІВ ---
 from app.api.routers import search, prices, rate, cart, nova_poshta
+from app.services.catalog_indexes import bootstrap_catalog_search
+from app.services.code_index import init_code_index, refresh_code_index
+from app.services.search_cache import start_generation_watch
+from app.database import async_engine
+from app.services.import_jobs import import_jobs
+from app.etl.profile_pool import shutdown_profile_pool
+from app.services.translator import worker as translation_worker
 
 load_dotenv()
 
@@ -13,7 +21,29 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("[STARTUP] Checking database and tables...")
+    # Індекси пошуку (pg_trgm + text_pattern_ops) — фоном: перша побудова на великому каталозі
+    # триває хвилини, API тим часом уже відповідає (пошук працює, просто повільніше)
+    index_task = asyncio.create_task(asyncio.to_thread(bootstrap_catalog_search))
+    # In-memory індекс кодів (опційно, SEARCH_CODE_INDEX=1)
+    await asyncio.to_thread(init_code_index)
+    # Імпорти в інших процесах (воркери uvicorn, CLI) -> кеш пошуку та індекс кодів цього процесу
+    generation_watch = start_generation_watch(refresh_code_index)
+    # Фоновий переклад нових назв (черга спільна з CLI-імпортами, див. translation_worker.py)
+    translation_worker.start()
     yield
+    if generation_watch is not None:
+        generation_watch.set()
+    if not index_task.done():
+        # Перерваний CONCURRENTLY лишить INVALID-індекс — його перебудує наступний старт
+        print("[SHUTDOWN] Catalog index bootstrap did not finish, it will be resumed on next start")
+    # Черга імпорту: нові задачі не стартують, поточні доробляються у своїх потоках
+    import_jobs.shutdown()
+    # Пачки, що вже в Google, дописуються; решта назв лишається в черзі до наступного старту
+    await asyncio.to_thread(translation_worker.stop)
+    # Процеси пулу профілів (живуть між імпортами)
+    await asyncio.to_thread(shutdown_profile_pool)
+    # Закриваємо пул async-з'єднань (asyncpg)
+    await async_engine.dispose()
 
 
 app = FastAPI(title="Maxgear API", lifespan=lifespan)
@@ -32,6 +62,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Фронт читає cursor наступної сторінки пошуку з заголовка
+    expose_headers=["X-Next-Cursor", "X-Search-Cache", "X-Total-Search-Ms"],
 )
 
 # --- ПІДКЛЮЧЕННЯ РОУТЕРІВ ---
@@ -0,0 +1,176 @@
+import os
+import json
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import text
+
+from app.database import engine, TABLE_CATALOG
+
+# ===========================================
+# ІНДЕКСИ КАТАЛОГУ ДЛЯ ПОШУКУ
+# ===========================================
+# text_pattern_ops  -> B-tree, який Postgres використовує для LIKE 'X%'
+#                      (незалежно від collation бази).
+# gin_trgm_ops      -> GIN по триграмах (pg_trgm), страховка для коротких
+#                      префіксів і майбутнього пошуку по підрядку.
+
+CATALOG_INDEX_BOOTSTRAP = os.getenv("CATALOG_INDEX_BOOTSTRAP", "1") == "1"
+SEARCH_COLUMNS = ("unicode_norm", "code_norm", "brand_norm")
+
+CATALOG_INDEXES: List[Dict[str, str]] = [
+    *[
+        {
+            "name": f"idx_{TABLE_CATALOG}_{col}_pattern",
+            "ddl": f"ON {TABLE_CATALOG} ({col} text_pattern_ops)",
+        }
+        for col in SEARCH_COLUMNS
+    ],
+    *[
+        {
+            "name": f"idx_{TABLE_CATALOG}_{col}_trgm",
+            "ddl": f"ON {TABLE_CATALOG} USING gin ({col} gin_trgm_ops)",
+            "requires": "pg_trgm",
+        }
+        for col in SEARCH_COLUMNS
+    ],
+]
+
+# Пробні запити для кожної гілки пошуку (перевірка, що план іде по індексу)
+BRANCH_PROBES: Dict[str, str] = {
+    col: f"SELECT id FROM {TABLE_CATALOG} WHERE {col} LIKE :p"
+    for col in SEARCH_COLUMNS
+}
+
+
+def _index_state(conn) -> Dict[str, bool]:
+    """Повертає {ім'я індексу: indisvalid} для всіх індексів таблиці каталогу."""
+    rows = conn.execute(text("""
+        SELECT c.relname AS name, i.indisvalid AS valid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relname = :table
+    """), {"table": TABLE_CATALOG})
+    return {row.name: bool(row.valid) for row in rows}
+
+
+def ensure_catalog_indexes() -> Dict[str, str]:
+    """
+    Bootstrap/міграція індексів пошуку (фоном після старту API або окремо: python -m app.services.catalog_indexes).
+    - вмикає розширення pg_trgm;
+    - створює відсутні індекси через CREATE INDEX CONCURRENTLY (без блокування таблиці);
+    - перестворює індекси, які лишились INVALID після невдалого CONCURRENTLY.
+    Повертає {ім'я індексу: статус}.
+    """
+    report: Dict[str, str] = {}
+
+    # CONCURRENTLY не працює всередині транзакції -> AUTOCOMMIT
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            has_trgm = True
+        except Exception as e:
+            print(f"[WARN] pg_trgm is not available, trigram indexes skipped: {str(e).splitlines()[0]}")
+            has_trgm = False
+
+        state = _index_state(conn)
+
+        for idx in CATALOG_INDEXES:
+            name = idx["name"]
+            if idx.get("requires") == "pg_trgm" and not has_trgm:
+                report[name] = "skipped"
+                continue
+            if state.get(name) is True:
+                report[name] = "ok"
+                continue
+
+            if name in state:
+                print(f"[WARN] Index {name} is INVALID, rebuilding...")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                report[name] = "rebuilt"
+            else:
+                print(f"[INFO] Creating index {name}...")
+                report[name] = "created"
+
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {idx['ddl']}"))
+
+        # Статистика потрібна лише після нових індексів (решту часу її веде autovacuum)
+        if any(status in ("created", "rebuilt") for status in report.values()):
+            conn.execute(text(f"ANALYZE {TABLE_CATALOG}"))
+
+        # Фінальна перевірка
+        state = _index_state(conn)
+        for idx in CATALOG_INDEXES:
+            if report[idx["name"]] != "skipped" and state.get(idx["name"]) is not True:
+                report[idx["name"]] = "missing"
+
+    return report
+
+
+# ----------------------- Seq Scan check -----------------------
+
+def _walk_plan(node: Dict[str, Any], found: List[str]) -> None:
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") == TABLE_CATALOG:
+        found.append(node.get("Alias") or TABLE_CATALOG)
+    for child in node.get("Plans", []) or []:
+        _walk_plan(child, found)
+
+
+def find_seq_scans(conn, sql, params: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Робить EXPLAIN (без виконання) і повертає список Seq Scan по таблиці каталогу.
+    Порожній список -> всі гілки запиту йдуть по індексах.
+    """
+    sql_str = sql.text if hasattr(sql, "text") else str(sql)
+    res = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql_str}"), params or {}).scalar()
+    plan = json.loads(res) if isinstance(res, str) else res
+
+    found: List[str] = []
+    for item in plan or []:
+        _walk_plan(item.get("Plan", {}), found)
+    return found
+
+
+def report_seq_scans(conn, label: str, sql, params: Optional[Dict[str, Any]] = None) -> bool:
+    """Логує попередження, якщо гілка запиту впала в послідовне сканування. Повертає True, якщо все ок."""
+    try:
+        scans = find_seq_scans(conn, sql, params)
+    except Exception as e:
+        print(f"[WARN] EXPLAIN check failed for '{label}': {e}")
+        return False
+
+    if scans:
+        print(f"[WARN] Search branch '{label}' falls back to Seq Scan on {TABLE_CATALOG} ({len(scans)}x)")
+        return False
+    return True
+
+
+def check_search_branches(probe: str = "AB") -> Dict[str, bool]:
+    """Перевіряє план кожної гілки пошуку на пробному префіксі."""
+    with engine.connect() as conn:
+        return {
+            col: report_seq_scans(conn, col, sql, {"p": f"{probe}%"})
+            for col, sql in BRANCH_PROBES.items()
+        }
+
+
+def bootstrap_catalog_search() -> None:
+    """Точка входу для lifespan (фонова задача): індекси + перевірка планів. Ніколи не валить API."""
+    if not CATALOG_INDEX_BOOTSTRAP:
+        print("[INFO] Catalog index bootstrap disabled (CATALOG_INDEX_BOOTSTRAP=0)")
+        return
+    try:
+        report = ensure_catalog_indexes()
+        changed = {k: v for k, v in report.items() if v != "ok"}
+        print(f"[INFO] Catalog indexes ready: {len(report) - len(changed)} ok, changes: {changed or 'none'}")
+
+        checks = check_search_branches()
+        bad = [col for col, ok in checks.items() if not ok]
+        if bad:
+            print(f"[WARN] Seq Scan detected for branches: {bad}")
+    except Exception as e:
+        print(f"[ERROR] Catalog index bootstrap failed: {e}")
+
+
+if __name__ == "__main__":
+    bootstrap_catalog_search()
@@ -1,8 +1,49 @@
 import os
+import time
 
 import requests
 from dotenv import load_dotenv
 
+from app.services.local_db import NOT_UNTRANSLATED
+
+# Ліміт D1: не більше 100 параметрів (?) на один SQL-запит
+D1_MAX_PARAMS = 100
+# Скільки запитів відправляти в одному HTTP-виклику batch (виконуються як одна транзакція)
+D1_BATCH_STATEMENTS = int(os.getenv("D1_BATCH_STATEMENTS", "10"))
+D1_TIMEOUT = int(os.getenv("D1_TIMEOUT", "60"))
+
+_UPSERT_HEAD = "INSERT INTO dict (supplier_id, code, unicode, pl_text, uk_text) VALUES "
+_UPSERT_TAIL = " ON CONFLICT(supplier_id, code, pl_text) DO UPDATE SET uk_text = excluded.uk_text"
+
+# Пам'ять перекладів за назвою: одна польська назва -> один переклад для всіх кодів
+_NAMES_SCHEMA = "CREATE TABLE IF NOT EXISTS names (pl_text TEXT PRIMARY KEY, uk_text TEXT)"
+_NAMES_UPSERT_HEAD = "INSERT INTO names (pl_text, uk_text) VALUES "
+_NAMES_UPSERT_TAIL = " ON CONFLICT(pl_text) DO UPDATE SET uk_text = excluded.uk_text"
+
+# Черга перекладу в D1 — лише коли локальної бази немає (TRANSLATION_LOCAL_DB=0), схема як у local_db.py
+_BACKLOG_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS backlog (pl_text TEXT NOT NULL, supplier_id INTEGER NOT NULL, "
+    "enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL DEFAULT 0, "
+    "last_error TEXT, PRIMARY KEY (pl_text, supplier_id))"
+)
+# Версія перекладів постачальника (як sync_state memory_version:<id> у local_db.py)
+_VERSIONS_SCHEMA = "CREATE TABLE IF NOT EXISTS backlog_versions (supplier_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+_VERSION_BUMP = (
+    "INSERT INTO backlog_versions (supplier_id, version) VALUES (?, 1) "
+    "ON CONFLICT(supplier_id) DO UPDATE SET version = version + 1"
+)
+
+# Колонки, які синхронізуються в локальну копію
+_SYNC_COLUMNS = {
+    "dict": "supplier_id, code, unicode, pl_text, uk_text",
+    "names": "pl_text, uk_text",
+}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 
 class CloudflareD1Manager:
     def __init__(self):
@@ -23,17 +64,36 @@ class CloudflareD1Manager:
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json"
         }
+        # Одна сесія на менеджер: keep-alive замість нового TLS-з'єднання на кожен запит
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self._names_ready = False
 
-    def execute(self, sql, params=None):
-        """Виконує один SQL запит"""
-        payload = {"sql": sql, "params": params or []}
+    def _post(self, payload):
         try:
-            response = requests.post(self.url, headers=self.headers, json=payload)
+            response = self.session.post(self.url, json=payload, timeout=D1_TIMEOUT)
             return response.json()
         except Exception as e:
             print(f"❌ Помилка Cloudflare: {e}")
             return None
 
+    def execute(self, sql, params=None):
+        """Виконує один SQL запит"""
+        return self._post({"sql": sql, "params": params or []})
+
+    def execute_batch(self, statements):
+        """
+        Виконує список (sql, params) одним HTTP-викликом (D1 batch, одна транзакція).
+        Повертає список результатів по запитах або None при помилці.
+        """
+        if not statements:
+            return []
+        res = self._post({"batch": [{"sql": sql, "params": params} for sql, params in statements]})
+        if not res or not res.get('success'):
+            print(f"❌ Помилка Cloudflare batch: {(res or {}).get('errors')}")
+            return None
+        return res['result']
+
     def get_cached_translation(self, supplier_id, code, pl_text):
         """Шукає переклад у хмарі"""
         sql = "SELECT uk_text FROM dict WHERE supplier_id = ? AND code = ? AND pl_text = ? LIMIT 1"
@@ -43,12 +103,217 @@ class CloudflareD1Manager:
             return res['result'][0]['results'][0]['uk_text']
         return None
 
+    def _select_in(self, sql, fixed_params, keys, placeholder):
+        """
+        SELECT з великим списком ключів: sql містить {values}, кожен ключ — placeholder ("?" / "(?, ?)").
+        Ключів у запиті стільки, щоб не перевищити D1_MAX_PARAMS; запити — пакетами по D1_BATCH_STATEMENTS.
+        """
+        width = placeholder.count("?")
+        per_stmt = (D1_MAX_PARAMS - len(fixed_params)) // width
+
+        statements = []
+        for part in _chunks(keys, per_stmt):
+            params = list(fixed_params)
+            for key in part:
+                params += list(key) if width > 1 else [key]
+            statements.append((sql.format(values=", ".join([placeholder] * len(part))), params))
+
+        rows = []
+        for batch in _chunks(statements, D1_BATCH_STATEMENTS):
+            results = self.execute_batch(batch)
+            if results is None:
+                continue  # чого не знайшли — вважаємо промахом кешу
+            for r in results:
+                rows.extend(r.get('results') or [])
+        return rows
+
+    def get_cached_rows(self, supplier_id, keys):
+        """Пакетний пошук: keys — [(code, pl_text), ...] -> {(code, PL_TEXT): рядок dict з D1}."""
+        keys = list(dict.fromkeys((str(code), str(pl).upper()) for code, pl in keys))
+        rows = self._select_in(
+            "SELECT code, unicode, pl_text, uk_text FROM dict "
+            "WHERE supplier_id = ? AND (code, pl_text) IN (VALUES {values})",
+            [supplier_id], keys, "(?, ?)",
+        )
+        return {(str(row['code']), row['pl_text']): row for row in rows}
+
+    def get_cached_translations(self, supplier_id, keys):
+        """Як get_cached_translation, але пакетно: {(code, PL_TEXT): uk_text}."""
+        return {key: row['uk_text'] for key, row in self.get_cached_rows(supplier_id, keys).items()}
+
     def save_to_cache(self, supplier_id, code, unicode_val, pl_text, uk_text):
         """Зберігає або оновлює переклад у хмарі"""
         sql = """
-        INSERT INTO dict (supplier_id, code, unicode, pl_text, uk_text) 
+        INSERT INTO dict (supplier_id, code, unicode, pl_text, uk_text)
         VALUES (?, ?, ?, ?, ?)
         ON CONFLICT(supplier_id, code, pl_text) DO UPDATE SET uk_text = excluded.uk_text
         """
         params = [supplier_id, code, str(unicode_val), pl_text.upper(), uk_text]
-        return self.execute(sql, params)
\ No newline at end of file
+        return self.execute(sql, params)
+
+    def save_many_to_cache(self, rows):
+        """
+        Пакетний UPSERT: rows — [(supplier_id, code, unicode, pl_text, uk_text), ...].
+        Багаторядкові INSERT по D1_MAX_PARAMS // 5 рядків, до D1_BATCH_STATEMENTS на HTTP-виклик.
+        Повертає кількість рядків у батчах, які D1 прийняв.
+        """
+        # Один рядок на ключ — як при послідовних save_to_cache: ON CONFLICT оновлює лише uk_text
+        unique = {}
+        for supplier_id, code, unicode_val, pl_text, uk_text in rows:
+            key = (supplier_id, str(code), str(pl_text).upper())
+            if key in unique:
+                unique[key][4] = uk_text
+            else:
+                unique[key] = [supplier_id, str(code), str(unicode_val), key[2], uk_text]
+
+        return self._upsert_many(_UPSERT_HEAD, _UPSERT_TAIL, list(unique.values()))
+
+    def _upsert_many(self, head, tail, rows):
+        """Багаторядкові INSERT ... ON CONFLICT; повертає кількість рядків у прийнятих батчах."""
+        width = len(rows[0]) if rows else 1
+        placeholder = "(" + ", ".join(["?"] * width) + ")"
+        statements = []
+        for part in _chunks(rows, D1_MAX_PARAMS // width):
+            sql = head + ", ".join([placeholder] * len(part)) + tail
+            statements.append((sql, [v for row in part for v in row]))
+
+        saved = 0
+        for batch in _chunks(statements, D1_BATCH_STATEMENTS):
+            if self.execute_batch(batch) is not None:
+                saved += sum(len(params) // width for _, params in batch)
+        return saved
+
+    def get_rows_after(self, after_rowid, limit=1000, table="dict"):
+        """Сторінка таблиці за rowid (для синхронізації локальної копії) або None при помилці."""
+        columns = _SYNC_COLUMNS[table]
+        if table == "names":
+            self._ensure_names()
+        sql = f"SELECT rowid AS rid, {columns} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?"
+        res = self.execute(sql, [after_rowid, limit])
+        if res and res.get('success'):
+            return res['result'][0]['results']
+        print(f"❌ Помилка Cloudflare: {(res or {}).get('errors')}")
+        return None
+
+    # ----------- пам'ять перекладів за назвою (таблиця names) -------------
+    def _ensure_names(self):
+        """Таблиця names створюється при першому зверненні (один раз на менеджер)."""
+        if not self._names_ready:
+            res = self.execute(_NAMES_SCHEMA)
+            self._names_ready = bool(res and res.get('success'))
+
+    def get_names(self, pl_texts):
+        """{PL_TEXT: uk_text} з таблиці names."""
+        self._ensure_names()
+        rows = self._select_in("SELECT pl_text, uk_text FROM names WHERE pl_text IN ({values})",
+                               [], list(pl_texts), "?")
+        return {row['pl_text']: row['uk_text'] for row in rows if row['uk_text']}
+
+    def names_from_dict(self, pl_texts):
+        """Переклади назв, яких ще немає в names, з пер-кодової таблиці dict (останній запис на назву)."""
+        rows = self._select_in(
+            "SELECT pl_text, uk_text FROM dict WHERE rowid IN ("
+            "SELECT MAX(rowid) FROM dict WHERE pl_text IN ({values}) AND uk_text IS NOT NULL AND uk_text != '' "
+            f"AND {NOT_UNTRANSLATED} GROUP BY pl_text)",
+            [], list(pl_texts), "?",
+        )
+        return {row['pl_text']: row['uk_text'] for row in rows}
+
+    def save_names(self, items):
+        """UPSERT [(pl_text, uk_text), ...] у names. Повертає кількість прийнятих рядків."""
+        self._ensure_names()
+        unique = {str(pl).upper(): uk for pl, uk in items}
+        return self._upsert_many(_NAMES_UPSERT_HEAD, _NAMES_UPSERT_TAIL, list(unique.items()))
+
+    def get_overrides(self, supplier_id, pl_texts):
+        """Пер-кодові переклади для цих назв: [(code, PL_TEXT, uk_text), ...]."""
+        rows = self._select_in(
+            f"SELECT code, pl_text, uk_text FROM dict WHERE supplier_id = ? AND pl_text IN ({{values}}) "
+            f"AND {NOT_UNTRANSLATED}",
+            [supplier_id], list(pl_texts), "?",
+        )
+        return [(str(row['code']), row['pl_text'], row['uk_text']) for row in rows]
+
+
+class D1Backlog:
+    """Черга назв без перекладу в D1 — той самий інтерфейс, що й backlog у LocalTranslationDB."""
+
+    def __init__(self, d1: CloudflareD1Manager):
+        self.d1 = d1
+        self._ready = False
+
+    def _execute(self, sql, params=None):
+        if not self._ready:
+            self._ready = self.d1.execute_batch([(_BACKLOG_SCHEMA, []), (_VERSIONS_SCHEMA, [])]) is not None
+        res = self.d1.execute(sql, params)
+        if not res or not res.get('success'):
+            raise RuntimeError(f"D1 backlog query failed: {(res or {}).get('errors')}")
+        return res['result'][0]
+
+    def _in_chunks(self, sql, fixed_params, pl_texts):
+        """sql з {values}; назв у запиті — не більше D1_MAX_PARAMS. Повертає кількість змінених рядків."""
+        changed = 0
+        for part in _chunks(list(pl_texts), D1_MAX_PARAMS - len(fixed_params)):
+            result = self._execute(sql.format(values=", ".join(["?"] * len(part))), list(fixed_params) + part)
+            changed += (result.get('meta') or {}).get('changes') or 0
+        return changed
+
+    def enqueue(self, supplier_id, pl_texts):
+        """Додає назви в чергу (вже наявні не чіпає). Повертає кількість нових."""
+        now = time.time()
+        rows = [(str(pl).upper(), supplier_id, now) for pl in pl_texts]
+        added = 0
+        for part in _chunks(rows, D1_MAX_PARAMS // 3):
+            sql = ("INSERT OR IGNORE INTO backlog (pl_text, supplier_id, enqueued_at) VALUES "
+                   + ", ".join(["(?, ?, ?)"] * len(part)))
+            result = self._execute(sql, [v for row in part for v in row])
+            added += (result.get('meta') or {}).get('changes') or 0
+        return added
+
+    def due_names(self, limit, exclude=()):
+        exclude = set(exclude)
+        result = self._execute(
+            "SELECT pl_text FROM backlog WHERE next_attempt_at <= ? "
+            "GROUP BY pl_text ORDER BY MIN(enqueued_at) LIMIT ?",
+            [time.time(), limit + len(exclude)],
+        )
+        return [row['pl_text'] for row in result['results'] if row['pl_text'] not in exclude][:limit]
+
+    def dequeue(self, pl_texts):
+        """Назви перекладено: знімаються з черги, постачальники, що їх чекали, отримують нову версію."""
+        pl_texts = list(pl_texts)
+        suppliers = set()
+        for part in _chunks(pl_texts, D1_MAX_PARAMS):
+            result = self._execute(
+                f"SELECT DISTINCT supplier_id FROM backlog WHERE pl_text IN ({', '.join(['?'] * len(part))})", part
+            )
+            suppliers.update(row['supplier_id'] for row in result['results'])
+        self._in_chunks("DELETE FROM backlog WHERE pl_text IN ({values})", [], pl_texts)
+        if suppliers and self.d1.execute_batch([(_VERSION_BUMP, [s]) for s in sorted(suppliers)]) is None:
+            raise RuntimeError("D1 backlog version bump failed")
+
+    def memory_version(self, supplier_id):
+        """Версія перекладів постачальника або None, якщо D1 недоступний."""
+        try:
+            rows = self._execute("SELECT version FROM backlog_versions WHERE supplier_id = ?", [supplier_id])['results']
+        except RuntimeError as e:
+            print(f"[WARN] Translation version unavailable: {e}")
+            return None
+        return rows[0]['version'] if rows else 0
+
+    def retry_later(self, pl_texts, error, base_sec, max_sec):
+        self._in_chunks(
+            "UPDATE backlog SET attempts = attempts + 1, last_error = ?, "
+            "next_attempt_at = ? + MIN(?, ? * (1 << MIN(attempts, 30))) WHERE pl_text IN ({values})",
+            [error[:500], time.time(), max_sec, base_sec], pl_texts,
+        )
+
+    def pending_count(self, supplier_id=None):
+        if supplier_id is None:
+            result = self._execute("SELECT COUNT(DISTINCT pl_text) AS n FROM backlog")
+        else:
+            result = self._execute("SELECT COUNT(*) AS n FROM backlog WHERE supplier_id = ?", [supplier_id])
+        return result['results'][0]['n']
+
+    def next_due_at(self):
+        return self._execute("SELECT MIN(next_attempt_at) AS due FROM backlog")['results'][0]['due']
@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from app.database import engine, TABLE_CATALOG
+
+# ===========================================
+# IN-MEMORY ІНДЕКС КОДІВ (для пошуку одним словом)
+# ===========================================
+# Відсортовані NumPy масиви ключів (bytes) + паралельні масиви id.
+# Префіксний пошук — бінарний (np.searchsorted), Postgres потрібен лише для
+# гідрації максимум `limit` рядків по первинному ключу.
+
+SEARCH_CODE_INDEX = os.getenv("SEARCH_CODE_INDEX", "0") == "1"
+BUILD_CHUNK_ROWS = 200_000
+NULL_PRICE_SORT = 999_999_999_999  # ціна для сортування позицій без ціни (і в SQL пошуку)
+
+
+def _sorted_keys(keys: np.ndarray, ids: np.ndarray):
+    order = np.argsort(keys, kind="stable")
+    return keys[order], ids[order]
+
+
+def _prefix_range(keys: np.ndarray, prefix: bytes):
+    """[lo, hi) ключів, що починаються з prefix (ключі — тільки A-Z0-9, тому \\xff — верхня межа)."""
+    lo = int(np.searchsorted(keys, prefix, side="left"))
+    hi = int(np.searchsorted(keys, prefix + b"\xff", side="left"))
+    return lo, hi
+
+
+def _exact_range(keys: np.ndarray, key: bytes):
+    return int(np.searchsorted(keys, key, side="left")), int(np.searchsorted(keys, key, side="right"))
+
+
+class CodeIndex:
+    """Незмінний знімок індексу. Перебудова створює новий об'єкт і атомарно підміняє посилання."""
+
+    def __init__(
+            self,
+            ids: np.ndarray,
+            code_norm: np.ndarray,
+            unicode_norm: np.ndarray,
+            brand_norm: np.ndarray,
+            in_stock: np.ndarray,
+            price: np.ndarray,
+    ):
+        # Атрибути для ранжування, відсортовані по id
+        order = np.argsort(ids, kind="stable")
+        self.row_ids = ids[order]
+        self.in_stock = in_stock[order]
+        # NULL ціна -> той самий sentinel, що й у SQL пошуку: NaN випадав би з seek
+        self.price = np.nan_to_num(price[order], nan=NULL_PRICE_SORT)
+
+        # code_norm + unicode_norm -> один масив ключів (без дублів, коли вони однакові)
+        same = code_norm == unicode_norm
+        self.code_keys, self.code_ids = _sorted_keys(
+            np.concatenate([code_norm, unicode_norm[~same]]),
+            np.concatenate([ids, ids[~same]]),
+        )
+        self.brand_keys, self.brand_ids = _sorted_keys(brand_norm, ids.copy())
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (
+            self.row_ids, self.in_stock, self.price,
+            self.code_keys, self.code_ids, self.brand_keys, self.brand_ids,
+        ))
+
+    def search(self, q_clean: str, limit: int, offset: int = 0, after: Optional[tuple] = None) -> List[int]:
+        """
+        Той самий порядок, що й у SQL сценарію Б:
+        (stock > 0) DESC, точний збіг коду DESC, COALESCE(price_eur, sentinel) ASC, id ASC.
+        after — (in_stock, exact_match, price, id) останнього рядка попередньої сторінки (keyset).
+        """
+        key = q_clean.encode("ascii", "ignore")
+        c_lo, c_hi = _prefix_range(self.code_keys, key)
+        b_lo, b_hi = _prefix_range(self.brand_keys, key)
+        if c_lo == c_hi and b_lo == b_hi:
+            return []
+
+        candidates = np.unique(np.concatenate([self.code_ids[c_lo:c_hi], self.brand_ids[b_lo:b_hi]]))
+        e_lo, e_hi = _exact_range(self.code_keys, key)
+        exact = np.isin(candidates, self.code_ids[e_lo:e_hi])
+
+        pos = np.searchsorted(self.row_ids, candidates)
+        not_stock, not_exact, price = ~self.in_stock[pos], ~exact, self.price[pos]
+
+        if after is not None:
+            # Кортежне порівняння (NOT in_stock, NOT exact, price, id) > cursor, як у SQL
+            c0, c1, c2, c3 = (not after[0]), (not after[1]), float(after[2]), int(after[3])
+            mask = (not_stock > c0) | ((not_stock == c0) & (
+                (not_exact > c1) | ((not_exact == c1) & (
+                    (price > c2) | ((price == c2) & (candidates > c3))
+                ))
+            ))
+            candidates, not_stock, not_exact, price = candidates[mask], not_stock[mask], not_exact[mask], price[mask]
+
+        order = np.lexsort((candidates, price, not_exact, not_stock))
+        return candidates[order[offset:offset + limit]].tolist()
+
+
+# ----------------------- Build / rebuild -----------------------
+
+_index: Optional[CodeIndex] = None
+_build_lock = threading.Lock()
+
+
+def get_code_index() -> Optional[CodeIndex]:
+    return _index
+
+
+def _load_index() -> CodeIndex:
+    parts = {k: [] for k in ("id", "code_norm", "unicode_norm", "brand_norm", "in_stock", "price")}
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(f"""
+            SELECT id, COALESCE(code_norm, ''), COALESCE(unicode_norm, ''), COALESCE(brand_norm, ''),
+                   COALESCE(stock, 0) > 0, price_eur
+            FROM {TABLE_CATALOG}
+        """))
+        while True:
+            rows = result.fetchmany(BUILD_CHUNK_ROWS)
+            if not rows:
+                break
+            ids, codes, unicodes, brands, stock, price = zip(*rows)
+            parts["id"].append(np.array(ids, dtype=np.int64))
+            parts["code_norm"].append(np.array(codes, dtype=np.bytes_))
+            parts["unicode_norm"].append(np.array(unicodes, dtype=np.bytes_))
+            parts["brand_norm"].append(np.array(brands, dtype=np.bytes_))
+            parts["in_stock"].append(np.array(stock, dtype=bool))
+            parts["price"].append(np.array([np.nan if p is None else float(p) for p in price], dtype=np.float64))
+
+    if not parts["id"]:
+        empty = np.array([], dtype=np.bytes_)
+        return CodeIndex(np.array([], dtype=np.int64), empty, empty, empty,
+                         np.array([], dtype=bool), np.array([], dtype=np.float64))
+
+    return CodeIndex(
+        np.concatenate(parts["id"]),
+        np.concatenate(parts["code_norm"]),
+        np.concatenate(parts["unicode_norm"]),
+        np.concatenate(parts["brand_norm"]),
+        np.concatenate(parts["in_stock"]),
+        np.concatenate(parts["price"]),
+    )
+
+
+def build_code_index() -> Optional[CodeIndex]:
+    """Будує індекс з таблиці каталогу і атомарно підміняє поточний. Пошук під час збірки працює зі старим."""
+    global _index
+    with _build_lock:
+        t0 = time.perf_counter()
+        try:
+            new_index = _load_index()
+        except Exception as e:
+            print(f"[ERROR] Code index build failed: {e}")
+            return _index
+        _index = new_index
+        print(f"[INFO] Code index built: {len(new_index)} rows, "
+              f"{new_index.nbytes / 1024 / 1024:.1f} MB, {time.perf_counter() - t0:.2f}s")
+    return _index
+
+
+def init_code_index() -> None:
+    """Старт API: будуємо індекс, якщо він увімкнений (SEARCH_CODE_INDEX=1)."""
+    if SEARCH_CODE_INDEX:
+        build_code_index()
+
+
+def refresh_code_index() -> None:
+    """
+    Після UPSERT каталогу (у цьому процесі — напряму, з інших — через catalog-generation-watch,
+    див. search_cache.py): перебудовуємо, тільки якщо індекс уже живе в цьому процесі.
+    """
+    if _index is not None:
+        build_code_index()
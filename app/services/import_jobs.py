@@ -0,0 +1,178 @@
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+# ===========================================
+# ЧЕРГА ІМПОРТУ ПРАЙСІВ (фонові задачі)
+# ===========================================
+# POST /api/admin/prices/import лише ставить задачу в чергу і одразу повертає job_id.
+# Пул потоків виконує process_all_prices, а прогрес (етапи + таймінги) видно через
+# GET /api/admin/prices/import/{job_id}.
+# Два імпорти одного постачальника не виконуються одночасно (вони б билися за
+# temp_import / UPSERT тих самих рядків), різні — паралельно. Наступна задача того самого
+# постачальника чекає в його черзі (не займаючи потік пулу) і стартує, коли поточна завершиться.
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+IMPORT_JOBS_KEEP = int(os.getenv("IMPORT_JOBS_KEEP", "100"))
+
+STATUS_QUEUED = "queued"
+STATUS_WAITING = "waiting_lock"
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class ImportJob:
+    def __init__(self, supplier: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.supplier = supplier
+        self.params = params
+        self.status = STATUS_QUEUED
+        self.created_at = _now_iso()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.stages: List[Dict[str, Any]] = []
+        self.results: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[str] = None
+        self._t_start: Optional[float] = None
+        self._t_stage: Optional[float] = None
+        self._elapsed: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # --- progress callback для process_all_prices ---
+    def stage(self, name: str) -> None:
+        """Закриває попередній етап і відкриває новий."""
+        now = time.perf_counter()
+        with self._lock:
+            self._close_stage(now)
+            self.stages.append({"stage": name, "status": STATUS_RUNNING, "started_at": _now_iso(), "seconds": None})
+            self._t_stage = now
+
+    def _close_stage(self, now: float, status: str = STATUS_SUCCESS) -> None:
+        if self.stages and self.stages[-1]["status"] == STATUS_RUNNING:
+            self.stages[-1]["status"] = status
+            self.stages[-1]["seconds"] = round(now - (self._t_stage or now), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = self._elapsed
+            if elapsed is None and self._t_start is not None:
+                elapsed = round(time.perf_counter() - self._t_start, 3)
+            return {
+                "job_id": self.id,
+                "supplier": self.supplier,
+                "status": self.status,
+                "params": self.params,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": elapsed,
+                "current_stage": self.stages[-1]["stage"] if self.status == STATUS_RUNNING and self.stages else None,
+                "stages": [dict(s) for s in self.stages],
+                "results": self.results,
+                "error": self.error,
+            }
+
+
+class ImportJobQueue:
+    def __init__(self, workers: int = IMPORT_WORKERS, keep: int = IMPORT_JOBS_KEEP):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="price-import")
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._running: Set[str] = set()  # постачальники, чий імпорт уже в пулі
+        self._pending: Dict[str, Deque[Tuple[ImportJob, Callable[..., Any]]]] = {}
+        self.keep = keep
+
+    def submit(self, supplier: str, runner: Callable[..., Any], **params) -> ImportJob:
+        """runner(supplier=..., progress=job.stage, **params) виконується в пулі."""
+        job = ImportJob(supplier, params)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            # Тримаємо лише останні N завершених задач
+            while len(self._jobs) > self.keep:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status not in (STATUS_SUCCESS, STATUS_FAILED):
+                    break
+                del self._jobs[oldest_id]
+
+            key = supplier.upper()
+            busy = key in self._running
+            if busy:
+                job.status = STATUS_WAITING
+                self._pending.setdefault(key, deque()).append((job, runner))
+            else:
+                self._running.add(key)
+                self._executor.submit(self._run, job, runner)
+
+        if busy:
+            print(f"[INFO] Import job {job.id}: waiting for running import of {supplier}")
+        else:
+            print(f"[INFO] Import job {job.id} queued for {supplier}")
+        return job
+
+    def _next_for_supplier(self, supplier: str) -> None:
+        """Поточний імпорт постачальника завершився -> у пул іде наступна його задача (якщо є)."""
+        key = supplier.upper()
+        with self._jobs_lock:
+            queue = self._pending.get(key)
+            if not queue:
+                self._pending.pop(key, None)
+                self._running.discard(key)
+                return
+            job, runner = queue.popleft()
+            job.status = STATUS_QUEUED
+        try:
+            self._executor.submit(self._run, job, runner)
+        except RuntimeError:
+            # Черга вже зупинена (shutdown): задача так і не стартує
+            with self._jobs_lock:
+                self._running.discard(key)
+            job.status = STATUS_FAILED
+            job.error = "Import queue was shut down"
+
+    def _run(self, job: ImportJob, runner: Callable[..., Any]) -> None:
+        try:
+            job.status = STATUS_RUNNING
+            job.started_at = _now_iso()
+            job._t_start = time.perf_counter()
+            job.results = runner(supplier=job.supplier, progress=job.stage, **job.params)
+            with job._lock:
+                job._close_stage(time.perf_counter())
+            job.status = STATUS_SUCCESS
+        except Exception as e:
+            with job._lock:
+                job._close_stage(time.perf_counter(), status=STATUS_FAILED)
+            job.error = str(e)
+            job.status = STATUS_FAILED
+            print(f"[ERROR] Import job {job.id} ({job.supplier}) failed: {e}")
+            traceback.print_exc()
+        finally:
+            job._elapsed = round(time.perf_counter() - (job._t_start or time.perf_counter()), 3)
+            job.finished_at = _now_iso()
+            print(f"[INFO] Import job {job.id} ({job.supplier}) finished: {job.status} in {job._elapsed}s")
+            self._next_for_supplier(job.supplier)
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[ImportJob]:
+        with self._jobs_lock:
+            return list(reversed(self._jobs.values()))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Одна черга на процес API
+import_jobs = ImportJobQueue()
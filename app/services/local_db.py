@@ -1,107 +1,378 @@
-# import sqlite3
-# import os
-# from datetime import datetime
-# from app.services.storage import StorageClient  # Переконайся, що шлях до StorageClient вірний
-#
-# # Шляхи до файлів
-# DATA_DB_DIR = os.path.join('data', 'db')
-# DB_PATH = os.path.join(DATA_DB_DIR, 'description_translations.db')
-#
-#
-# def init_local_db():
-#     """Ініціалізує папку data/db та створює таблицю в SQLite."""
-#     if not os.path.exists(DATA_DB_DIR):
-#         os.makedirs(DATA_DB_DIR, exist_ok=True)
-#         print(f"[INFO] Створено директорію для бази: {DATA_DB_DIR}")
-#
-#     conn = sqlite3.connect(DB_PATH)
-#     cursor = conn.cursor()
-#
-#     # Створюємо таблицю з усіма необхідними колонками
-#     cursor.execute('''
-#         CREATE TABLE IF NOT EXISTS dict (
-#             id INTEGER PRIMARY KEY AUTOINCREMENT,
-#             supplier_id INTEGER,
-#             code TEXT,
-#             unicode TEXT,
-#             pl_text TEXT,
-#             uk_text TEXT,
-#             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-#             -- Запобігає дублікатам для одного і того ж товару у постачальника
-#             UNIQUE(supplier_id, code, unicode, pl_text)
-#         )
-#     ''')
-#     conn.commit()
-#     conn.close()
-#     print(f"✅ Локальна база готова: {DB_PATH}")
-#
-#
-# def get_cached_translation(supplier_id: int, code: str, unicode_val: str, pl_text: str):
-#     """Шукає існуючий переклад у локальному SQLite."""
-#     if not pl_text:
-#         return None
-#
-#     pl_text_clean = str(pl_text).strip().upper()
-#     try:
-#         with sqlite3.connect(DB_PATH) as conn:
-#             cursor = conn.cursor()
-#             cursor.execute("""
-#                 SELECT uk_text FROM dict
-#                 WHERE supplier_id = ? AND code = ? AND unicode = ? AND pl_text = ?
-#             """, (supplier_id, str(code), str(unicode_val), pl_text_clean))
-#             res = cursor.fetchone()
-#             return res[0] if res else None
-#     except Exception as e:
-#         print(f"⚠️ Помилка пошуку в SQLite: {e}")
-#         return None
-#
-#
-# def save_to_cache(supplier_id: int, code: str, unicode_val: str, pl_text: str, uk_text: str):
-#     """Зберігає або оновлює переклад у локальній базі."""
-#     if not pl_text or not uk_text:
-#         return
-#
-#     pl_text_clean = str(pl_text).strip().upper()
-#     try:
-#         with sqlite3.connect(DB_PATH) as conn:
-#             cursor = conn.cursor()
-#             cursor.execute("""
-#                 INSERT OR REPLACE INTO dict (supplier_id, code, unicode, pl_text, uk_text)
-#                 VALUES (?, ?, ?, ?, ?)
-#             """, (supplier_id, str(code), str(unicode_val), pl_text_clean, uk_text))
-#             conn.commit()
-#     except Exception as e:
-#         print(f"❌ Помилка запису в SQLite: {e}")
-#
-#
-# def backup_db_to_r2(keep_last: int = 10):
-#     """
-#     Робить бекап локальної бази в Cloudflare R2 через існуючий StorageClient.
-#     Видаляє старі бекапи, залишаючи лише останні N копій.
-#     """
-#     if not os.path.exists(DB_PATH):
-#         print("❌ Файл бази не знайдено. Бекап скасовано.")
-#         return
-#
-#     try:
-#         client = StorageClient()
-#
-#         # Генеруємо ім'я файлу з часом (напр. backups/db/translations_2026_03_04.db)
-#         timestamp = datetime.now().strftime("%Y_%m_%d_%H%M")
-#         cloud_key = f"backups/db/description_translations_{timestamp}.db"
-#
-#         print(f"☁️ Завантажую бекап у Cloudflare R2: {cloud_key}...")
-#
-#         db_url = client.upload_file(
-#             local_path=DB_PATH,
-#             key=cloud_key,
-#             content_type="application/x-sqlite3",
-#             cleanup_prefix="backups/db/",  # Авто-очищення старих баз у цій папці
-#             keep_last=keep_last
-#         )
-#         print(f"✅ Бекап успішно завершено. Файл у хмарі: {cloud_key}")
-#         return db_url
-#
-#     except Exception as e:
-#         print(f"❌ Помилка завантаження бекапу в R2: {e}")
-#         return None
\ No newline at end of file
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.paths import BASE_DATA_DIR
+
+# ===========================================
+# ЛОКАЛЬНИЙ КЕШ ПЕРЕКЛАДІВ (SQLite, WAL)
+# ===========================================
+# Перший рівень перед D1 у файлі data/db/description_translations.db, ті самі таблиці:
+#   names — пам'ять перекладів за назвою (pl_text -> uk_text), основне джерело;
+#   dict  — пер-кодові переклади (supplier_id, code, pl_text -> uk_text), звідси беруться
+#           винятки: код, чий переклад відрізняється від перекладу назви;
+#   backlog — черга назв без перекладу (по постачальнику), її розбирає translation_worker.py.
+# Пошук — пакетно, з диска, без мережі.
+# dirty=1 — рядок записаний локально, але ще не підтверджений у D1
+# (його дошле фонова синхронізація, див. translation_cache.py).
+# Версія перекладів постачальника (sync_state memory_version:<id>) росте, коли з черги знято
+# його назви (переклад готовий) або змінились його рядки dict — за нею імпорт бачить, що той
+# самий вхід тепер перекладається інакше. Переклади інших постачальників і синхронізація
+# чужих рядків її не чіпають.
+# WAL: читання не блокуються записом, ETL і потік синхронізації працюють паралельно.
+
+TRANSLATION_LOCAL_DB = os.getenv("TRANSLATION_LOCAL_DB", "1") == "1"
+DB_PATH = Path(os.getenv("TRANSLATION_DB_PATH") or BASE_DATA_DIR / "db" / "description_translations.db")
+
+# Ключів в одному SELECT (ліміт змінних SQLite — 32766, беремо з запасом)
+_LOOKUP_CHUNK = 400
+
+Row = Tuple[int, str, str, str, str]  # (supplier_id, code, unicode, pl_text, uk_text)
+
+# Старі невдалі переклади Google лежать у dict як uk_text = pl_text (оригінал замість перекладу):
+# ні в пам'ять назв, ні у винятки по кодах вони не йдуть.
+NOT_UNTRANSLATED = "UPPER(uk_text) != pl_text"
+
+_STATE_VERSION = "memory_version:{supplier_id}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dict (
+    supplier_id INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    unicode TEXT,
+    pl_text TEXT NOT NULL,
+    uk_text TEXT,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS names (
+    pl_text TEXT PRIMARY KEY,
+    uk_text TEXT,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS backlog (
+    pl_text TEXT NOT NULL,
+    supplier_id INTEGER NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    PRIMARY KEY (pl_text, supplier_id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Ключ — як у D1: ON CONFLICT(supplier_id, code, pl_text)
+_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS dict_key ON dict (supplier_id, code, pl_text);
+CREATE INDEX IF NOT EXISTS dict_dirty ON dict (dirty) WHERE dirty = 1;
+CREATE INDEX IF NOT EXISTS dict_pl_text ON dict (pl_text, supplier_id);
+CREATE INDEX IF NOT EXISTS names_dirty ON names (dirty) WHERE dirty = 1;
+CREATE INDEX IF NOT EXISTS backlog_due ON backlog (next_attempt_at);
+"""
+
+# Колонки, яких немає у старій версії файлу (до переїзду на D1)
+_ADDED_COLUMNS = {
+    "dirty": "INTEGER NOT NULL DEFAULT 0",
+    "updated_at": "TIMESTAMP",
+}
+
+# Локальний запис: завжди перезаписує переклад і позначає рядок для D1
+_UPSERT_LOCAL = """
+    INSERT INTO dict (supplier_id, code, unicode, pl_text, uk_text, dirty) VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT(supplier_id, code, pl_text) DO UPDATE SET
+        uk_text = excluded.uk_text, dirty = 1, updated_at = CURRENT_TIMESTAMP
+"""
+
+# Дані з D1: не чіпають рядки, які ще не дісталися D1 (локальна зміна новіша)
+_UPSERT_REMOTE = """
+    INSERT INTO dict (supplier_id, code, unicode, pl_text, uk_text, dirty) VALUES (?, ?, ?, ?, ?, 0)
+    ON CONFLICT(supplier_id, code, pl_text) DO UPDATE SET
+        uk_text = excluded.uk_text, updated_at = CURRENT_TIMESTAMP
+    WHERE dict.dirty = 0 AND dict.uk_text IS NOT excluded.uk_text
+"""
+
+_UPSERT_NAME_LOCAL = """
+    INSERT INTO names (pl_text, uk_text, dirty) VALUES (?, ?, 1)
+    ON CONFLICT(pl_text) DO UPDATE SET uk_text = excluded.uk_text, dirty = 1, updated_at = CURRENT_TIMESTAMP
+"""
+
+_UPSERT_NAME_REMOTE = """
+    INSERT INTO names (pl_text, uk_text, dirty) VALUES (?, ?, 0)
+    ON CONFLICT(pl_text) DO UPDATE SET uk_text = excluded.uk_text, updated_at = CURRENT_TIMESTAMP
+    WHERE names.dirty = 0 AND names.uk_text IS NOT excluded.uk_text
+"""
+
+
+def _normalize(rows: Iterable[Sequence]) -> List[Row]:
+    return [(int(s), str(c), str(u), str(pl).upper(), uk) for s, c, u, pl, uk in rows]
+
+
+class LocalTranslationDB:
+    def __init__(self, path: Path = DB_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Окреме з'єднання на потік (ETL, фонова синхронізація)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+            existing = {r[1] for r in conn.execute("PRAGMA table_info(dict)")}
+            for col, decl in _ADDED_COLUMNS.items():
+                if col not in existing:
+                    conn.execute(f"ALTER TABLE dict ADD COLUMN {col} {decl}")
+            conn.executescript(_INDEXES)
+
+    # ----------- читання -------------
+    def get_many(self, supplier_id: int, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """keys — [(code, pl_text), ...] -> {(code, PL_TEXT): uk_text}; лише непорожні переклади."""
+        keys = list(dict.fromkeys((str(code), str(pl).upper()) for code, pl in keys))
+        found = {}
+        conn = self._conn()
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            part = keys[i:i + _LOOKUP_CHUNK]
+            values = ", ".join(["(?, ?)"] * len(part))
+            params = [supplier_id] + [v for key in part for v in key]
+            cur = conn.execute(
+                f"SELECT code, pl_text, uk_text FROM dict "
+                f"WHERE supplier_id = ? AND (code, pl_text) IN (VALUES {values}) AND uk_text IS NOT NULL",
+                params,
+            )
+            for code, pl, uk in cur:
+                found[(code, pl)] = uk
+        return found
+
+    def _select_in(self, sql: str, fixed: list, keys: list) -> List[tuple]:
+        """SELECT ... IN ({values}) шматками по _LOOKUP_CHUNK ключів."""
+        conn = self._conn()
+        rows = []
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            part = keys[i:i + _LOOKUP_CHUNK]
+            rows += conn.execute(sql.format(values=", ".join(["?"] * len(part))), fixed + part).fetchall()
+        return rows
+
+    def get_names(self, pl_texts: List[str]) -> Dict[str, str]:
+        """{PL_TEXT: uk_text} з пам'яті назв."""
+        rows = self._select_in(
+            "SELECT pl_text, uk_text FROM names WHERE pl_text IN ({values}) AND uk_text IS NOT NULL AND uk_text != ''",
+            [], list(pl_texts),
+        )
+        return dict(rows)
+
+    def names_from_dict(self, pl_texts: List[str]) -> Dict[str, str]:
+        """Для назв, яких ще немає в names: останній пер-кодовий переклад з dict."""
+        rows = self._select_in(
+            "SELECT pl_text, uk_text FROM dict WHERE rowid IN ("
+            "SELECT MAX(rowid) FROM dict WHERE pl_text IN ({values}) AND uk_text IS NOT NULL AND uk_text != '' "
+            f"AND {NOT_UNTRANSLATED} GROUP BY pl_text)",
+            [], list(pl_texts),
+        )
+        return dict(rows)
+
+    def get_overrides(self, supplier_id: int, pl_texts: List[str]) -> List[Tuple[str, str, str]]:
+        """Пер-кодові переклади для цих назв: [(code, PL_TEXT, uk_text), ...]."""
+        return self._select_in(
+            "SELECT code, pl_text, uk_text FROM dict "
+            f"WHERE supplier_id = ? AND pl_text IN ({{values}}) AND uk_text IS NOT NULL AND {NOT_UNTRANSLATED}",
+            [supplier_id], list(pl_texts),
+        )
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM dict").fetchone()[0]
+
+    # ----------- запис -------------
+    def save_many(self, rows: Iterable[Sequence]) -> int:
+        """Локальний запис (dirty=1). rows — [(supplier_id, code, unicode, pl_text, uk_text), ...]."""
+        rows = _normalize(rows)
+        conn = self._conn()
+        with conn:
+            self._upsert_by_supplier(conn, _UPSERT_LOCAL, rows)
+        return len(rows)
+
+    def merge_remote(self, rows: Iterable[Sequence]) -> int:
+        """Рядки з D1 (read-through / синхронізація). Повертає кількість змінених."""
+        rows = _normalize(rows)
+        conn = self._conn()
+        with conn:
+            return self._upsert_by_supplier(conn, _UPSERT_REMOTE, rows)
+
+    def _upsert_by_supplier(self, conn: sqlite3.Connection, sql: str, rows: List[Row]) -> int:
+        """UPSERT у dict по постачальниках: чиї рядки змінились — тому й нова версія."""
+        by_supplier: Dict[int, List[Row]] = {}
+        for row in rows:
+            by_supplier.setdefault(row[0], []).append(row)
+        changed = 0
+        for supplier_id, part in by_supplier.items():
+            before = conn.total_changes
+            conn.executemany(sql, part)
+            if conn.total_changes > before:
+                changed += conn.total_changes - before
+                self._bump_version(conn, supplier_id)
+        return changed
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection, supplier_id: int) -> None:
+        # У тій самій транзакції, що й запис: версія не відстає від даних
+        conn.execute(
+            "INSERT INTO sync_state (key, value) VALUES (?, '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (_STATE_VERSION.format(supplier_id=supplier_id),),
+        )
+
+    def memory_version(self, supplier_id: int) -> int:
+        """Монотонна версія перекладів постачальника — спільна для процесів з цим файлом."""
+        return int(self.get_state(_STATE_VERSION.format(supplier_id=supplier_id)) or 0)
+
+    # ----------- синхронізація -------------
+    def dirty_rows(self, limit: int) -> List[Row]:
+        cur = self._conn().execute(
+            "SELECT supplier_id, code, unicode, pl_text, uk_text FROM dict WHERE dirty = 1 LIMIT ?", (limit,)
+        )
+        return cur.fetchall()
+
+    def mark_clean(self, rows: Iterable[Sequence]) -> None:
+        """Рядок чистий, лише якщо його не переписали, поки він летів у D1."""
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "UPDATE dict SET dirty = 0 WHERE supplier_id = ? AND code = ? AND pl_text = ? AND uk_text IS ?",
+                [(s, c, pl, uk) for s, c, _, pl, uk in _normalize(rows)],
+            )
+
+    def save_names(self, items: Iterable[Tuple[str, str]]) -> int:
+        """Локальний запис у пам'ять назв (dirty=1). items — [(pl_text, uk_text), ...]."""
+        items = [(str(pl).upper(), uk) for pl, uk in items]
+        conn = self._conn()
+        with conn:
+            conn.executemany(_UPSERT_NAME_LOCAL, items)
+        return len(items)
+
+    def merge_remote_names(self, items: Iterable[Tuple[str, str]]) -> int:
+        items = [(str(pl).upper(), uk) for pl, uk in items]
+        conn = self._conn()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(_UPSERT_NAME_REMOTE, items)
+            return conn.total_changes - before
+
+    def dirty_names(self, limit: int) -> List[Tuple[str, str]]:
+        return self._conn().execute("SELECT pl_text, uk_text FROM names WHERE dirty = 1 LIMIT ?", (limit,)).fetchall()
+
+    def mark_names_clean(self, items: Iterable[Tuple[str, str]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "UPDATE names SET dirty = 0 WHERE pl_text = ? AND uk_text IS ?",
+                [(str(pl).upper(), uk) for pl, uk in items],
+            )
+
+    # ----------- черга перекладу (backlog) -------------
+    def enqueue(self, supplier_id: int, pl_texts: Iterable[str]) -> int:
+        """Додає назви в чергу (вже наявні не чіпає). Повертає кількість нових."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO backlog (pl_text, supplier_id, enqueued_at) VALUES (?, ?, ?)",
+                [(str(pl).upper(), supplier_id, now) for pl in pl_texts],
+            )
+            return conn.total_changes - before
+
+    def due_names(self, limit: int, exclude: Iterable[str] = ()) -> List[str]:
+        """Назви, яким настав час перекладу (найстаріші першими), крім тих, що вже в роботі."""
+        exclude = set(exclude)
+        cur = self._conn().execute(
+            "SELECT pl_text FROM backlog WHERE next_attempt_at <= ? "
+            "GROUP BY pl_text ORDER BY MIN(enqueued_at) LIMIT ?",
+            (time.time(), limit + len(exclude)),
+        )
+        return [pl for (pl,) in cur if pl not in exclude][:limit]
+
+    def dequeue(self, pl_texts: Iterable[str]) -> None:
+        """Назви перекладено: знімаються з черги, постачальники, що їх чекали, отримують нову версію."""
+        pl_texts = list(pl_texts)
+        conn = self._conn()
+        with conn:
+            suppliers = set()
+            for i in range(0, len(pl_texts), _LOOKUP_CHUNK):
+                part = pl_texts[i:i + _LOOKUP_CHUNK]
+                suppliers.update(s for (s,) in conn.execute(
+                    f"SELECT DISTINCT supplier_id FROM backlog WHERE pl_text IN ({', '.join(['?'] * len(part))})", part
+                ))
+            conn.executemany("DELETE FROM backlog WHERE pl_text = ?", [(pl,) for pl in pl_texts])
+            for supplier_id in suppliers:
+                self._bump_version(conn, supplier_id)
+
+    def retry_later(self, pl_texts: Iterable[str], error: str, base_sec: float, max_sec: float) -> None:
+        """Невдала спроба: наступна — через base_sec * 2^спроби (не більше max_sec)."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            for pl in pl_texts:
+                conn.execute(
+                    "UPDATE backlog SET attempts = attempts + 1, last_error = ?, "
+                    "next_attempt_at = ? + MIN(?, ? * (1 << MIN(attempts, 30))) WHERE pl_text = ?",
+                    (error[:500], now, max_sec, base_sec, pl),
+                )
+
+    def pending_count(self, supplier_id: Optional[int] = None) -> int:
+        if supplier_id is None:
+            return self._conn().execute("SELECT COUNT(DISTINCT pl_text) FROM backlog").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM backlog WHERE supplier_id = ?", (supplier_id,)).fetchone()[0]
+
+    def next_due_at(self) -> Optional[float]:
+        return self._conn().execute("SELECT MIN(next_attempt_at) FROM backlog").fetchone()[0]
+
+    def get_state(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+
+_db: Optional[LocalTranslationDB] = None
+_db_failed = False
+_db_lock = threading.Lock()
+
+
+def init_local_db() -> Optional[LocalTranslationDB]:
+    """Локальна база перекладів (одна на процес) або None, якщо вимкнена / недоступна."""
+    global _db, _db_failed
+    if not TRANSLATION_LOCAL_DB:
+        return None
+    with _db_lock:
+        if _db is None and not _db_failed:
+            try:
+                _db = LocalTranslationDB()
+                print(f"✅ Локальна база перекладів: {_db.path} ({_db.count()} записів)")
+            except Exception as e:
+                _db_failed = True
+                print(f"[WARN] Local translation DB disabled: {e}")
+        return _db
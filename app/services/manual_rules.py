@@ -0,0 +1,47 @@
+import re
+
+from app.services.dictionaries import PARTS_DESCRIPTION_DICT, POSITION_DICT
+
+# ===========================================
+# РУЧНІ ПРАВИЛА ПЕРЕКЛАДУ (словники)
+# ===========================================
+# Словники компілюються один раз при імпорті:
+#   - назви: порядок ключів = пріоритет (перший ключ, що входить у назву, виграє) — лишається
+#     перебором `in` у C, це дешевше за regex; ключі — заздалегідь у списку;
+#   - позиції: одна альтернація \b(...)\b замість окремого re.sub на кожен ключ.
+#     Ключі позицій — цілі слова і не перетинаються з перекладами, тож один прохід = послідовні заміни.
+_PARTS_ITEMS = list(PARTS_DESCRIPTION_DICT.items())
+_POSITION_RE = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in POSITION_DICT) + r")\b")
+
+
+def _position_repl(m: re.Match) -> str:
+    return POSITION_DICT[m.group(0)]
+
+
+def apply_manual_rules(name_pl: str) -> (str, bool):
+    """Прикладає правила зі словників. Повертає (текст, чи було змінено)"""
+    translated = name_pl
+    changed = False
+
+    # А) Заміна основної назви
+    for pl_key, ua_val in _PARTS_ITEMS:
+        if pl_key in translated:
+            translated = translated.replace(pl_key, ua_val)
+            changed = True
+            break  # Беремо тільки одну головну назву
+
+    # Б) Заміна позицій
+    translated, n_pos = _POSITION_RE.subn(_position_repl, translated)
+    if n_pos:
+        changed = True
+
+    return translated, changed
+
+
+def apply_manual_rules_batch(names: list) -> list:
+    """apply_manual_rules для цілої колонки: кожна унікальна назва обробляється один раз."""
+    done = {}
+    for name in names:
+        if name not in done:
+            done[name] = apply_manual_rules(name)
+    return [done[name] for name in names]
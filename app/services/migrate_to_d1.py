@@ -36,15 +36,11 @@ def migrate():
     d1 = CloudflareD1Manager()
     count = 0
 
-    # 2. Переносимо дані в хмару
-    for row in rows:
-        supplier_id, code, unicode_val, pl_text, uk_text = row
-        # Використовуємо метод save_to_cache з нашого менеджера
-        d1.save_to_cache(supplier_id, code, unicode_val, pl_text, uk_text)
-
-        count += 1
-        if count % 20 == 0:
-            print(f"✅ Перенесено {count} із {len(rows)}...")
+    # 2. Переносимо дані в хмару пакетами (save_many_to_cache: batch-запити D1)
+    chunk = 1000
+    for i in range(0, len(rows), chunk):
+        count += d1.save_many_to_cache(rows[i:i + chunk])
+        print(f"✅ Перенесено {count} із {len(rows)}...")
 
     print(f"\n🚀 Міграція завершена! Успішно перенесено {count} записів.")
     local_conn.close()
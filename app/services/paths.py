@@ -25,10 +25,12 @@ BASE_DATA_DIR = PROJECT_ROOT / "data"
 
 TEMP_DIR = BASE_DATA_DIR / "temp"
 STATE_DIR = BASE_DATA_DIR / "state"  # Для файлів стану (якщо треба)
+SNAPSHOT_DIR = BASE_DATA_DIR / "snapshots"  # Parquet-снапшоти підготовлених прайсів
 
 # Гарантуємо, що папки існують
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
 STATE_DIR.mkdir(parents=True, exist_ok=True)
+SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
 
 # ===========================================
 # ДІАГНОСТИКА (Щоб ти міг перевірити)
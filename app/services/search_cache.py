@@ -0,0 +1,184 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.database import engine
+
+# ===========================================
+# КЕШ РЕЗУЛЬТАТІВ ПОШУКУ (LRU + TTL)
+# ===========================================
+# Інвалідація — через "покоління" каталогу кожного постачальника:
+# process_one_price після успішного UPSERT робить bump_catalog_generation(supplier_id),
+# і всі сторінки, закешовані до цього, стають недійсними.
+# Покоління живуть у БД (таблиця catalog_generations), тож їх бачать усі процеси:
+# кожен воркер API раз на SEARCH_GENERATION_POLL_SEC с перечитує таблицю (потік
+# catalog-generation-watch) і, якщо щось змінилось, скидає свій кеш і перебудовує
+# in-memory індекс кодів. Імпорт в іншому процесі (CLI, cron) теж сюди потрапляє.
+# TTL — лише страховка (напр. якщо БД поколінь тимчасово недоступна).
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_GENERATION_POLL_SEC = float(os.getenv("SEARCH_GENERATION_POLL_SEC", "5"))  # 0 — без потоку
+
+TABLE_GENERATIONS = "catalog_generations"
+
+# ----------------------- Покоління каталогу -----------------------
+
+_generations: Dict[int, int] = {}
+_gen_lock = threading.Lock()
+_table_ready = False
+
+
+def _ensure_table(conn) -> None:
+    global _table_ready
+    if not _table_ready:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {TABLE_GENERATIONS} (
+                supplier_id INTEGER PRIMARY KEY,
+                generation BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """))
+        _table_ready = True
+
+
+def bump_catalog_generation(supplier_id: int) -> int:
+    """Викликається після зміни даних постачальника в каталозі: +1 у БД і одразу в цьому процесі."""
+    try:
+        with engine.begin() as conn:
+            _ensure_table(conn)
+            generation = conn.execute(text(f"""
+                INSERT INTO {TABLE_GENERATIONS} (supplier_id, generation) VALUES (:sid, 1)
+                ON CONFLICT (supplier_id) DO UPDATE
+                SET generation = {TABLE_GENERATIONS}.generation + 1, updated_at = now()
+                RETURNING generation
+            """), {"sid": supplier_id}).scalar()
+    except Exception as e:
+        # Інші процеси дізнаються про зміну лише через TTL, але цей — одразу
+        print(f"[WARN] Catalog generation was not saved to DB: {e}")
+        with _gen_lock:
+            generation = _generations.get(supplier_id, 0) + 1
+    with _gen_lock:
+        _generations[supplier_id] = generation
+    return generation
+
+
+def sync_catalog_generations() -> bool:
+    """Перечитує покоління з БД. True — якийсь постачальник змінився з минулої перевірки."""
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        rows = conn.execute(text(f"SELECT supplier_id, generation FROM {TABLE_GENERATIONS}")).fetchall()
+    fresh = {int(sid): int(gen) for sid, gen in rows}
+    with _gen_lock:
+        changed = fresh != _generations
+        _generations.clear()
+        _generations.update(fresh)
+    return changed
+
+
+def catalog_generation() -> Tuple[Tuple[int, int], ...]:
+    """Знімок поколінь усіх постачальників (сторінка пошуку може містити будь-кого з них)."""
+    with _gen_lock:
+        return tuple(sorted(_generations.items()))
+
+
+def watch_catalog_generations(on_change: Callable[[], None], stop: threading.Event) -> None:
+    """Тіло потоку: перевірка поколінь у БД; on_change() — коли каталог змінив інший процес."""
+    first = True
+    while not stop.is_set():
+        try:
+            if sync_catalog_generations() and not first:
+                print("[INFO] Catalog changed in another process: search cache and code index refreshed")
+                on_change()
+            first = False
+        except Exception as e:
+            print(f"[WARN] Catalog generation check failed: {e}")
+        stop.wait(SEARCH_GENERATION_POLL_SEC)
+
+
+def start_generation_watch(on_change: Callable[[], None]) -> Optional[threading.Event]:
+    """Запускає потік catalog-generation-watch (старт API). Повертає Event для зупинки."""
+    if SEARCH_GENERATION_POLL_SEC <= 0:
+        return None
+    stop = threading.Event()
+    threading.Thread(
+        target=watch_catalog_generations, args=(on_change, stop), name="catalog-generation-watch", daemon=True
+    ).start()
+    return stop
+
+
+# ----------------------- Кеш -----------------------
+
+class SearchCache:
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl_sec: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[Hashable, Tuple[float, tuple, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        generation = catalog_generation()
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, stored_gen, value = entry
+            if stored_gen != generation or now - stored_at > self.ttl_sec:
+                del self._data[key]
+                self.invalidated += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[tuple] = None) -> None:
+        """generation — знімок, взятий ДО запиту в БД (щоб не закешувати старі дані під новим поколінням)."""
+        if not self.enabled:
+            return
+        entry = (time.monotonic(), generation if generation is not None else catalog_generation(), value)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "generations": dict(catalog_generation()),
+            }
+
+
+# Один кеш на процес API
+search_cache = SearchCache()
@@ -1,41 +1,78 @@
 import os
+import time
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
 from typing import Optional, List
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 
+from app.services.paths import BASE_DATA_DIR
 
-class StorageClient:
-    def __init__(self):
-        self.bucket = os.getenv("R2_BUCKET")
-        self.public_base = (os.getenv("R2_PUBLIC_BASE") or "").rstrip("/")
-        self.s3 = boto3.client(
-            "s3",
-            endpoint_url=os.getenv("R2_ENDPOINT"),
-            aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
-            config=Config(signature_version="s3v4"),
-            region_name="auto",
-        )
+# ===========================================
+# СХОВИЩЕ ВИХІДНИХ ФАЙЛІВ
+# ===========================================
+# STORAGE_BACKEND=r2 (за замовчуванням) — Cloudflare R2 через boto3 (StorageClient).
+# STORAGE_BACKEND=local — тека на диску (LocalStorageClient): ETL і бенчмарки без мережі
+# і ключів R2. Семантика однакова: ключі з префіксами, LastModified, keep_last.
+# Бекенд реалізує лише примітиви (_list_all_objects / _put_file / _delete_keys / _signed_url),
+# upload_file, latest_key, url_for, cleanup_old_files — спільні в StorageBackend.
 
-    # ----------- internal helper -------------
-    def _list_all_objects(self, prefix: str) -> List[dict]:
-        """Отримати всі об’єкти з префіксом (підтримка пагінації)."""
-        all_items: List[dict] = []
-        continuation = None
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "r2").lower()  # r2 | local
+LOCAL_STORAGE_DIR = Path(os.getenv("LOCAL_STORAGE_DIR") or BASE_DATA_DIR / "storage")
 
-        while True:
-            params = {"Bucket": self.bucket, "Prefix": prefix}
-            if continuation:
-                params["ContinuationToken"] = continuation
+# ===========================================
+# ПЕРЕДАЧА В R2
+# ===========================================
+# Файли понад R2_MULTIPART_THRESHOLD_MB йдуть multipart-ом: частини по R2_MULTIPART_CHUNK_MB
+# (R2: усі частини, крім останньої, однакові, мінімум 5 MB) у R2_MAX_CONCURRENCY потоків.
+# Кілька вихідних прайсів вивантажуються паралельно в спільному пулі (R2_UPLOAD_WORKERS)
+# через один boto3-клієнт на процес (get_storage) — він потокобезпечний.
 
-            resp = self.s3.list_objects_v2(**params)
-            all_items.extend(resp.get("Contents", []) or [])
+R2_MULTIPART_THRESHOLD_MB = int(os.getenv("R2_MULTIPART_THRESHOLD_MB", "16"))
+R2_MULTIPART_CHUNK_MB = int(os.getenv("R2_MULTIPART_CHUNK_MB", "16"))
+R2_MAX_CONCURRENCY = int(os.getenv("R2_MAX_CONCURRENCY", "8"))
+R2_UPLOAD_WORKERS = int(os.getenv("R2_UPLOAD_WORKERS", "4"))
 
-            if not resp.get("IsTruncated"):
-                break
-            continuation = resp.get("NextContinuationToken")
+# DeleteObjects приймає до 1000 ключів за раз
+DELETE_BATCH = 1000
 
-        return all_items
+MB = 1024 * 1024
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=max(5, R2_MULTIPART_THRESHOLD_MB) * MB,
+    multipart_chunksize=max(5, R2_MULTIPART_CHUNK_MB) * MB,
+    max_concurrency=max(1, R2_MAX_CONCURRENCY),
+    use_threads=True,
+)
+
+
+class StorageBackend(ABC):
+    """Спільна логіка сховища; бекенд дає примітиви для своїх об'єктів (без них — не створюється)."""
+
+    label = "storage"
+    public_base = ""
+
+    # ----------- примітиви бекенду -------------
+    @abstractmethod
+    def _list_all_objects(self, prefix: str) -> List[dict]:
+        """Усі об'єкти з префіксом: [{"Key", "LastModified", "Size"}, ...]."""
+
+    @abstractmethod
+    def _put_file(self, local_path: str, key: str, content_type: Optional[str]) -> None:
+        ...
+
+    @abstractmethod
+    def _delete_keys(self, prefix: str, keys: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def _signed_url(self, key: str, expires_sec: int) -> str:
+        ...
 
     # ----------- public API -----------------
     def latest_key(self, prefix: str) -> Optional[str]:
@@ -49,11 +86,7 @@ class StorageClient:
             return None
         if self.public_base:
             return f"{self.public_base}/{key}"
-        return self.s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": self.bucket, "Key": key},
-            ExpiresIn=expires_sec,
-        )
+        return self._signed_url(key, expires_sec)
 
     def upload_file(
             self,
@@ -64,8 +97,10 @@ class StorageClient:
             keep_last: int = 7,
     ) -> str:
         """Завантажити файл і (опціонально) прибрати старі під cleanup_prefix."""
-        extra = {"ContentType": content_type} if content_type else None
-        self.s3.upload_file(local_path, self.bucket, key, ExtraArgs=extra)
+        t_start = time.perf_counter()
+        self._put_file(local_path, key, content_type)
+        size_mb = os.path.getsize(local_path) / MB
+        print(f"[INFO] {self.label} upload {key}: {size_mb:.1f} MB in {time.perf_counter() - t_start:.2f}s")
 
         # опційне прибирання
         if cleanup_prefix:
@@ -78,6 +113,7 @@ class StorageClient:
 
     def cleanup_old_files(self, prefix: str, keep: int = 7) -> None:
         """Видалити всі старі файли у префіксі, залишивши лише N останніх."""
+        t_start = time.perf_counter()
         items = self._list_all_objects(prefix)
         if not items or len(items) <= keep:
             return
@@ -86,9 +122,186 @@ class StorageClient:
         to_delete = items[keep:]
 
         print(f"🧹 Cleanup {prefix}: keeping {keep}, deleting {len(to_delete)} old files")
+        self._delete_keys(prefix, [obj["Key"] for obj in to_delete])
+        print(f"[INFO] {self.label} cleanup {prefix}: {time.perf_counter() - t_start:.2f}s")
+
+    def submit_upload(
+            self,
+            local_path: str,
+            key: str,
+            content_type: Optional[str] = None,
+            cleanup_prefix: Optional[str] = None,
+            keep_last: int = 7,
+            delete_local: bool = False,
+    ) -> "Future[str]":
+        """upload_file у спільному пулі; delete_local — прибрати локальний файл після вивантаження."""
+        def _job() -> str:
+            try:
+                return self.upload_file(local_path, key, content_type=content_type,
+                                        cleanup_prefix=cleanup_prefix, keep_last=keep_last)
+            finally:
+                if delete_local:
+                    Path(local_path).unlink(missing_ok=True)
+
+        return _upload_pool().submit(_job)
+
+
+class StorageClient(StorageBackend):
+    """Cloudflare R2 (S3 API)."""
+
+    label = "R2"
+
+    def __init__(self):
+        self.bucket = os.getenv("R2_BUCKET")
+        self.public_base = (os.getenv("R2_PUBLIC_BASE") or "").rstrip("/")
+        self.s3 = boto3.client(
+            "s3",
+            endpoint_url=os.getenv("R2_ENDPOINT"),
+            aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
+            # з'єднань вистачає на всі паралельні вивантаження та їхні частини
+            config=Config(
+                signature_version="s3v4",
+                max_pool_connections=max(10, R2_UPLOAD_WORKERS * R2_MAX_CONCURRENCY + 2),
+            ),
+            region_name="auto",
+        )
+
+    # ----------- internal helper -------------
+    def _list_all_objects(self, prefix: str) -> List[dict]:
+        """Отримати всі об’єкти з префіксом (підтримка пагінації)."""
+        all_items: List[dict] = []
+        continuation = None
+
+        while True:
+            params = {"Bucket": self.bucket, "Prefix": prefix}
+            if continuation:
+                params["ContinuationToken"] = continuation
+
+            resp = self.s3.list_objects_v2(**params)
+            all_items.extend(resp.get("Contents", []) or [])
+
+            if not resp.get("IsTruncated"):
+                break
+            continuation = resp.get("NextContinuationToken")
+
+        return all_items
 
-        for obj in to_delete:
+    def _put_file(self, local_path: str, key: str, content_type: Optional[str]) -> None:
+        extra = {"ContentType": content_type} if content_type else None
+        self.s3.upload_file(local_path, self.bucket, key, ExtraArgs=extra, Config=TRANSFER_CONFIG)
+
+    def _delete_keys(self, prefix: str, keys: List[str]) -> None:
+        # DeleteObjects пачками по 1000 замість delete_object на кожен ключ
+        for i in range(0, len(keys), DELETE_BATCH):
+            batch = keys[i:i + DELETE_BATCH]
             try:
-                self.s3.delete_object(Bucket=self.bucket, Key=obj["Key"])
+                resp = self.s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+                )
             except Exception as e:
-                print(f"⚠️ Failed to delete {obj['Key']}: {e}")
+                print(f"⚠️ Failed to delete {len(batch)} files under {prefix}: {e}")
+                continue
+            for err in resp.get("Errors") or []:
+                print(f"⚠️ Failed to delete {err.get('Key')}: {err.get('Code')} {err.get('Message')}")
+
+    def _signed_url(self, key: str, expires_sec: int) -> str:
+        return self.s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_sec,
+        )
+
+
+class LocalStorageClient(StorageBackend):
+    """
+    Тека на диску замість бакета: ключ "a/b/file.csv" -> <root>/a/b/file.csv,
+    LastModified — mtime файлу. URL — LOCAL_STORAGE_PUBLIC_BASE/key або file://.
+    """
+
+    label = "Local"
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or LOCAL_STORAGE_DIR).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.bucket = str(self.root)
+        self.public_base = (os.getenv("LOCAL_STORAGE_PUBLIC_BASE") or "").rstrip("/")
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if path != self.root and self.root not in path.parents:
+            raise ValueError(f"Key outside storage root: {key}")
+        return path
+
+    def _list_all_objects(self, prefix: str) -> List[dict]:
+        # Обходимо лише теку префікса, а не все сховище
+        base = self._path(prefix.rsplit("/", 1)[0]) if "/" in prefix else self.root
+        items: List[dict] = []
+        if not base.is_dir():
+            return items
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                if name.startswith(".upload-"):
+                    continue
+                path = Path(dirpath) / name
+                key = path.relative_to(self.root).as_posix()
+                if not key.startswith(prefix):
+                    continue
+                st = path.stat()
+                items.append({
+                    "Key": key,
+                    "LastModified": datetime.fromtimestamp(st.st_mtime_ns / 1e9, tz=timezone.utc),
+                    "Size": st.st_size,
+                })
+        return items
+
+    def _put_file(self, local_path: str, key: str, content_type: Optional[str]) -> None:
+        # Копія у тимчасовий файл поруч і атомарна заміна: читач не бачить недописаного файлу
+        dest = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".upload-{threading.get_ident()}-{dest.name}")
+        shutil.copyfile(local_path, tmp)
+        os.replace(tmp, dest)
+
+    def _delete_keys(self, prefix: str, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                self._path(key).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"⚠️ Failed to delete {key}: {e}")
+
+    def _signed_url(self, key: str, expires_sec: int) -> str:
+        return self._path(key).as_uri()
+
+
+# ----------- спільний клієнт і пул вивантажень -----------------
+_storage: Optional[StorageBackend] = None
+_pool: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def make_storage() -> StorageBackend:
+    """Бекенд за STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "local":
+        return LocalStorageClient()
+    if STORAGE_BACKEND != "r2":
+        print(f"[WARN] Unknown STORAGE_BACKEND={STORAGE_BACKEND!r}, using R2")
+    return StorageClient()
+
+
+def get_storage() -> StorageBackend:
+    """Одне сховище (і один boto3-клієнт) на процес."""
+    global _storage
+    with _lock:
+        if _storage is None:
+            _storage = make_storage()
+        return _storage
+
+
+def _upload_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, R2_UPLOAD_WORKERS), thread_name_prefix="storage-upload")
+        return _pool
@@ -0,0 +1,237 @@
+import os
+import time
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from app.services.cloudflare_d1 import CloudflareD1Manager
+from app.services.local_db import LocalTranslationDB
+
+# ===========================================
+# ДВОРІВНЕВИЙ КЕШ ПЕРЕКЛАДІВ: SQLite -> D1
+# ===========================================
+# Переклад шукається за назвою (names), пер-кодова таблиця dict — лише для винятків.
+# Читання: спершу локальний SQLite (пакетно, з диска), промахи — одним пакетом у D1,
+#          знайдене в D1 одразу кладеться локально (read-through).
+#          Назви, якої ще немає в names, беруться з dict (переклад, зроблений колись для
+#          будь-якого коду) і переносяться в names.
+# Запис:   локально (dirty=1) і одразу в D1; підтверджене D1 стає dirty=0.
+# Винятки (get_overrides) — лише з локальної копії dict, без D1: вона повністю
+#          тягнеться синхронізацією, і промах тут — норма, а не привід іти в мережу.
+# Фонова синхронізація (потік translation-sync, кожні TRANSLATION_SYNC_INTERVAL с):
+#   - досилає в D1 рядки names/dict, які лишились dirty (D1 був недоступний);
+#   - забирає з D1 нові рядки names/dict за rowid (записані іншими інстансами / міграцією);
+#   - раз на TRANSLATION_FULL_SYNC_HOURS — повний прохід з нуля: звіряє й змінені переклади.
+# Найперша повна синхронізація (порожня локальна база) виконується одразу, перед перекладом.
+# Без локальної бази (TRANSLATION_LOCAL_DB=0 або помилка файлу) — усе йде напряму в D1.
+
+TRANSLATION_SYNC_INTERVAL = float(os.getenv("TRANSLATION_SYNC_INTERVAL", "300"))  # 0 — без фонового потоку
+TRANSLATION_FULL_SYNC_HOURS = float(os.getenv("TRANSLATION_FULL_SYNC_HOURS", "24"))
+
+_PUSH_CHUNK = 1000
+_PULL_PAGE = 1000
+
+_STATE_ROWID = "d1_rowid"
+_STATE_NAMES_ROWID = "d1_names_rowid"
+_STATE_FULL_AT = "d1_full_sync_at"
+
+
+class TranslationCache:
+    def __init__(self, remote: CloudflareD1Manager, local: Optional[LocalTranslationDB] = None):
+        self.remote = remote
+        self.local = local
+        self._sync_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ----------- читання / запис -------------
+    def get_many(self, supplier_id: int, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """keys — [(code, pl_text), ...] -> {(code, PL_TEXT): uk_text}."""
+        keys = list(dict.fromkeys((str(code), str(pl).upper()) for code, pl in keys))
+        if self.local is None:
+            return self.remote.get_cached_translations(supplier_id, keys)
+
+        found = self.local.get_many(supplier_id, keys)
+        misses = [key for key in keys if key not in found]
+        from_d1 = 0
+        if misses:
+            rows = self.remote.get_cached_rows(supplier_id, misses)
+            if rows:
+                self.local.merge_remote(
+                    (supplier_id, row['code'], row.get('unicode') or "", row['pl_text'], row['uk_text'])
+                    for row in rows.values()
+                )
+                found.update({key: row['uk_text'] for key, row in rows.items()})
+                from_d1 = len(rows)
+        print(f"[INFO] Translation cache: {len(keys)} keys, local {len(keys) - len(misses)}, "
+              f"D1 {from_d1}, miss {len(misses) - from_d1}")
+        return found
+
+    def save_many(self, rows: Sequence[Sequence]) -> int:
+        """rows — [(supplier_id, code, unicode, pl_text, uk_text), ...]. Повертає кількість збережених."""
+        if self.local is None:
+            return self.remote.save_many_to_cache(rows)
+
+        saved = self.local.save_many(rows)
+        unique = len({(s, str(c), str(pl).upper()) for s, c, _, pl, _ in rows})
+        if self.remote.save_many_to_cache(rows) == unique:
+            self.local.mark_clean(rows)
+        else:
+            print("[WARN] D1 did not accept all translations, they stay queued for sync")
+        return saved
+
+    # ----------- пам'ять назв -------------
+    def get_names(self, pl_texts: Iterable[str]) -> Dict[str, str]:
+        """pl_texts — нормалізовані назви -> {PL_TEXT: uk_text}."""
+        pl_texts = list(dict.fromkeys(str(pl).upper() for pl in pl_texts))
+        found: Dict[str, str] = {}
+        promote: Dict[str, str] = {}  # знайдене лише в dict -> записати в names
+
+        if self.local is not None:
+            found.update(self.local.get_names(pl_texts))
+            promote.update(self.local.names_from_dict([pl for pl in pl_texts if pl not in found]))
+        n_local = len(found) + len(promote)
+
+        misses = [pl for pl in pl_texts if pl not in found and pl not in promote]
+        n_remote = 0
+        if misses:
+            remote = self.remote.get_names(misses)
+            if remote and self.local is not None:
+                self.local.merge_remote_names(remote.items())
+            found.update(remote)
+            promote.update(self.remote.names_from_dict([pl for pl in misses if pl not in remote]))
+            n_remote = len(found) + len(promote) - n_local
+
+        if promote:
+            self.save_names(promote.items())
+            found.update(promote)
+        print(f"[INFO] Translation memory: {len(pl_texts)} names, local {n_local}, "
+              f"D1 {n_remote}, miss {len(pl_texts) - n_local - n_remote}")
+        return found
+
+    def save_names(self, items: Iterable[Tuple[str, str]]) -> int:
+        """items — [(pl_text, uk_text), ...]. Повертає кількість збережених."""
+        items = [(str(pl).upper(), uk) for pl, uk in items]
+        if self.local is None:
+            return self.remote.save_names(items)
+
+        saved = self.local.save_names(items)
+        if self.remote.save_names(items) == len(dict(items)):
+            self.local.mark_names_clean(items)
+        else:
+            print("[WARN] D1 did not accept all name translations, they stay queued for sync")
+        return saved
+
+    def get_overrides(self, supplier_id: int, pl_texts: Iterable[str]) -> list:
+        """Пер-кодові переклади цих назв: [(code, PL_TEXT, uk_text), ...]."""
+        pl_texts = list(dict.fromkeys(str(pl).upper() for pl in pl_texts))
+        if self.local is None:
+            return self.remote.get_overrides(supplier_id, pl_texts)
+        return self.local.get_overrides(supplier_id, pl_texts)
+
+    # ----------- синхронізація -------------
+    def _push_dirty(self) -> int:
+        pushed = 0
+        previous = None
+        while True:
+            rows = self.local.dirty_rows(_PUSH_CHUNK)
+            # порожньо або ті самі рядки знову (D1 їх не прийняв) — до наступного циклу
+            if not rows or rows == previous:
+                return pushed
+            if self.remote.save_many_to_cache(rows) < len(rows):
+                return pushed
+            self.local.mark_clean(rows)
+            pushed += len(rows)
+            previous = rows
+
+    def _push_dirty_names(self) -> int:
+        pushed = 0
+        previous = None
+        while True:
+            items = self.local.dirty_names(_PUSH_CHUNK)
+            if not items or items == previous:
+                return pushed
+            if self.remote.save_names(items) < len(items):
+                return pushed
+            self.local.mark_names_clean(items)
+            pushed += len(items)
+            previous = items
+
+    def _pull_table(self, table: str, state_key: str, merge, full: bool) -> Optional[int]:
+        """Нові рядки таблиці D1 за rowid -> merge(page). None — D1 недоступний."""
+        cursor = 0 if full else int(self.local.get_state(state_key) or 0)
+        merged = 0
+        while True:
+            page = self.remote.get_rows_after(cursor, _PULL_PAGE, table=table)
+            if page is None:
+                return None
+            if page:
+                merged += merge(page)
+                cursor = max(cursor, max(int(r['rid']) for r in page))
+                self.local.set_state(state_key, str(cursor))
+            if len(page) < _PULL_PAGE:
+                return merged
+
+    def _pull(self, full: bool) -> int:
+        names = self._pull_table(
+            "names", _STATE_NAMES_ROWID,
+            lambda page: self.local.merge_remote_names((r['pl_text'], r['uk_text']) for r in page), full,
+        )
+        rows = self._pull_table(
+            "dict", _STATE_ROWID,
+            lambda page: self.local.merge_remote(
+                (r['supplier_id'], r['code'], r.get('unicode') or "", r['pl_text'], r['uk_text']) for r in page
+            ), full,
+        )
+        if full and names is not None and rows is not None:
+            self.local.set_state(_STATE_FULL_AT, str(time.time()))
+        return (names or 0) + (rows or 0)
+
+    def _full_sync_due(self) -> bool:
+        last = float(self.local.get_state(_STATE_FULL_AT) or 0)
+        return time.time() - last >= TRANSLATION_FULL_SYNC_HOURS * 3600
+
+    def sync(self, full: Optional[bool] = None) -> Tuple[int, int]:
+        """Один цикл синхронізації -> (надіслано в D1, оновлено локально)."""
+        if self.local is None:
+            return 0, 0
+        with self._sync_lock:
+            t_start = time.perf_counter()
+            full = self._full_sync_due() if full is None else full
+            pushed = self._push_dirty_names() + self._push_dirty()
+            merged = self._pull(full)
+            if pushed or merged or full:
+                print(f"🔄 [D1 SYNC] {'full' if full else 'incremental'}: pushed {pushed}, "
+                      f"updated locally {merged} in {time.perf_counter() - t_start:.2f}s")
+            return pushed, merged
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"[WARN] Translation sync failed: {e}")
+            self._stop.wait(TRANSLATION_SYNC_INTERVAL)
+
+    def bootstrap(self) -> None:
+        """
+        Перший повний sync — одразу, у потоці виклику: винятки читаються лише з локальної копії,
+        тож до першої повної синхронізації вона має бути заповнена.
+        """
+        if self.local is None or self.local.get_state(_STATE_FULL_AT):
+            return
+        print("🔄 [D1 SYNC] Локальна база перекладів ще не синхронізована — повна синхронізація")
+        self.sync(full=True)
+
+    def start_background_sync(self) -> None:
+        """Bootstrap (якщо треба) і потік синхронізації (один раз на процес)."""
+        if self.local is None:
+            return
+        with self._start_lock:
+            self.bootstrap()
+            if self._thread is None and TRANSLATION_SYNC_INTERVAL > 0:
+                self._thread = threading.Thread(target=self._run, name="translation-sync", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
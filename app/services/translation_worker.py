@@ -0,0 +1,189 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.services.cloudflare_d1 import D1Backlog
+from app.services.translation_cache import TranslationCache
+
+# ===========================================
+# ФОНОВИЙ ПЕРЕКЛАД: ЧЕРГА НАЗВ -> GOOGLE
+# ===========================================
+# Імпорт прайсу не чекає на Google: назви без перекладу кладуться в чергу (таблиця backlog
+# локальної бази, без неї — така сама таблиця в D1; переживає перезапуск),
+# а прайс іде далі з тим, що вже є в пам'яті назв.
+# Потоки translation-worker розбирають чергу пачками по TRANSLATE_BATCH назв:
+#   - не частіше TRANSLATE_RATE запитів до Google на секунду (спільно для всіх потоків);
+#   - назва, яка тим часом з'явилась у пам'яті (синхронізація з D1), знімається без Google;
+#   - невдала пачка повертається в чергу з паузою TRANSLATE_RETRY_SEC * 2^спроби
+#     (не більше TRANSLATE_RETRY_MAX_SEC).
+# Готові переклади пишуться в пам'ять назв (локально + D1) і з'являються в наступному імпорті.
+# Імпорт потоки не запускає: їх стартує і зупиняє API (lifespan у main.py), а для
+# CLI / cron-імпортів є окремий процес: python -m app.services.translation_worker.
+# Черга спільна (файл локальної бази або D1), тож обидва варіанти бачать назви з будь-якого імпорту.
+
+TRANSLATE_WORKERS = int(os.getenv("TRANSLATE_WORKERS", "2"))
+TRANSLATE_BATCH = int(os.getenv("TRANSLATE_BATCH", "20"))
+TRANSLATE_RATE = float(os.getenv("TRANSLATE_RATE", "2"))  # запитів до Google на секунду
+TRANSLATE_RETRY_SEC = float(os.getenv("TRANSLATE_RETRY_SEC", "60"))
+TRANSLATE_RETRY_MAX_SEC = float(os.getenv("TRANSLATE_RETRY_MAX_SEC", "21600"))
+
+_IDLE_WAIT = 30.0  # як часто перевіряти чергу, коли нових назв немає
+
+
+class _RateLimiter:
+    """Не більше rate викликів на секунду на всі потоки (рівномірно, без сплесків)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TranslationWorker:
+    def __init__(self, cache: TranslationCache, translate_batch: Callable[[List[str]], Dict[str, str]]):
+        """translate_batch(names) -> {назва: переклад}; виняток — пачка повертається в чергу."""
+        self.cache = cache
+        self.translate_batch = translate_batch
+        self.limiter = _RateLimiter(TRANSLATE_RATE)
+        self._lock = threading.Lock()
+        self._in_flight: set = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Черга і пошук уже перекладених назв: локальна база, без неї — D1
+        self.backlog = cache.local if cache.local is not None else D1Backlog(cache.remote)
+        self.memory = cache.local if cache.local is not None else cache.remote
+
+    # ----------- черга -------------
+    def enqueue(self, supplier_id: int, pl_texts: Iterable[str]) -> int:
+        """Назви в чергу перекладу (не блокує). Повертає кількість нових у черзі."""
+        pl_texts = list(pl_texts)
+        if not pl_texts:
+            return 0
+        try:
+            added = self.backlog.enqueue(supplier_id, pl_texts)
+            pending = self.backlog.pending_count()
+        except Exception as e:
+            # Імпорт не падає: ці назви знову підуть у чергу з наступним імпортом
+            print(f"[WARN] Translation backlog unavailable, {len(pl_texts)} names not queued: {e}")
+            return 0
+        print(f"🌍 [BACKLOG] {len(pl_texts)} names without translation, new in queue: {added}, "
+              f"pending: {pending}")
+        self._wake.set()
+        return added
+
+    def pending(self, supplier_id: Optional[int] = None) -> int:
+        return self.backlog.pending_count(supplier_id)
+
+    def _claim(self) -> List[str]:
+        with self._lock:
+            names = self.backlog.due_names(TRANSLATE_BATCH, exclude=self._in_flight)
+            self._in_flight.update(names)
+            return names
+
+    def _release(self, names: List[str]) -> None:
+        with self._lock:
+            self._in_flight.difference_update(names)
+
+    # ----------- обробка -------------
+    def process_batch(self, names: List[str]) -> int:
+        """Перекладає одну пачку з черги. Повертає кількість збережених перекладів."""
+        known = self.memory.get_names(names)
+        if known:
+            self.backlog.dequeue(known)
+        todo = [pl for pl in names if pl not in known]
+        if not todo:
+            return 0
+
+        self.limiter.wait()
+        try:
+            translated = {pl: uk for pl, uk in self.translate_batch(todo).items() if uk}
+        except Exception as e:
+            print(f"❌ Помилка Google: {e}")
+            self.backlog.retry_later(todo, str(e), TRANSLATE_RETRY_SEC, TRANSLATE_RETRY_MAX_SEC)
+            return 0
+
+        if translated:
+            self.cache.save_names(translated.items())
+            self.backlog.dequeue(translated)
+        failed = [pl for pl in todo if pl not in translated]
+        if failed:
+            self.backlog.retry_later(failed, "no translation returned", TRANSLATE_RETRY_SEC, TRANSLATE_RETRY_MAX_SEC)
+        return len(translated)
+
+    def run_once(self) -> int:
+        """Одна пачка з черги (у потоці виклику). Повертає кількість назв, взятих у роботу."""
+        names = self._claim()
+        if not names:
+            return 0
+        try:
+            saved = self.process_batch(names)
+            if saved:
+                print(f"💾 [BACKLOG] Перекладено назв: {saved}, в черзі: {self.pending()}")
+        finally:
+            self._release(names)
+        return len(names)
+
+    def _idle_wait(self) -> None:
+        due = self.backlog.next_due_at()
+        timeout = _IDLE_WAIT if due is None else min(_IDLE_WAIT, max(0.0, due - time.time()))
+        self._wake.wait(timeout or 0.1)
+        self._wake.clear()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._idle_wait()
+            except Exception as e:
+                print(f"[WARN] Translation worker failed: {e}")
+                self._stop.wait(_IDLE_WAIT)
+
+    def start(self) -> None:
+        """Потоки translation-worker (один раз на процес)."""
+        if TRANSLATE_WORKERS <= 0:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(TRANSLATE_WORKERS):
+                thread = threading.Thread(target=self._run, name=f"translation-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"🌍 [BACKLOG] Translation worker started ({TRANSLATE_WORKERS} thread(s))")
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Зупинка: пачки, що вже в Google, дописуються (не довше timeout), решта лишається в черзі."""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+if __name__ == "__main__":
+    # Окремий процес перекладу для CLI / cron-імпортів (в API воркер живе в lifespan)
+    from app.services.translator import cache, worker
+
+    cache.start_background_sync()
+    worker.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print("🌍 [BACKLOG] Stopping translation worker...")
+    finally:
+        worker.stop()
+        cache.stop()
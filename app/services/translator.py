@@ -1,100 +1,109 @@
-import time
 import re
 from deep_translator import GoogleTranslator
 from app.services.cloudflare_d1 import CloudflareD1Manager
-from app.services.dictionaries import PARTS_DESCRIPTION_DICT, POSITION_DICT
+from app.services.local_db import init_local_db
+from app.services.translation_cache import TranslationCache
+from app.services.translation_worker import TranslationWorker
+from app.services.manual_rules import apply_manual_rules_batch
 
 # 3. Створи екземпляр менеджера:
 d1 = CloudflareD1Manager()
+# Кеш перекладів: локальний SQLite перед D1 (див. translation_cache.py)
+cache = TranslationCache(d1, init_local_db())
 
-def apply_manual_rules(name_pl: str) -> (str, bool):
-    """Прикладає правила зі словників. Повертає (текст, чи було змінено)"""
-    translated = name_pl
-    changed = False
+def normalize_name(name) -> str:
+    """Ключ пам'яті перекладів: назва у верхньому регістрі, тире -> пробіли."""
+    raw_name = str(name).strip().upper()
+    return raw_name.replace("—", " ").replace("-", " ").replace("  ", " ").strip()
 
-    # А) Заміна основної назви
-    for pl_key, ua_val in PARTS_DESCRIPTION_DICT.items():
-        if pl_key in translated:
-            translated = translated.replace(pl_key, ua_val)
-            changed = True
-            break  # Беремо тільки одну головну назву
 
-    # Б) Заміна позицій
-    for pl_pos, ua_pos in POSITION_DICT.items():
-        pattern = rf"\b{pl_pos}\b"
-        if re.search(pattern, translated):
-            translated = re.sub(pattern, ua_pos, translated)
-            changed = True
+def _google_batch(names: list) -> dict:
+    """Одна пачка назв у Google -> {назва: переклад}. Помилка Google — виняток (пачка піде на повтор)."""
+    context_batch = [f"część samochodowa: {n}" for n in names]
+    translated = GoogleTranslator(source='pl', target='uk').translate_batch(context_batch)
 
-    return translated, changed
+    google_map = {}
+    for orig, trans in zip(names, translated):
+        if not trans:
+            continue
+        clean_ua = re.sub(r'^.*?:', '', trans).strip() if ":" in trans else trans.strip()
+        google_map[orig] = clean_ua.capitalize()
+    return google_map
 
 
-def translate_products(products: list, supplier_id: int) -> dict:
-    if not products: return {}
+# Нові назви перекладаються у фоні (див. translation_worker.py), імпорт на Google не чекає
+worker = TranslationWorker(cache, _google_batch)
 
-    if supplier_id == 2:
-        return {(str(p['code']), str(p['name']).strip().upper()): p['name'] for p in products}
 
-    results = {}
-    to_google = []
+def translate_names(names: list, supplier_id: int) -> list:
+    """
+    Переклад унікальних назв (як у прайсі) -> список перекладів у тому ж порядку, None — лишити як є.
+    Пріоритет: ручні правила (словник) -> пам'ять перекладів (names).
+    Назви без перекладу йдуть у фонову чергу і з'являться в одному з наступних імпортів.
+    """
+    if not names or supplier_id == 2:
+        return [None] * len(names)
 
-    for p in products:
-        code = str(p['code'])
-        u_val = str(p.get('unicode', ''))
-        raw_name = str(p['name']).strip().upper()
-        name_pl = raw_name.replace("—", " ").replace("-", " ").replace("  ", " ").strip()
+    cache.start_background_sync()
 
-        # --- НОВА ЛОГІКА ПРІОРИТЕТІВ ---
+    normalized = [normalize_name(n) for n in names]
+    manual = apply_manual_rules_batch(normalized)
 
-        # 1. Пробуємо застосувати ручні правила (словник)
-        manual_ua, is_manual = apply_manual_rules(name_pl)
+    # Назви без ручного правила — з пам'яті перекладів, решта — в чергу на Google
+    need = list(dict.fromkeys(pl for pl, (_, is_manual) in zip(normalized, manual) if not is_manual))
+    known = cache.get_names(need) if need else {}
+    worker.enqueue(supplier_id, [pl for pl in need if not known.get(pl)])
 
-        # 2. Шукаємо, що там у нас у кеші
-        cached_ua = d1.get_cached_translation(supplier_id, code, name_pl)
+    return [manual_ua if is_manual else known.get(pl)
+            for pl, (manual_ua, is_manual) in zip(normalized, manual)]
 
-        # 3. Синхронізація: якщо в словнику є правило, а в кеші інше - оновлюємо кеш
-        if is_manual:
-            if cached_ua != manual_ua:
-                print(f"🔄 [SYNC] Оновлення словника для {code}: {cached_ua} -> {manual_ua}")
-                d1.save_to_cache(supplier_id, code, u_val, name_pl, manual_ua)
-            results[(code, name_pl)] = manual_ua
-            continue
 
-        # 4. Якщо ручних правил немає - використовуємо кеш
-        if cached_ua:
-            results[(code, name_pl)] = cached_ua
-            continue
+def translation_version(supplier_id: int):
+    """
+    Версія перекладів постачальника для ключів імпорту (маніфест, снапшот бази).
+    Росте, коли фоновий переклад зняв з черги його назви або змінились його рядки dict;
+    переклади для інших постачальників її не чіпають.
+    """
+    if supplier_id == 2:
+        return 0
+    return worker.backlog.memory_version(supplier_id)
+
+
+def code_overrides(supplier_id: int, names: list, translations: list) -> dict:
+    """
+    Винятки для окремих кодів: {(code, НАЗВА): переклад}, лише там, де пер-кодовий переклад
+    відрізняється від перекладу назви. Назви з ручним правилом винятків не мають (словник головніший).
+    """
+    if not names or supplier_id == 2:
+        return {}
+    normalized = [normalize_name(n) for n in names]
+    manual = apply_manual_rules_batch(normalized)
+    by_name = {pl: uk for pl, uk, (_, is_manual) in zip(normalized, translations, manual) if not is_manual}
+    if not by_name:
+        return {}
+    return {
+        (code, pl): uk
+        for code, pl, uk in cache.get_overrides(supplier_id, list(by_name))
+        if uk and uk != by_name.get(pl) and uk.upper() != pl  # uk == pl — старий невдалий переклад
+    }
 
-        # 5. Якщо і в кеші порожньо - додаємо в список для Google
-        to_google.append(p)
-
-    # 3. БЛОК GOOGLE TRANSLATE
-    if to_google:
-        unique_names = list(set([str(p['name']).strip().upper() for p in to_google]))
-        print(f"🌍 [GOOGLE] Переклад: {len(unique_names)} нових назв")
-
-        chunk_size = 20  # Зменшив для стабільності
-        google_map = {}
-
-        for i in range(0, len(unique_names), chunk_size):
-            chunk = unique_names[i:i + chunk_size]
-            context_batch = [f"część samochodowa: {n}" for n in chunk]
-
-            try:
-                translated = GoogleTranslator(source='pl', target='uk').translate_batch(context_batch)
-                for orig, trans in zip(chunk, translated):
-                    clean_ua = re.sub(r'^.*?:', '', trans).strip() if ":" in trans else trans.strip()
-                    google_map[orig] = clean_ua.capitalize()
-                time.sleep(0.5)
-            except Exception as e:
-                print(f"❌ Помилка Google: {e}")
-                for n in chunk: google_map[n] = n
-
-        for p in to_google:
-            c, u = str(p['code']), str(p.get('unicode', ''))
-            n_pl = str(p['name']).strip().upper()
-            n_uk = google_map.get(n_pl, n_pl)
-            d1.save_to_cache(supplier_id, c, u, n_pl, n_uk)
-            results[(c, n_pl)] = n_uk
-
-    return results
\ No newline at end of file
+
+def translate_products(products: list, supplier_id: int) -> dict:
+    """{(code, НАЗВА): переклад} для списку товарів — через пам'ять назв і винятки по кодах."""
+    if not products: return {}
+
+    if supplier_id == 2:
+        return {(str(p['code']), str(p['name']).strip().upper()): p['name'] for p in products}
+
+    names = list(dict.fromkeys(str(p['name']) for p in products))
+    translations = translate_names(names, supplier_id)
+    by_name = {normalize_name(n): uk for n, uk in zip(names, translations)}
+    overrides = code_overrides(supplier_id, names, translations)
+
+    results = {}
+    for p in products:
+        code, pl = str(p['code']), normalize_name(p['name'])
+        uk = overrides.get((code, pl)) or by_name.get(pl)
+        if uk:
+            results[(code, str(p['name']).strip().upper())] = uk
+    return results
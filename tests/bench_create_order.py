@@ -0,0 +1,111 @@
+import asyncio
+import time
+import statistics
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+from sqlalchemy import text
+
+from app.database import async_engine, TABLE_ORDERS, TABLE_ORDER_ITEMS, TABLE_CATALOG
+from app.api.routers.cart import pair_item_ids
+
+# Бенчмарк КРОКУ 2 create_order: вставка позицій замовлення
+#   loop   — окремий INSERT на кожну позицію (старий варіант)
+#   unnest — один INSERT ... SELECT FROM unnest(масиви) RETURNING id + ключ позиції (поточний)
+# Все виконується в транзакції, яка відкочується — база не змінюється.
+
+ORDER_SIZES = [1, 10, 50, 200, 500]
+REPEATS = 5
+
+INSERT_ONE = f"""
+    INSERT INTO {TABLE_ORDER_ITEMS} (order_id, product_id, supplier_id, code, brand, price_eur, quantity)
+    VALUES (CAST(:order_id AS uuid), :product_id, :supplier_id, :code, :brand, :price_eur, :quantity)
+    RETURNING id;
+"""
+
+INSERT_UNNEST = f"""
+    INSERT INTO {TABLE_ORDER_ITEMS} (order_id, product_id, supplier_id, code, brand, price_eur, quantity)
+    SELECT CAST(:order_id AS uuid), v.product_id, v.supplier_id, v.code, v.brand, v.price_eur, v.quantity
+    FROM unnest(
+        CAST(:product_ids AS bigint[]),
+        CAST(:supplier_ids AS integer[]),
+        CAST(:codes AS text[]),
+        CAST(:brands AS text[]),
+        CAST(:prices AS numeric[]),
+        CAST(:quantities AS integer[])
+    ) WITH ORDINALITY AS v(product_id, supplier_id, code, brand, price_eur, quantity, idx)
+    ORDER BY v.idx
+    RETURNING id, product_id, supplier_id, quantity;
+"""
+
+
+async def _insert_loop(conn, order_id, items):
+    ids = []
+    for it in items:
+        res = await conn.execute(text(INSERT_ONE), {"order_id": order_id, **it})
+        ids.append(res.scalar())
+    return ids
+
+
+async def _insert_unnest(conn, order_id, items):
+    res = await conn.execute(text(INSERT_UNNEST), {
+        "order_id": order_id,
+        "product_ids": [it["product_id"] for it in items],
+        "supplier_ids": [it["supplier_id"] for it in items],
+        "codes": [it["code"] for it in items],
+        "brands": [it["brand"] for it in items],
+        "prices": [it["price_eur"] for it in items],
+        "quantities": [it["quantity"] for it in items],
+    })
+    return pair_item_ids(res, items)
+
+
+async def main():
+    async with async_engine.connect() as conn:
+        products = (await conn.execute(text(f"""
+            SELECT id, supplier_id, code, brand, price_eur FROM {TABLE_CATALOG} LIMIT :n
+        """), {"n": max(ORDER_SIZES)})).fetchall()
+        await conn.rollback()
+
+    if len(products) < max(ORDER_SIZES):
+        print(f"[WARN] Catalog has only {len(products)} rows, sizes are capped")
+
+    print(f"{'items':>6} | {'loop ms':>9} | {'unnest ms':>9} | {'speedup':>7}")
+    for size in ORDER_SIZES:
+        items = [
+            {
+                "product_id": p.id,
+                "supplier_id": p.supplier_id,
+                "code": p.code,
+                "brand": p.brand,
+                "price_eur": float(p.price_eur or 0),
+                "quantity": 1,
+            }
+            for p in products[:size]
+        ]
+        timings = {"loop": [], "unnest": []}
+
+        for _ in range(REPEATS):
+            for name, fn in (("loop", _insert_loop), ("unnest", _insert_unnest)):
+                async with async_engine.connect() as conn:
+                    order_id = (await conn.execute(text(f"""
+                        INSERT INTO {TABLE_ORDERS} (user_id, total_price_eur, total_price_uah, status)
+                        VALUES ('bench', 0, 0, 'new') RETURNING id
+                    """))).scalar()
+                    t0 = time.perf_counter()
+                    ids = await fn(conn, str(order_id), items)
+                    timings[name].append((time.perf_counter() - t0) * 1000)
+                    assert len(ids) == len(items)
+                    await conn.rollback()
+
+        loop_ms = statistics.median(timings["loop"])
+        unnest_ms = statistics.median(timings["unnest"])
+        print(f"{len(items):>6} | {loop_ms:>9.2f} | {unnest_ms:>9.2f} | {loop_ms / unnest_ms:>6.1f}x")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
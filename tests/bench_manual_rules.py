@@ -0,0 +1,83 @@
+import re
+import time
+import random
+import statistics
+
+from app.services.dictionaries import PARTS_DESCRIPTION_DICT, POSITION_DICT
+from app.services.manual_rules import apply_manual_rules, apply_manual_rules_batch
+
+# Бенчмарк ручних правил перекладу (словники назв і позицій)
+#   old   — попередня версія: перебір словника назв + окремий re.sub на кожну позицію
+#   new   — apply_manual_rules: скомпільована альтернація позицій
+#   batch — apply_manual_rules_batch: колонка назв, кожна унікальна назва — один раз
+# Спершу перевіряється, що результати однакові на всіх назвах.
+
+N_NAMES = 200_000
+UNIQUE_NAMES = 5_000
+REPEATS = 3
+
+_NOISE = ["", "0", "12MM", "KPL.", "ZESTAW", "L/P", "MAXGEAR", "(2 SZT)", "NR 5", "/", "-", "X"]
+
+
+def apply_manual_rules_old(name_pl: str) -> (str, bool):
+    translated = name_pl
+    changed = False
+
+    for pl_key, ua_val in PARTS_DESCRIPTION_DICT.items():
+        if pl_key in translated:
+            translated = translated.replace(pl_key, ua_val)
+            changed = True
+            break
+
+    for pl_pos, ua_pos in POSITION_DICT.items():
+        pattern = rf"\b{pl_pos}\b"
+        if re.search(pattern, translated):
+            translated = re.sub(pattern, ua_pos, translated)
+            changed = True
+
+    return translated, changed
+
+
+def _make_names(rnd: random.Random):
+    parts = list(PARTS_DESCRIPTION_DICT) + ["CZĘŚĆ", "USZCZELKA", "ŚRUBA", "OSŁONA"]
+    positions = list(POSITION_DICT) + ["PRZODU", "LEWYM", "TYŁU"]
+    unique = []
+    for _ in range(UNIQUE_NAMES):
+        words = [rnd.choice(parts)]
+        words += rnd.sample(positions, rnd.randint(0, 3))
+        words += [rnd.choice(_NOISE) for _ in range(rnd.randint(0, 2))]
+        rnd.shuffle(words)
+        unique.append(" ".join(w for w in words if w))
+    # Як у прайсі: багато позицій з однаковою назвою
+    return [rnd.choice(unique) for _ in range(N_NAMES)]
+
+
+def _bench(label: str, fn, names) -> float:
+    times = []
+    for _ in range(REPEATS):
+        t = time.perf_counter()
+        fn(names)
+        times.append(time.perf_counter() - t)
+    med = statistics.median(times)
+    print(f"  {label:<6} median {med:7.3f}s  ({med / len(names) * 1e6:6.2f} µs/name)")
+    return med
+
+
+def main():
+    names = _make_names(random.Random(42))
+    unique = list(dict.fromkeys(names))
+    print(f"{len(names)} names, {len(unique)} unique")
+
+    expected = [apply_manual_rules_old(n) for n in unique]
+    assert [apply_manual_rules(n) for n in unique] == expected, "new != old"
+    assert apply_manual_rules_batch(names) == [apply_manual_rules_old(n) for n in names], "batch != old"
+    print("results: identical")
+
+    old = _bench("old", lambda ns: [apply_manual_rules_old(n) for n in ns], names)
+    new = _bench("new", lambda ns: [apply_manual_rules(n) for n in ns], names)
+    batch = _bench("batch", apply_manual_rules_batch, names)
+    print(f"speedup: new x{old / new:.1f}, batch x{old / batch:.1f}")
+
+
+if __name__ == "__main__":
+    main()
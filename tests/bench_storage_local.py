@@ -0,0 +1,65 @@
+import os
+import time
+import tempfile
+import statistics
+from pathlib import Path
+
+from app.services.storage import LocalStorageClient
+
+# Бенчмарк сховища без мережі (LocalStorageClient): скільки коштує сама логіка
+# upload_file / cleanup_old_files (лістинг, сортування за LastModified, видалення)
+# окремо від мережі R2. Для повного ETL офлайн: STORAGE_BACKEND=local.
+# Все пишеться у тимчасову теку, яка потім видаляється.
+
+FILE_SIZES_MB = [1, 16, 64]
+CLEANUP_SIZES = [10, 100, 1000, 5000]
+KEEP = 7
+REPEATS = 3
+
+
+def _bench_upload(storage: LocalStorageClient, work: Path) -> None:
+    print("upload_file:")
+    for size_mb in FILE_SIZES_MB:
+        src = work / f"src_{size_mb}.bin"
+        src.write_bytes(os.urandom(size_mb * 1024 * 1024))
+        times = []
+        for i in range(REPEATS):
+            t = time.perf_counter()
+            storage.upload_file(str(src), f"bench/upload/{size_mb}mb_{i}.bin")
+            times.append(time.perf_counter() - t)
+        med = statistics.median(times)
+        print(f"  {size_mb:>4} MB: median {med * 1000:8.1f} ms ({size_mb / med:.0f} MB/s)")
+        src.unlink()
+
+
+def _bench_cleanup(storage: LocalStorageClient, work: Path) -> None:
+    print(f"cleanup_old_files (keep={KEEP}):")
+    src = work / "small.csv"
+    src.write_bytes(b"code;brand;price\n" * 10)
+    for n in CLEANUP_SIZES:
+        prefix = f"bench/cleanup_{n}/"
+        for i in range(n):
+            storage._put_file(str(src), f"{prefix}price_{i:05d}.csv", None)
+
+        t = time.perf_counter()
+        items = storage._list_all_objects(prefix)
+        t_list = time.perf_counter() - t
+
+        t = time.perf_counter()
+        storage.cleanup_old_files(prefix, keep=KEEP)
+        t_cleanup = time.perf_counter() - t
+
+        left = len(storage._list_all_objects(prefix))
+        print(f"  {n:>5} files: list {t_list * 1000:7.1f} ms, cleanup {t_cleanup * 1000:7.1f} ms, left {left} (of {len(items)})")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        storage = LocalStorageClient(work / "storage")
+        _bench_upload(storage, work)
+        _bench_cleanup(storage, work)
+
+
+if __name__ == "__main__":
+    main()
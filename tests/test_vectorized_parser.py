@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app.etl.price_processor import (
+    _load_supplier_cfg, _rows_to_standard_df, raw_csv_to_rows, read_raw_lines, lines_to_standard_df,
+    iter_standard_chunks,
+)
+
+DATA_DIR = Path(__file__).parent / "data"
+
+# (постачальник, файл, чи це файл цін Autopartner — там stock_index не застосовується)
+CASES = [
+    ("AUTOPARTNER", "autopartner_prices.csv", True),
+    ("AUTOPARTNER", "autopartner_stock.csv", False),
+    ("AP_GDANSK", "ap_gdansk.csv", False),
+    ("MOTOROL", "motorol.csv", False),
+]
+
+
+def _read_params(supplier: str, prices_only: bool):
+    cfg = _load_supplier_cfg(supplier)
+    layout = cfg.get("raw_layout") or {}
+    params = {
+        "stock_index": None if prices_only else layout.get("stock_index"),
+        "stock_header_token": layout.get("stock_header_token", "STAN"),
+        "gt5_to": layout.get("gt5_to"),
+        "normalize_mode": (cfg.get("normalize") or {}).get("mode", "spaces"),
+    }
+    return layout.get("columns") or {}, (cfg.get("preprocess") or {}).get("skip_rows", 0), params
+
+
+def _python_df(path: Path, colmap, skip_rows, params) -> pd.DataFrame:
+    return _rows_to_standard_df(raw_csv_to_rows(path, skip_rows=skip_rows, **params), colmap)
+
+
+@pytest.mark.parametrize("supplier,filename,prices_only", CASES)
+def test_vectorized_parser_matches_python_parser(supplier, filename, prices_only):
+    path = DATA_DIR / filename
+    colmap, skip_rows, params = _read_params(supplier, prices_only)
+
+    expected = _python_df(path, colmap, skip_rows, params)
+    actual = lines_to_standard_df(read_raw_lines(path, skip_rows=skip_rows), colmap, **params)
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize("supplier,filename,prices_only", CASES)
+def test_chunked_parse_matches_whole_file(supplier, filename, prices_only):
+    path = DATA_DIR / filename
+    colmap, skip_rows, params = _read_params(supplier, prices_only)
+
+    expected = _python_df(path, colmap, skip_rows, params)
+    chunks = list(iter_standard_chunks(path, colmap, chunk_rows=3, skip_rows=skip_rows, **params))
+    actual = pd.concat(chunks, ignore_index=True)
+
+    pd.testing.assert_frame_equal(actual, expected)